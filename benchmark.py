@@ -0,0 +1,226 @@
+""" BENCHMARK: WRAPPER OVERHEAD """
+
+# Times each stage of the wrapper's own processing (file discovery, probing, header, formatting, saving, moving) with Whisper replaced by a fast, deterministic stand-in model, so the wrapper's overhead can be measured separately from transcription.
+# Runs without a GPU and without downloading any models (Whisper itself need not be installed). Synthetic audio files (short silent .wav files) are created in a temporary directory, which is deleted afterwards.
+#
+# Usage:
+#   python benchmark.py                                  # run with default sizes and print the results
+#   python benchmark.py --save benchmarks/v1.json        # also save the results as a baseline
+#   python benchmark.py --baseline benchmarks/v1.json    # compare against a saved baseline
+#   python benchmark.py --files 5000 --words 500000      # larger run
+
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime as dt
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import wave
+
+import utils_helper
+import whisper_wrapper
+from user_variables import model_options, delimiter
+
+
+class FakeWhisperModel:
+    """
+    Stand-in for a Whisper model. transcribe() returns the same synthetic text and segments every time, instantly, in the same shape as Whisper's result.
+
+    Args:
+        words_per_file (int): Number of words in each transcript.
+        words_per_segment (int, optional): Number of words in each segment. Defaults to 12.
+    """
+
+    def __init__(self, words_per_file, words_per_segment=12):
+        vocabulary = ["the", "quick", "brown", "fox", "jumps", "over", "a", "lazy", "dog,", "and", "then", "says", "hello."]
+        words = [vocabulary[i % len(vocabulary)] for i in range(words_per_file)]
+        self.segments = []
+        for start in range(0, words_per_file, words_per_segment):
+            segment_words = words[start:start + words_per_segment]
+            self.segments.append({
+                "id": len(self.segments),
+                "start": start * 0.4,
+                "end": (start + len(segment_words)) * 0.4,
+                "text": " " + " ".join(segment_words),
+            })
+        self.text = "".join(segment["text"] for segment in self.segments)
+
+    def transcribe(self, audio, **decode_options):
+        return {"text": self.text, "segments": [dict(segment) for segment in self.segments], "language": "en"}
+
+
+def create_synthetic_audio(directory, file_count, duration_secs=0.5):
+    """
+    Writes file_count short silent 16 kHz mono .wav files (valid input for ffprobe) to directory.
+
+    Returns:
+        list: The filenames created.
+    """
+    frames = b"\x00\x00" * int(16000 * duration_secs)
+    filenames = []
+    for number in range(1, file_count + 1):
+        filename = f"synthetic_S01E{number:05d}.wav"
+        with wave.open(os.path.join(directory, filename), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(frames)
+        filenames.append(filename)
+    return filenames
+
+
+def time_stage(results, stage, function, *args):
+    """
+    Calls function(*args), adding the elapsed time to results[stage].
+
+    Returns:
+        The function's return value.
+    """
+    start = time.perf_counter()
+    value = function(*args)
+    elapsed = time.perf_counter() - start
+    entry = results.setdefault(stage, {"calls": 0, "total_secs": 0.0})
+    entry["calls"] += 1
+    entry["total_secs"] += elapsed
+    return value
+
+
+def run_benchmark(file_count, words_per_file, long_words, word_interval, model_key, repeats=5):
+    """
+    Runs every stage over file_count synthetic files, plus insert_newlines(), format_transcript() and save_transcript() (and write_formatted_transcript(), which does both in one pass, to lower peak memory rather than time) on one very long transcript of long_words words. The long transcript stages are repeated, as a single call is too short to time reliably.
+
+    Returns:
+        dict: Stage name (key) and {"calls", "total_secs", "per_call_ms"} (value).
+    """
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="whisper_wrapper_bench_")
+    audio_dir = os.path.join(work_dir, "audio")
+    output_dir = os.path.join(work_dir, "output")
+    processed_dir = os.path.join(work_dir, "processed")
+    for directory in (audio_dir, output_dir, processed_dir):
+        os.makedirs(directory)
+
+    # Point the wrapper at the temporary directories and switch off the caches, so every call does the full work
+    whisper_wrapper.path_to_audio = audio_dir
+    whisper_wrapper.path_for_output = output_dir
+    whisper_wrapper.log_path = os.path.join(work_dir, "log_whisper_transcripts_benchmark.txt")
+    whisper_wrapper.use_transcript_cache = False
+    whisper_wrapper.use_journal = False
+    whisper_wrapper.use_model_server = False
+    # whisper is only imported when the model is loaded, so a stand-in module here means the real one (and torch) is never imported
+    sys.modules["whisper"] = types.SimpleNamespace(load_model=lambda name: FakeWhisperModel(words_per_file))
+
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            create_synthetic_audio(audio_dir, file_count)
+
+            file_count_found, audio_filenames = time_stage(results, "obtain_audio_filenames", whisper_wrapper.obtain_audio_filenames, audio_dir, ".wav")
+            if shutil.which("ffprobe"):
+                time_stage(results, "audio_file_durations", utils_helper.audio_file_durations, audio_dir, audio_filenames, whisper_wrapper.log_path, whisper_wrapper.probe_workers, None)
+            model = time_stage(results, "load_model", whisper_wrapper.load_model, model_key)
+
+            for index, audio_file in enumerate(audio_filenames, start=1):
+                header, audio_file = time_stage(results, "create_header", whisper_wrapper.create_header, index, audio_file, delimiter)
+                raw_transcript, segments = time_stage(results, "transcribe", whisper_wrapper.transcribe, model, audio_file, model_key)
+                time_stage(results, "insert_newlines", utils_helper.insert_newlines, raw_transcript, word_interval)
+                formatted_transcript = time_stage(results, "format_transcript", whisper_wrapper.format_transcript, raw_transcript, word_interval, header, delimiter)
+                time_stage(results, "save_transcript", whisper_wrapper.save_transcript, formatted_transcript, audio_file, model_key)
+                time_stage(results, "write_formatted_transcript", whisper_wrapper.write_formatted_transcript, raw_transcript, word_interval, header, delimiter, audio_file, model_key)
+                time_stage(results, "move_processed_file", whisper_wrapper.move_processed_file, True, audio_file, audio_dir, processed_dir, whisper_wrapper.log_path)
+
+            long_transcript = FakeWhisperModel(long_words).text
+            header, _ = whisper_wrapper.create_header(1, "long_transcript.wav", delimiter)
+            for _ in range(repeats):
+                time_stage(results, "insert_newlines (long transcript)", utils_helper.insert_newlines, long_transcript, word_interval)
+                formatted_transcript = time_stage(results, "format_transcript (long transcript)", whisper_wrapper.format_transcript, long_transcript, word_interval, header, delimiter)
+                time_stage(results, "save_transcript (long transcript)", whisper_wrapper.save_transcript, formatted_transcript, "long_transcript.wav", model_key)
+                time_stage(results, "write_formatted_transcript (long transcript)", whisper_wrapper.write_formatted_transcript, long_transcript, word_interval, header, delimiter, "long_transcript.wav", model_key)
+            utils_helper.log_flush()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for entry in results.values():
+        entry["total_secs"] = round(entry["total_secs"], 6)
+        entry["per_call_ms"] = round(entry["total_secs"] / entry["calls"] * 1000, 4)
+    return results
+
+
+def git_version():
+    """Returns the current git commit (short hash), or "unknown" outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results, baseline=None, threshold=1.2, min_total_secs=0.01):
+    """
+    Prints a table of the results. If a baseline is supplied, each stage's time per call is compared with it and stages more than threshold times slower are flagged. Stages taking less than min_total_secs in total are compared but not flagged, as timings that short are mostly noise.
+
+    Returns:
+        bool: True if any stage regressed beyond threshold.
+    """
+    regressed = False
+    print(f"{'Stage':<46}{'Calls':>8}{'Total (s)':>12}{'Per call (ms)':>15}" + (f"{'Baseline (ms)':>15}{'Change':>9}" if baseline else ""))
+    for stage, entry in results.items():
+        line = f"{stage:<46}{entry['calls']:>8}{entry['total_secs']:>12.3f}{entry['per_call_ms']:>15.4f}"
+        if baseline and stage in baseline["results"]:
+            before = baseline["results"][stage]["per_call_ms"]
+            ratio = entry["per_call_ms"] / before if before else float("inf")
+            stage_regressed = ratio > threshold and entry["total_secs"] >= min_total_secs
+            flag = "  REGRESSION" if stage_regressed else ""
+            regressed = regressed or stage_regressed
+            line += f"{before:>15.4f}{ratio:>8.2f}x{flag}"
+        print(line)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the wrapper's own overhead using a stand-in model (no GPU or model download needed).")
+    parser.add_argument("--files", type=int, default=2000, help="number of synthetic audio files (default 2000)")
+    parser.add_argument("--words", type=int, default=2000, help="words in each synthetic transcript (default 2000)")
+    parser.add_argument("--long-words", type=int, default=200000, help="words in the single very long transcript (default 200000)")
+    parser.add_argument("--repeats", type=int, default=5, help="times the long transcript stages are repeated (default 5)")
+    parser.add_argument("--word-interval", type=int, default=10, help="word interval for line wrapping (default 10)")
+    parser.add_argument("--model-key", default="Tiny_English", choices=list(model_options), help="model_options key used for naming (default Tiny_English)")
+    parser.add_argument("--save", help="save the results to this .json file, for use as a baseline")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --save")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression (default 1.2)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = run_benchmark(args.files, args.words, args.long_words, args.word_interval, args.model_key, args.repeats)
+    if not shutil.which("ffprobe"):
+        print("ffprobe not found: audio_file_durations was not timed.\n")
+
+    regressed = print_results(results, baseline, args.threshold)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        report = {
+            "version": git_version(),
+            "date": dt.now().strftime("%Y-%m-%d_%H-%M-%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "settings": {"files": args.files, "words": args.words, "long_words": args.long_words, "repeats": args.repeats, "word_interval": args.word_interval},
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
 """ ENTRY POINT """
 
-from whisper_wrapper import master_call_single, master_call_loop
-from user_variables import model_key, word_interval
+import json
+import sys
 
-# Calls all the functions which only need to run once, to do the pre-processing tasks for the entire batch of audio files
-audio_filenames, model, word_interval = master_call_single(word_interval, model_key)
+from whisper_wrapper import master_call_single, master_call_loop, master_call_watch, master_call_estimate, master_call_compare
+from user_variables import model_key, word_interval, watch_folder, compare_models
 
-# Calls the functions which need to run for each audio file in the batch
-master_call_loop(audio_filenames, word_interval, model_key, model)
+# NB: the guard is required when num_workers > 1, as each worker process re-imports this file when it starts
+if __name__ == "__main__":
+    if "--estimate" in sys.argv[1:]:
+        # Checks the batch and estimates how long it will take, without loading the model. The last line printed is the estimate as JSON, for scripts and schedulers.
+        estimate = master_call_estimate(word_interval, model_key)
+        print(json.dumps(estimate))
+    elif "--compare" in sys.argv[1:]:
+        # Transcribes the batch with each of compare_models, decoding each file once, and reports how they differ in speed and output
+        master_call_compare(word_interval, compare_models)
+    elif watch_folder:
+        # Keeps the model loaded and transcribes new files as they arrive in path_to_audio, until stopped
+        master_call_watch(word_interval, model_key)
+    else:
+        # Calls all the functions which only need to run once, to do the pre-processing tasks for the entire batch of audio files
+        audio_filenames, model, word_interval = master_call_single(word_interval, model_key)
+
+        # Calls the functions which need to run for each audio file in the batch
+        master_call_loop(audio_filenames, word_interval, model_key, model)
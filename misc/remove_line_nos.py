@@ -1,33 +1,155 @@
 """ REMOVE LINE NUMBERS FROM TRANSCRIPTS """
 
-import re
+# Strips the line numbers which whisper_wrapper adds to transcripts ("1: ", "2: ", "3: " ...), leaving the text of each line otherwise unchanged.
+# A line is only stripped if it starts with its own line number followed by ": ", exactly as the wrapper writes it. So header fields, times such as "12:30" and transcripts whose numbers were already removed are left alone. A file whose first line is not "1: ..." is skipped without being rewritten.
+# Each file is read and written one line at a time, to a temporary file in the same folder, which then replaces the original in a single step. An interruption therefore leaves either the original or the stripped transcript, never a half-written file.
+# Files are processed in parallel by a pool of worker processes, and a throughput report is printed at the end.
+#
+# Usage:
+#   python misc/remove_line_nos.py output/                       # every .txt file in output/
+#   python misc/remove_line_nos.py archive/ --recursive          # include subfolders
+#   python misc/remove_line_nos.py archive/ --workers 8 --extension .text
+
+import argparse
+import multiprocessing
 import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+# The wrapper's line number prefix: digits, a colon and one space, then any spaces left at the start of a wrapped line
+LINE_NUMBER = re.compile(r"(\d+): +")
+
+
+def find_transcripts(folders, extension, recursive):
+    """
+    Finds the transcript files to be stripped.
+
+    Args:
+        folders (list): Folders to search.
+        extension (str): File extension of the transcripts, matched regardless of case, i.e. ".txt".
+        recursive (bool): If True, subfolders are searched too.
+
+    Returns:
+        generator: Path of each transcript file, in folder order.
+    """
+    extension = extension.lower()
+    for folder in folders:
+        pending = [folder]
+        while pending:
+            with os.scandir(pending.pop()) as scan:
+                entries = sorted(scan, key=lambda entry: entry.name)
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(extension) and not entry.name.startswith(".tmp_"):
+                    yield entry.path
+
+
+def strip_line(line, line_number):
+    """Returns line without its line number prefix, or unchanged if it does not start with line_number followed by ": "."""
+    match = LINE_NUMBER.match(line)
+    if match and match.group(1) == str(line_number):
+        return line[match.end():], True
+    return line, False
+
+
+def strip_transcript(path):
+    """
+    Strips the line numbers from one transcript, replacing the file atomically. The file's permissions are kept.
+
+    Args:
+        path (str): Path of the transcript file.
+
+    Returns:
+        dict: "path", "status" ("stripped", "skipped" if the file is not numbered, or "failed"), "lines" (lines stripped), "bytes" (size of the original file) and "error" (message, if failed).
+    """
+    report = {"path": path, "status": "skipped", "lines": 0, "bytes": 0, "error": None}
+    temp_path = None
+    try:
+        report["bytes"] = os.path.getsize(path)
+        # newline="" keeps each line's own line ending; surrogateescape carries any bytes that are not UTF-8 through unchanged
+        with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as source:
+            first_line = source.readline()
+            first_stripped, numbered = strip_line(first_line, 1)
+            if not numbered:
+                return report
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_", suffix=os.path.splitext(path)[1])
+            with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape", newline="") as target:
+                target.write(first_stripped)
+                stripped_count = 1
+                for line_number, line in enumerate(source, start=2):
+                    line, stripped = strip_line(line, line_number)
+                    stripped_count += stripped
+                    target.write(line)
+            shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+            temp_path = None
+        report["status"] = "stripped"
+        report["lines"] = stripped_count
+
+    except (OSError, UnicodeError) as e:
+        report["status"] = "failed"
+        report["error"] = str(e)
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return report
+
+
+def print_report(counts, lines, total_bytes, elapsed, workers):
+    """Prints the totals and throughput for the run."""
+    files = sum(counts.values())
+    rate = files / elapsed if elapsed else 0
+    megabytes = total_bytes / (1024 * 1024)
+    print(f"\n{files} file(s) in {elapsed:.2f}s using {workers} worker(s): {counts['stripped']} stripped, {counts['skipped']} skipped (not numbered), {counts['failed']} failed.")
+    print(f"{lines} line numbers removed. Throughput: {rate:.1f} files/s, {megabytes / elapsed if elapsed else 0:.1f} MB/s ({megabytes:.1f} MB read).")
+
 
-# NB: relies upon the line numbers appearing at the start of a line in this format: "12: " (i.e. a number followed by a colon and a space)
+def main():
+    parser = argparse.ArgumentParser(description="Remove whisper_wrapper's line numbers from transcript files, in place.")
+    parser.add_argument("folders", nargs="*", default=["output/"], help="folder(s) of transcripts (default output/)")
+    parser.add_argument("--extension", default=".txt", help="file extension of the transcripts (default .txt)")
+    parser.add_argument("--recursive", action="store_true", help="also process transcripts in subfolders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
 
-# specify the directory path containing transcripts to be stripped
-folder = "output/" 
-format = ".txt" 
-# NB: ALL the files in this folder with this file extension will be enumerated and processed!
+    for folder in args.folders:
+        if not os.path.isdir(folder):
+            print(f"Error, {folder} is not a folder.")
+            sys.exit(1)
 
-# Creates a list of all the filenames in the folder
-transcripts = [f for f in os.listdir(folder) if f.endswith(format)]
-# print(transcripts)
+    start_time = time.perf_counter()
+    counts = {"stripped": 0, "skipped": 0, "failed": 0}
+    lines = 0
+    total_bytes = 0
+    workers = max(1, args.workers)
+    transcripts = find_transcripts(args.folders, args.extension, args.recursive)
 
-for transcript in transcripts:
-    path_to_transcript = os.path.join(folder, transcript)
-    with open(path_to_transcript, "r") as file:
-        transcript = file.read()
+    def record(report):
+        nonlocal lines, total_bytes
+        counts[report["status"]] += 1
+        lines += report["lines"]
+        total_bytes += report["bytes"]
+        if report["error"]:
+            print(f"Error processing {report['path']} - {report['error']}")
 
-    # Split the transcript into lines
-    lines = transcript.split('\n')
+    if workers == 1:
+        for path in transcripts:
+            record(strip_transcript(path))
+    else:
+        # Files are handed out in small batches, as each one takes very little time compared with passing it to a worker
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for report in pool.imap_unordered(strip_transcript, transcripts, chunksize=16):
+                record(report)
 
-    # Use a regular expression to remove the line numbers
-    lines_without_numbers = [re.sub(r'^\d+:\s*', '', line) for line in lines]
+    print_report(counts, lines, total_bytes, time.perf_counter() - start_time, workers)
+    sys.exit(1 if counts["failed"] else 0)
 
-    # Join the lines back together into a single string
-    transcript_without_numbers = '\n'.join(lines_without_numbers)
 
-    # Write the stripped transcript back to file, replacing the original line-numbered transcript
-    with open(path_to_transcript, "w") as file:
-        file.write(transcript_without_numbers)
+if __name__ == "__main__":
+    main()
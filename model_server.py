@@ -0,0 +1,75 @@
+""" MODEL SERVER """
+
+# Keeps Whisper models loaded in memory between runs, so each run of main.py on this machine can skip loading the model (which takes tens of seconds and several GB of memory for the larger models).
+# Runs with use_model_server = True (user_variables.py) send their transcription to this server over a Unix domain socket (model_server_socket, by default in a directory only this user can open), and load the model themselves as usual if the server is not running.
+# Each model is loaded the first time a run asks for it, and stays loaded until the server is stopped (Ctrl+C or SIGTERM).
+#
+# Usage:
+#   python model_server.py                      # load models as runs request them
+#   python model_server.py Medium_English       # also load these model_options keys at start-up
+
+import os
+import signal
+import sys
+import threading
+import whisper
+
+import whisper_wrapper
+from user_variables import use_log_file, path_to_logs, model_options, model_server_socket
+from utils_helper import log_file_write
+from utils_server import ModelServer, server_request, model_server_socket_path, prepare_socket_directory, socket_trusted
+
+
+def main():
+    whisper_wrapper.log_file_setup(use_log_file, path_to_logs)
+    log_path = whisper_wrapper.log_path
+
+    preload_keys = sys.argv[1:]
+    for model_key in preload_keys:
+        if model_key not in model_options:
+            msg_error = f"Error, '{model_key}' is not a key in model_options. Exiting model server.\n"
+            log_file_write(msg_error, log_path)
+            sys.exit(1)
+
+    socket_path = model_server_socket_path(model_server_socket)
+    try:
+        prepare_socket_directory(socket_path)
+    except OSError as e:
+        msg_error = f"Error, unable to use {os.path.dirname(socket_path)} for the model server socket - {e}. Exiting model server.\n"
+        log_file_write(msg_error, log_path)
+        sys.exit(1)
+
+    if os.path.lexists(socket_path):
+        if not socket_trusted(socket_path):
+            msg_error = f"Error, {socket_path} already exists and is not a socket owned by this user. Exiting model server.\n"
+            log_file_write(msg_error, log_path)
+            sys.exit(1)
+        try:
+            server_request(socket_path, {"op": "ping"}, timeout=5)
+            msg_error = f"A model server is already running at {socket_path}. Exiting.\n"
+            log_file_write(msg_error, log_path)
+            sys.exit(1)
+        except (OSError, RuntimeError, ValueError):
+            os.remove(socket_path) # left behind by a server which did not shut down cleanly
+
+    server = ModelServer(socket_path, whisper.load_model, whisper.load_audio, log_path)
+    # shutdown() waits for serve_forever() to return, so it must be called from another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    threading.Thread(target=lambda: [server.get_model(model_options[model_key]["name"]) for model_key in preload_keys], daemon=True).start()
+
+    msg_start = f"Model server listening on {socket_path}. Press Ctrl+C to stop.\n"
+    log_file_write(msg_start, log_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        msg_stop = "Model server stopped.\n"
+        log_file_write(msg_stop, log_path)
+
+
+if __name__ == "__main__":
+    main()
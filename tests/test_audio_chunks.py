@@ -0,0 +1,57 @@
+"""Splitting long recordings into chunks and stitching the chunk transcripts back together."""
+
+import numpy as np
+
+from utils_audio import SAMPLE_RATE, find_chunk_boundaries, split_audio_chunks, stitch_chunk_results
+
+
+def noise_with_pauses(total_secs, pauses):
+    """Loud noise, silent for each (start, end) in pauses (seconds)."""
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.5, 0.5, int(total_secs * SAMPLE_RATE)).astype(np.float32)
+    for start, end in pauses:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0
+    return audio
+
+
+def transcribe_whole_seconds(chunk):
+    """Stand-in for Whisper: one segment for each whole second of the recording inside the chunk, with the second as its text, timed relative to the chunk as Whisper would."""
+    offset = chunk["offset"]
+    duration = len(chunk["audio"]) / SAMPLE_RATE
+    segments = []
+    for second in range(int(np.ceil(offset)), int(offset + duration)):
+        if second + 1 <= offset + duration:
+            segments.append({"id": len(segments), "start": second - offset, "end": second + 1 - offset, "text": f" {second}"})
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def test_boundaries_fall_in_pauses():
+    audio = noise_with_pauses(100, [(28, 29), (61, 62)])
+    boundaries = find_chunk_boundaries(audio, 30)
+    assert boundaries[0] == 0 and boundaries[-1] == len(audio)
+    assert 28 * SAMPLE_RATE <= boundaries[1] <= 29 * SAMPLE_RATE
+    assert 61 * SAMPLE_RATE <= boundaries[2] <= 62 * SAMPLE_RATE
+
+
+def test_short_recording_is_one_chunk():
+    audio = noise_with_pauses(20, [])
+    chunks = split_audio_chunks(audio, 30, 2)
+    assert len(chunks) == 1
+    assert chunks[0]["offset"] == 0 and chunks[0]["core_end"] == 20
+    result = transcribe_whole_seconds(chunks[0])
+    assert stitch_chunk_results(chunks, [result])["text"] == result["text"]
+
+
+def test_stitched_transcript_keeps_each_segment_once():
+    audio = noise_with_pauses(125, [(28, 29), (58.5, 59.5), (93, 94)])
+    chunks = split_audio_chunks(audio, 30, 2)
+    assert len(chunks) > 1
+    # neighbouring chunks overlap, so both transcribe the seconds either side of each split
+    assert all(chunks[i]["offset"] < chunks[i - 1]["core_end"] for i in range(1, len(chunks)))
+
+    stitched = stitch_chunk_results(chunks, [transcribe_whole_seconds(chunk) for chunk in chunks])
+
+    assert stitched["text"] == "".join(f" {second}" for second in range(125))
+    assert [segment["id"] for segment in stitched["segments"]] == list(range(125))
+    assert [segment["start"] for segment in stitched["segments"]] == [float(second) for second in range(125)]
+    assert [segment["end"] for segment in stitched["segments"]] == [float(second + 1) for second in range(125)]
@@ -0,0 +1,79 @@
+"""Transcript cache: keys, hits on renamed copies, and least-recently-used eviction."""
+
+import os
+import shutil
+import time
+
+import pytest
+
+import utils_cache
+import utils_helper
+import whisper_wrapper
+from utils_cache import file_content_hash, transcript_cache_key, cache_lookup, cache_store
+
+RESULT = {"text": " Hello there.", "segments": [{"start": 0.0, "end": 1.0, "text": " Hello there."}]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(utils_cache, "cache_stats", {"hits": 0, "misses": 0, "audio_hits": 0, "audio_misses": 0})
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+
+
+def test_key_covers_contents_model_and_options(tmp_path):
+    (tmp_path / "one.mp3").write_bytes(b"recording one")
+    (tmp_path / "two.mp3").write_bytes(b"recording two")
+    one = file_content_hash(str(tmp_path / "one.mp3"))
+    key = transcript_cache_key(one, "base.en", {"language": "en", "temperature": 0})
+    assert key == transcript_cache_key(one, "base.en", {"temperature": 0, "language": "en"}) # order does not matter
+    assert key != transcript_cache_key(file_content_hash(str(tmp_path / "two.mp3")), "base.en", {"language": "en", "temperature": 0})
+    assert key != transcript_cache_key(one, "small.en", {"language": "en", "temperature": 0})
+    assert key != transcript_cache_key(one, "base.en", {"language": "en", "temperature": 0.2})
+    assert key != transcript_cache_key(one, "base.en", {})
+
+
+def test_store_and_lookup(tmp_path):
+    cache_dir = str(tmp_path / "transcripts")
+    assert cache_lookup(cache_dir, "abc") is None
+    cache_store(cache_dir, "abc", RESULT, 10, "")
+    assert cache_lookup(cache_dir, "abc") == RESULT
+    assert utils_cache.cache_stats["hits"] == 1 and utils_cache.cache_stats["misses"] == 1
+
+
+def test_renamed_copy_is_a_hit(tmp_path, monkeypatch):
+    (tmp_path / "audio").mkdir()
+    (tmp_path / "audio" / "episode_1.mp3").write_bytes(b"the same recording")
+    monkeypatch.setattr(whisper_wrapper, "use_transcript_cache", True)
+    monkeypatch.setattr(whisper_wrapper, "path_to_audio", str(tmp_path / "audio"))
+    monkeypatch.setattr(whisper_wrapper, "transcript_cache_path", str(tmp_path / "transcripts"))
+    monkeypatch.setattr(whisper_wrapper, "content_hashes", {})
+
+    cache_key, cached = whisper_wrapper.transcript_cache_check("episode_1.mp3", "Base_English", {"language": "en"})
+    assert cached is None
+    cache_store(str(tmp_path / "transcripts"), cache_key, RESULT, 10, "")
+
+    shutil.copy(tmp_path / "audio" / "episode_1.mp3", tmp_path / "audio" / "renamed.mp3")
+    assert whisper_wrapper.transcript_cache_check("renamed.mp3", "Base_English", {"language": "en"}) == (cache_key, RESULT)
+    assert whisper_wrapper.transcript_cache_check("renamed.mp3", "Small_English", {"language": "en"})[1] is None # another model
+    assert whisper_wrapper.transcript_cache_check("renamed.mp3", "Base_English", {"language": "fr"})[1] is None # other options
+
+
+def test_cache_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(whisper_wrapper, "use_transcript_cache", False)
+    assert whisper_wrapper.transcript_cache_check("missing.mp3", "Base_English", {}) == (None, None)
+
+
+def test_least_recently_used_evicted(tmp_path):
+    cache_dir = str(tmp_path / "transcripts")
+    large = {"text": "x" * 400 * 1024, "segments": []} # about 0.4MB each, so two fit in 1MB
+    now = time.time()
+    cache_store(cache_dir, "first", large, 1, "")
+    cache_store(cache_dir, "second", large, 1, "")
+    os.utime(os.path.join(cache_dir, "first.json"), (now - 100, now - 100))
+    os.utime(os.path.join(cache_dir, "second.json"), (now - 50, now - 50))
+    assert cache_lookup(cache_dir, "first") is not None # used again, so now the most recent
+
+    cache_store(cache_dir, "third", large, 1, "")
+    assert sorted(os.listdir(cache_dir)) == ["first.json", "third.json"]
+    total_bytes = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+    assert total_bytes <= 1024 * 1024
@@ -0,0 +1,62 @@
+"""Word error rate and model grouping for comparison mode."""
+
+import random
+
+from utils_compare import word_edit_distance, transcript_words, comparison_report, plan_model_groups
+
+
+def naive_edit_distance(reference, hypothesis):
+    """Levenshtein distance over words, one cell at a time."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, reference_word in enumerate(reference, start=1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (reference_word != hypothesis_word)))
+        previous = current
+    return previous[-1]
+
+
+def test_word_edit_distance_known_cases():
+    assert word_edit_distance([], []) == 0
+    assert word_edit_distance(["a", "b"], []) == 2
+    assert word_edit_distance([], ["a", "b", "c"]) == 3
+    assert word_edit_distance(["a", "b", "c"], ["a", "b", "c"]) == 0
+    assert word_edit_distance(["a", "b", "c"], ["a", "x", "c"]) == 1 # substitution
+    assert word_edit_distance(["a", "b", "c"], ["a", "c"]) == 1 # deletion
+    assert word_edit_distance(["a", "c"], ["a", "b", "c"]) == 1 # insertion
+    assert word_edit_distance(["the", "cat", "sat"], ["sat", "the", "cat"]) == 2
+
+
+def test_word_edit_distance_matches_naive():
+    rng = random.Random(3)
+    for _ in range(2000):
+        reference = [rng.choice("abcd") for _ in range(rng.randrange(0, 15))]
+        hypothesis = [rng.choice("abcde") for _ in range(rng.randrange(0, 15))]
+        assert word_edit_distance(reference, hypothesis) == naive_edit_distance(reference, hypothesis), (reference, hypothesis)
+
+
+def test_transcript_words_ignores_case_and_punctuation():
+    assert transcript_words(" Hello, world! It's  fine.") == ["hello", "world", "it's", "fine"]
+
+
+def test_comparison_report_word_error_rate():
+    model_options = {"A": {"name": "a.en"}, "B": {"name": "b.en"}}
+    file_results = {
+        "one.mp3": {
+            "A": {"audio_secs": 10, "process_secs": 5, "words": ["a", "b", "c", "d"], "saved": True},
+            "B": {"audio_secs": 10, "process_secs": 2, "words": ["a", "x", "c", "d"], "saved": True},
+        },
+        "two.mp3": {"A": {"audio_secs": 10, "process_secs": 5, "words": ["e"], "saved": True}}, # B failed on this file
+    }
+    report = comparison_report(file_results, ["A", "B"], model_options)
+    assert report["models"]["A"]["files"] == 2 and report["models"]["B"]["files"] == 1
+    assert report["models"]["B"]["realtime_factor"] == 0.2
+    assert report["wer"]["A"]["B"] == 0.25 # only over the file both transcribed
+    assert report["files"]["two.mp3"]["wer"] == {"A": {}}
+
+
+def test_plan_model_groups():
+    memory = {"tiny": 1000, "small": 2000, "medium": 5000, "large": 10000}
+    assert plan_model_groups(["small", "tiny", "medium"], memory, 3000) == [["small", "tiny"], ["medium"]]
+    assert plan_model_groups(["large", "tiny"], memory, 4000) == [["large"], ["tiny"]] # too big for the budget: on its own
+    assert plan_model_groups(["small", "medium"], memory, None) == [["small"], ["medium"]]
@@ -0,0 +1,56 @@
+"""Estimate-only mode: the summary, memory plan and estimate without Whisper or torch."""
+
+import json
+import os
+import sys
+
+import pytest
+
+import utils_helper
+import whisper_wrapper
+
+
+class BlockHeavyImports:
+    """Import hook which fails the test if Whisper or torch is imported."""
+
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("whisper", "torch"):
+            raise AssertionError(f"{name} imported in estimate mode")
+        return None
+
+
+@pytest.fixture
+def estimate_batch(tmp_path, monkeypatch):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    probe_cache = {}
+    for name, duration in (("one.mp3", 600.0), ("two.mp3", 1200.0)):
+        full_path = audio_dir / name
+        full_path.write_bytes(b"x")
+        stat = os.stat(full_path)
+        probe_cache[os.path.abspath(full_path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "duration": duration}
+    (cache_dir / "probe_cache.json").write_text(json.dumps(probe_cache)) # so ffprobe is not needed
+
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    monkeypatch.setattr(whisper_wrapper, "use_log_file", False)
+    monkeypatch.setattr(whisper_wrapper, "path_to_audio", str(audio_dir))
+    monkeypatch.setattr(whisper_wrapper, "audio_format", ".mp3")
+    monkeypatch.setattr(whisper_wrapper, "search_subfolders", False)
+    monkeypatch.setattr(whisper_wrapper, "modified_after", None)
+    monkeypatch.setattr(whisper_wrapper, "path_for_cache", str(cache_dir))
+    monkeypatch.setattr(whisper_wrapper, "throughput_stats_path", str(cache_dir / "throughput_stats.json"))
+    monkeypatch.setattr(whisper_wrapper, "auto_route", False)
+    monkeypatch.setattr(whisper_wrapper, "memory_plan", "downgrade")
+    monkeypatch.setattr(whisper_wrapper, "memory_budget_mb", 0)
+    for name in ("whisper", "torch"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    monkeypatch.setattr(sys, "meta_path", [BlockHeavyImports(), *sys.meta_path])
+
+
+def test_estimate_without_whisper(estimate_batch):
+    estimate = whisper_wrapper.master_call_estimate(0, "Base_English")
+    assert estimate["file_count"] == 2 and estimate["audio_secs"] == 1800.0
+    assert estimate["unknown_durations"] == 0
+    assert "whisper" not in sys.modules and "torch" not in sys.modules
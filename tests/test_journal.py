@@ -0,0 +1,112 @@
+"""Progress journal: atomic writes, and which files a resumed batch skips."""
+
+import os
+
+import pytest
+
+import utils_helper
+import whisper_wrapper
+from utils_journal import journal_load, journal_mark
+
+MODEL_KEY = "Base_English"
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    """Audio files "one.mp3" and "two.mp3", with the wrapper's folders pointed into tmp_path and journalling switched on."""
+    for folder in ("audio", "output", "cache"):
+        (tmp_path / folder).mkdir()
+    for name in ("one.mp3", "two.mp3"):
+        (tmp_path / "audio" / name).write_bytes(b"audio " + name.encode())
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    monkeypatch.setattr(whisper_wrapper, "path_to_audio", str(tmp_path / "audio"))
+    monkeypatch.setattr(whisper_wrapper, "path_for_output", str(tmp_path / "output"))
+    monkeypatch.setattr(whisper_wrapper, "path_for_cache", str(tmp_path / "cache"))
+    monkeypatch.setattr(whisper_wrapper, "use_journal", True)
+    monkeypatch.setattr(whisper_wrapper, "resume_batch", True)
+    monkeypatch.setattr(whisper_wrapper, "move_processed", False)
+    monkeypatch.setattr(whisper_wrapper, "output_formats", ["txt", "srt"])
+    monkeypatch.setattr(whisper_wrapper, "journal", None)
+    return tmp_path
+
+
+def process(audio_file):
+    """Records a file as fully processed, as process_audio_file() would, writing its outputs."""
+    whisper_wrapper.record_stage(audio_file, "transcribed")
+    for output_format in ("txt", "srt"):
+        with open(whisper_wrapper.transcript_output_path(audio_file, MODEL_KEY, output_format), "w") as output_file:
+            output_file.write("transcript")
+    whisper_wrapper.record_stage(audio_file, "saved", MODEL_KEY)
+
+
+def resume(word_interval=0):
+    """Starts a new run, as master_call_loop() does, and returns the files it would still process."""
+    whisper_wrapper.journal_setup(MODEL_KEY, word_interval)
+    return [audio_file for _, audio_file in whisper_wrapper.resume_pending([(1, "one.mp3"), (2, "two.mp3")])]
+
+
+def test_saved_files_skipped_on_resume(batch):
+    whisper_wrapper.journal_setup(MODEL_KEY, 0)
+    process("one.mp3")
+    whisper_wrapper.record_stage("two.mp3", "transcribed") # interrupted before saving
+    assert resume() == ["two.mp3"]
+    assert not any(name.startswith("journal") for name in os.listdir(batch / "output"))
+    assert os.path.dirname(whisper_wrapper.journal_path) == str(batch / "cache" / "journals")
+
+
+def test_settings_mismatch_reruns(batch):
+    whisper_wrapper.journal_setup(MODEL_KEY, 0)
+    process("one.mp3")
+    assert resume(word_interval=10) == ["one.mp3", "two.mp3"]
+    assert resume(word_interval=0) == ["two.mp3"] # the original settings still match
+
+
+def test_missing_output_or_changed_audio_reruns(batch):
+    whisper_wrapper.journal_setup(MODEL_KEY, 0)
+    process("one.mp3")
+    process("two.mp3")
+    os.remove(whisper_wrapper.transcript_output_path("one.mp3", MODEL_KEY, "srt"))
+    (batch / "audio" / "two.mp3").write_bytes(b"a different recording")
+    assert resume() == ["one.mp3", "two.mp3"]
+
+
+def test_each_output_directory_has_its_own_journal(batch, monkeypatch):
+    whisper_wrapper.journal_setup(MODEL_KEY, 0)
+    process("one.mp3")
+    first_journal = whisper_wrapper.journal_path
+    (batch / "other_output").mkdir()
+    monkeypatch.setattr(whisper_wrapper, "path_for_output", str(batch / "other_output"))
+    assert resume() == ["one.mp3", "two.mp3"]
+    assert whisper_wrapper.journal_path != first_journal
+
+
+def test_no_resume_starts_afresh(batch, monkeypatch):
+    whisper_wrapper.journal_setup(MODEL_KEY, 0)
+    process("one.mp3")
+    monkeypatch.setattr(whisper_wrapper, "resume_batch", False)
+    assert resume() == ["one.mp3", "two.mp3"]
+
+
+def test_failed_write_keeps_previous_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    audio_path = tmp_path / "one.mp3"
+    audio_path.write_bytes(b"audio")
+    journal_path = str(tmp_path / "journals" / "journal.json")
+    journal = {"files": {}}
+    journal_mark(journal, journal_path, "one.mp3", "transcribed", str(audio_path), "")
+    saved = journal_load(journal_path, "")
+    assert set(saved["files"]["one.mp3"]["stages"]) == {"transcribed"}
+
+    def fail(fd):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(os, "fsync", fail)
+    journal_mark(journal, journal_path, "one.mp3", "saved", str(audio_path), "") # logged, not raised
+    assert journal_load(journal_path, "") == saved
+    assert os.listdir(tmp_path / "journals") == ["journal.json"] # no temporary file left
+
+
+def test_unreadable_journal_processes_everything(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    (tmp_path / "journal.json").write_text('{"files": {"one.mp3": ') # cut short
+    assert journal_load(str(tmp_path / "journal.json"), "") == {"files": {}}
+    assert journal_load(str(tmp_path / "missing.json"), "") == {"files": {}}
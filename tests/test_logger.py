@@ -0,0 +1,55 @@
+"""Queued log writer: entry formats, daily files, worker buffers and flushing."""
+
+import json
+from datetime import datetime as dt
+
+import utils_helper
+from utils_helper import log_file_write, log_flush, log_buffer_start, log_buffer_collect, log_entries_write, log_format_entry, log_dated_path
+
+
+def test_log_format_entry(monkeypatch):
+    timestamp = dt(2024, 2, 8, 13, 5, 9)
+    assert log_format_entry(timestamp, "Started.\n") == "2024-02-08_13-05-09 - Started.\n"
+    monkeypatch.setattr(utils_helper, "log_format", "json")
+    entry = json.loads(log_format_entry(timestamp, "Started.\n"))
+    assert entry["timestamp"] == "2024-02-08T13:05:09" and entry["message"] == "Started."
+
+
+def test_log_dated_path():
+    log_path = "/logs/log_whisper_transcripts_2024-02-08.txt"
+    assert log_dated_path(log_path, dt(2024, 2, 8, 23, 59)) == log_path
+    assert log_dated_path(log_path, dt(2024, 2, 9, 0, 1)) == "/logs/log_whisper_transcripts_2024-02-09.txt"
+    assert log_dated_path("/logs/my_log.txt", dt(2024, 2, 9)) == "/logs/my_log.txt"
+
+
+def test_entries_written_in_order_after_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", True)
+    log_path = str(tmp_path / "log.txt")
+    for number in range(1000):
+        log_file_write(f"message {number}\n", log_path)
+    log_flush()
+    lines = (tmp_path / "log.txt").read_text(encoding="utf-8").splitlines()
+    assert [line.split(" - ", 1)[1] for line in lines] == [f"message {number}" for number in range(1000)]
+
+
+def test_worker_buffer_written_as_one_block(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", True)
+    log_path = str(tmp_path / "log.txt")
+    log_buffer_start()
+    log_file_write("worker one\n", log_path)
+    log_file_write("worker two\n", log_path)
+    entries = log_buffer_collect()
+    assert [msg for _, msg in entries] == ["worker one\n", "worker two\n"]
+    log_flush()
+    assert not (tmp_path / "log.txt").exists() # held in memory until collected
+
+    log_entries_write(entries, log_path)
+    log_flush()
+    assert (tmp_path / "log.txt").read_text(encoding="utf-8").count("worker") == 2
+
+
+def test_no_log_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    log_file_write("screen only\n", str(tmp_path / "log.txt"))
+    log_flush()
+    assert not (tmp_path / "log.txt").exists()
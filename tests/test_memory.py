@@ -0,0 +1,76 @@
+"""Fitting num_workers and prefetch_depth into a memory budget."""
+
+import math
+
+import pytest
+
+from utils_audio import estimate_decoded_bytes
+from utils_memory import plan_memory, decoded_audio_mb, DECODE_OVERHEAD
+
+HOUR = 3600
+HOUR_MB = decoded_audio_mb(HOUR)
+
+
+def test_decoded_audio_mb_matches_decoded_bytes():
+    assert decoded_audio_mb(HOUR) == pytest.approx(estimate_decoded_bytes(HOUR) / (1024 * 1024))
+    assert 200 < HOUR_MB < 240 # 16 kHz float32: roughly 220MB per hour
+
+
+def test_everything_fits():
+    plan = plan_memory(1000, HOUR, HOUR, 4, 0, None, 100000)
+    assert plan["workers"] == 4 and plan["fits"]
+    assert plan["need_mb"] == pytest.approx(4 * (1000 + HOUR_MB * (1 + DECODE_OVERHEAD)))
+    assert plan["gpu_need_mb"] is None
+
+
+def test_workers_lowered_to_fit():
+    worker_mb = 5000 + HOUR_MB * (1 + DECODE_OVERHEAD)
+    plan = plan_memory(5000, HOUR, HOUR, 4, 2, 1024, 2.5 * worker_mb)
+    assert plan["workers"] == 2 and plan["fits"]
+    assert plan["need_mb"] <= plan["budget_mb"]
+
+
+def test_one_worker_prefetch_lowered_to_fit():
+    single_mb = 1000 + HOUR_MB * (1 + DECODE_OVERHEAD)
+    plan = plan_memory(1000, HOUR, HOUR, 1, 3, None, single_mb + 1.5 * HOUR_MB)
+    assert plan["workers"] == 1 and plan["ahead_files"] == 1 and plan["fits"]
+
+
+def test_prefetch_cap_limits_memory_for_files_ahead():
+    single_mb = 1000 + HOUR_MB * (1 + DECODE_OVERHEAD)
+    plan = plan_memory(1000, HOUR, HOUR, 1, 3, 100, single_mb + 100)
+    assert plan["ahead_files"] == 3 # the cap keeps the files ahead within 100MB
+    assert plan["need_mb"] == pytest.approx(single_mb + 100)
+
+
+def test_nothing_fits():
+    plan = plan_memory(10000, HOUR, HOUR, 4, 2, 1024, 4000)
+    assert plan["workers"] == 1 and plan["ahead_files"] == 0
+    assert not plan["fits"]
+
+
+def test_chunked_long_file_counts_parent_decode():
+    # long_file_mode: the parent holds the whole of the longest file, workers hold one chunk each
+    plan = plan_memory(1000, 10 * HOUR, 60, 3, 0, None, math.inf)
+    parent_mb = decoded_audio_mb(10 * HOUR) * (1 + DECODE_OVERHEAD)
+    assert plan["workers"] == 3
+    assert plan["need_mb"] == pytest.approx(parent_mb + 3 * (1000 + decoded_audio_mb(60) * (1 + DECODE_OVERHEAD)))
+
+
+def test_unlimited_budget():
+    plan = plan_memory(5000, HOUR, HOUR, 8, 0, None, math.inf)
+    assert plan["workers"] == 8 and plan["fits"]
+
+
+def test_gpu_holds_the_models():
+    # with a GPU, system memory only holds the decoded audio, and each copy of the model counts against the GPU
+    plan = plan_memory(5000, HOUR, HOUR, 4, 0, None, 2000, 11000)
+    assert plan["workers"] == 2 and plan["fits"]
+    assert plan["gpu_need_mb"] == 10000
+    assert plan["need_mb"] == pytest.approx(2 * HOUR_MB * (1 + DECODE_OVERHEAD))
+
+
+def test_model_too_big_for_gpu():
+    plan = plan_memory(7000, HOUR, HOUR, 1, 2, None, 100000, 6000)
+    assert plan["workers"] == 1 and plan["ahead_files"] == 2
+    assert not plan["fits"]
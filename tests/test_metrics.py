@@ -0,0 +1,67 @@
+"""Stage metrics: totals recorded from several threads, and the GPU peak measured around transcription only."""
+
+import sys
+import threading
+import types
+
+import pytest
+
+import utils_metrics
+from utils_metrics import stage_timer, record_stage_metrics, stage_metrics_collect
+
+
+@pytest.fixture(autouse=True)
+def metrics_on(monkeypatch):
+    monkeypatch.setattr(utils_metrics, "collect_metrics", True)
+    monkeypatch.setattr(utils_metrics, "stage_metrics", {})
+
+
+def fake_torch(monkeypatch):
+    """Puts a stand-in torch with a GPU in sys.modules, recording each reset of the peak GPU memory counter."""
+    resets = []
+    cuda = types.SimpleNamespace(
+        is_available=lambda: True,
+        is_initialized=lambda: True,
+        reset_peak_memory_stats=lambda: resets.append(True),
+        max_memory_allocated=lambda: 512 * 1024 * 1024,
+    )
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    return resets
+
+
+def test_totals_from_several_threads():
+    def record():
+        for _ in range(5000):
+            record_stage_metrics("move_processed_file", {"calls": 1, "total_secs": 0.5, "max_secs": 0.5, "rss_mb": None, "peak_rss_mb": None, "peak_gpu_mb": None})
+            with stage_timer("decode"):
+                pass
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = stage_metrics_collect()
+    assert metrics["move_processed_file"]["calls"] == 40000
+    assert metrics["move_processed_file"]["total_secs"] == 20000.0
+    assert metrics["decode"]["calls"] == 40000
+    assert utils_metrics.stage_metrics == {} # collected and reset
+
+
+def test_gpu_peak_only_around_transcription(monkeypatch):
+    resets = fake_torch(monkeypatch)
+    with stage_timer("transcribe"):
+        with stage_timer("decode"): # i.e. the prefetch thread decoding the next file meanwhile
+            pass
+    with stage_timer("move_processed_file"):
+        pass
+    assert len(resets) == 1
+    metrics = stage_metrics_collect()
+    assert metrics["transcribe"]["peak_gpu_mb"] == 512
+    assert metrics["decode"]["peak_gpu_mb"] is None and metrics["move_processed_file"]["peak_gpu_mb"] is None
+
+
+def test_stage_timer_off(monkeypatch):
+    monkeypatch.setattr(utils_metrics, "collect_metrics", False)
+    with stage_timer("transcribe"):
+        pass
+    assert stage_metrics_collect() == {}
@@ -0,0 +1,85 @@
+"""Moving processed files, including across devices."""
+
+import errno
+import os
+
+import pytest
+
+import utils_move
+from utils_move import copy_file_kernel, move_file
+
+DATA = bytes(range(256)) * 4096 # 1MB, so any misplaced block shows
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Makes renaming the source fail as it would across devices, so move_file() has to copy it."""
+    real_replace = os.replace
+
+    def replace(source_path, destination_path):
+        if not os.path.basename(source_path).startswith(".tmp_"):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        real_replace(source_path, destination_path)
+    monkeypatch.setattr(os, "replace", replace)
+
+
+@pytest.fixture
+def partial_copy_file_range(monkeypatch):
+    """Makes copy_file_range copy part of the file, then fail as it does between some filesystems, so copy_file_kernel() switches to sendfile part-way."""
+    real_copy_file_range = getattr(os, "copy_file_range", None)
+    calls = []
+
+    def copy_file_range(source_fd, destination_fd, count, offset_src=None, offset_dst=None):
+        calls.append(count)
+        if len(calls) > 1:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        count = min(count, 300 * 1000)
+        if real_copy_file_range is not None:
+            return real_copy_file_range(source_fd, destination_fd, count, offset_src, offset_dst)
+        data = os.pread(source_fd, count, offset_src)
+        return os.pwrite(destination_fd, data, offset_dst)
+    monkeypatch.setattr(os, "copy_file_range", copy_file_range, raising=False)
+    return calls
+
+
+@pytest.mark.skipif(not hasattr(os, "sendfile") or not hasattr(os, "pwrite"), reason="needs sendfile")
+def test_fallback_after_partial_copy(tmp_path, partial_copy_file_range):
+    (tmp_path / "source.mp3").write_bytes(DATA)
+    with open(tmp_path / "source.mp3", "rb") as source_file, open(tmp_path / "copy.mp3", "wb") as destination_file:
+        assert copy_file_kernel(source_file, destination_file, len(DATA)) == len(DATA)
+    assert len(partial_copy_file_range) == 2
+    assert (tmp_path / "copy.mp3").read_bytes() == DATA
+
+
+@pytest.mark.skipif(not hasattr(os, "sendfile") or not hasattr(os, "pwrite"), reason="needs sendfile")
+def test_cross_device_move(tmp_path, cross_device, partial_copy_file_range):
+    source_path = tmp_path / "source.mp3"
+    source_path.write_bytes(DATA)
+    (tmp_path / "processed").mkdir()
+    destination_path = tmp_path / "processed" / "source.mp3"
+    assert move_file(str(source_path), str(destination_path)) == "copied"
+    assert destination_path.read_bytes() == DATA
+    assert not source_path.exists()
+    assert os.listdir(tmp_path / "processed") == ["source.mp3"] # no temporary file left
+
+
+def test_incomplete_copy_keeps_source(tmp_path, cross_device, monkeypatch):
+    def copy_half(source_file, destination_file, size):
+        destination_file.write(source_file.read(size // 2))
+        return size // 2
+    monkeypatch.setattr(utils_move, "copy_file_kernel", copy_half)
+    source_path = tmp_path / "source.mp3"
+    source_path.write_bytes(DATA)
+    (tmp_path / "processed").mkdir()
+    with pytest.raises(OSError) as raised:
+        move_file(str(source_path), str(tmp_path / "processed" / "source.mp3"))
+    assert raised.value.errno == errno.EIO
+    assert source_path.read_bytes() == DATA
+    assert os.listdir(tmp_path / "processed") == []
+
+
+def test_same_device_rename(tmp_path):
+    source_path = tmp_path / "source.mp3"
+    source_path.write_bytes(DATA)
+    assert move_file(str(source_path), str(tmp_path / "moved.mp3")) == "renamed"
+    assert (tmp_path / "moved.mp3").read_bytes() == DATA and not source_path.exists()
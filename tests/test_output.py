@@ -0,0 +1,56 @@
+"""Subtitle timestamps and the SRT, VTT and JSON writers."""
+
+import io
+import json
+
+from utils_output import normalise_output_formats, subtitle_timestamp, write_srt, write_vtt, write_segments_json
+
+SEGMENTS = [
+    {"start": 0.0, "end": 2.5, "text": " Hello there.", "avg_logprob": -0.25, "no_speech_prob": 0.01},
+    {"start": 2.5, "end": 3.0, "text": "   "}, # no text: no cue
+    {"start": 3661.0016, "end": 3662.999, "text": " Fish & chips\n<b>now</b>"},
+]
+
+
+def test_subtitle_timestamp():
+    assert subtitle_timestamp(0, ",") == "00:00:00,000"
+    assert subtitle_timestamp(3723.456, ",") == "01:02:03,456"
+    assert subtitle_timestamp(3723.456, ".") == "01:02:03.456"
+    assert subtitle_timestamp(59.9996, ",") == "00:01:00,000" # rounds up into the next minute
+    assert subtitle_timestamp(-0.2, ",") == "00:00:00,000"
+    assert subtitle_timestamp(100 * 3600 + 1, ".") == "100:00:01.000"
+
+
+def test_write_srt():
+    output_file = io.StringIO()
+    write_srt(output_file, SEGMENTS)
+    assert output_file.getvalue() == (
+        "1\n00:00:00,000 --> 00:00:02,500\nHello there.\n\n"
+        "2\n01:01:01,002 --> 01:01:02,999\nFish & chips <b>now</b>\n\n"
+    )
+
+
+def test_write_vtt_escapes_markup():
+    output_file = io.StringIO()
+    write_vtt(output_file, SEGMENTS)
+    assert output_file.getvalue() == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:02.500\nHello there.\n\n"
+        "01:01:01.002 --> 01:01:02.999\nFish &amp; chips &lt;b&gt;now&lt;/b&gt;\n\n"
+    )
+
+
+def test_write_segments_json():
+    output_file = io.StringIO()
+    write_segments_json(output_file, SEGMENTS, "Hello there. Fish & chips", "one.mp3", "base.en")
+    output = json.loads(output_file.getvalue())
+    assert output["audio_file"] == "one.mp3" and output["model"] == "base.en"
+    assert [segment["id"] for segment in output["segments"]] == [0, 1, 2]
+    assert output["segments"][0] == {"id": 0, "start": 0.0, "end": 2.5, "text": " Hello there.", "avg_logprob": -0.25, "no_speech_prob": 0.01}
+    assert output["segments"][2]["start"] == 3661.002
+
+
+def test_normalise_output_formats():
+    assert normalise_output_formats(["TXT", ".srt", "vtt", "srt", "doc"]) == (("txt", "srt", "vtt"), ["doc"])
+    assert normalise_output_formats("json") == (("json",), [])
+    assert normalise_output_formats(["doc"]) == (("txt",), ["doc"])
@@ -0,0 +1,94 @@
+"""Ordering, dropping and backpressure in the staged pipeline."""
+
+import asyncio
+import random
+import threading
+import time
+
+from utils_pipeline import run_pipeline
+
+
+def sleepy(function, seed):
+    """Wraps function so each call takes a random few milliseconds, making concurrent workers finish out of order."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def wrapped(item):
+        with lock:
+            delay = rng.uniform(0, 0.005)
+        time.sleep(delay)
+        return function(item)
+    return wrapped
+
+
+def run(source, stages, queue_size=2):
+    errors = []
+    asyncio.run(run_pipeline(source, stages, queue_size, lambda name, item, e: errors.append((name, item, type(e).__name__))))
+    return errors
+
+
+def test_items_keep_their_order_through_concurrent_stages():
+    seen = []
+    stages = [
+        ("double", sleepy(lambda item: item * 2, 1), 4),
+        ("offset", sleepy(lambda item: item + 1, 2), 3),
+        ("collect", seen.append, 1),
+    ]
+    assert run(range(100), stages) == []
+    assert seen == [item * 2 + 1 for item in range(100)]
+
+
+def test_none_drops_an_item_without_breaking_the_order():
+    seen = []
+    stages = [
+        ("filter", sleepy(lambda item: None if item % 3 == 0 else item, 3), 4),
+        ("square", sleepy(lambda item: item * item, 4), 2),
+        ("collect", seen.append, 1),
+    ]
+    assert run(range(60), stages) == []
+    assert seen == [item * item for item in range(60) if item % 3 != 0]
+
+
+def test_errors_are_reported_and_the_item_dropped():
+    seen = []
+
+    def fragile(item):
+        if item in (4, 11):
+            raise ValueError(item)
+        return item
+
+    stages = [
+        ("fragile", sleepy(fragile, 5), 3),
+        ("collect", seen.append, 1),
+    ]
+    errors = run(range(15), stages)
+    assert sorted(errors) == [("fragile", 4, "ValueError"), ("fragile", 11, "ValueError")]
+    assert seen == [item for item in range(15) if item not in (4, 11)]
+
+
+def test_empty_source():
+    seen = []
+    assert run([], [("collect", seen.append, 2)]) == []
+    assert seen == []
+
+
+def test_source_is_not_read_far_ahead_of_a_slow_stage():
+    state = {"read": 0, "done": 0, "most_ahead": 0}
+    lock = threading.Lock()
+
+    def source():
+        for item in range(30):
+            with lock:
+                state["read"] += 1
+                state["most_ahead"] = max(state["most_ahead"], state["read"] - state["done"])
+            yield item
+
+    def slow(item):
+        time.sleep(0.002)
+        with lock:
+            state["done"] += 1
+
+    run(source(), [("pass", lambda item: item, 1), ("slow", slow, 1)], queue_size=1)
+    assert state["done"] == 30
+    # one item in each queue, one in each stage and one waiting to be passed on, plus the one being read
+    assert state["most_ahead"] <= 6
@@ -0,0 +1,72 @@
+"""Concurrent ffprobe duration probing and the probe cache."""
+
+import os
+import stat
+
+import pytest
+
+import utils_helper
+from utils_helper import audio_file_durations, probe_cache_load
+
+
+@pytest.fixture
+def fake_ffprobe(tmp_path, monkeypatch):
+    """Puts an ffprobe on PATH which reports the file's size in bytes as its duration (or fails on "bad" files), and records each file probed."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    calls_path = tmp_path / "calls.txt"
+    script = bin_dir / "ffprobe"
+    script.write_text(
+        "#!/bin/sh\n"
+        "for last; do :; done\n"
+        f"echo \"$last\" >> '{calls_path}'\n"
+        "case \"$last\" in *bad*) exit 1;; esac\n"
+        "wc -c < \"$last\"\n"
+    )
+    os.chmod(script, os.stat(script).st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+
+    def probed():
+        return sorted(os.path.basename(line) for line in calls_path.read_text().splitlines()) if calls_path.exists() else []
+    return probed
+
+
+def audio_folder(tmp_path, files):
+    folder = tmp_path / "audio"
+    folder.mkdir(exist_ok=True)
+    for name, size in files.items():
+        (folder / name).write_bytes(b"x" * size)
+    return str(folder)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="fake ffprobe is a shell script")
+def test_durations_cached_until_file_changes(tmp_path, fake_ffprobe):
+    folder = audio_folder(tmp_path, {"one.mp3": 10, "two.mp3": 20})
+    cache_path = str(tmp_path / "cache" / "probe_cache.json")
+    durations = audio_file_durations(folder, ["one.mp3", "two.mp3"], "", probe_workers=2, probe_cache_path=cache_path)
+    assert durations == {"one.mp3": 10.0, "two.mp3": 20.0}
+    assert fake_ffprobe() == ["one.mp3", "two.mp3"]
+    assert probe_cache_load(cache_path)[os.path.abspath(os.path.join(folder, "one.mp3"))]["duration"] == 10.0
+
+    audio_folder(tmp_path, {"two.mp3": 25}) # changed since it was probed
+    durations = audio_file_durations(folder, ["one.mp3", "two.mp3"], "", probe_workers=2, probe_cache_path=cache_path)
+    assert durations == {"one.mp3": 10.0, "two.mp3": 25.0}
+    assert fake_ffprobe() == ["one.mp3", "two.mp3", "two.mp3"] # only the changed file probed again
+
+
+@pytest.mark.skipif(os.name != "posix", reason="fake ffprobe is a shell script")
+def test_failures_recorded_as_none(tmp_path, fake_ffprobe):
+    folder = audio_folder(tmp_path, {"bad.mp3": 5, "good.mp3": 7})
+    cache_path = str(tmp_path / "probe_cache.json")
+    durations = audio_file_durations(folder, ["bad.mp3", "missing.mp3", "good.mp3"], "", probe_cache_path=cache_path)
+    assert durations == {"bad.mp3": None, "missing.mp3": None, "good.mp3": 7.0}
+    assert len(probe_cache_load(cache_path)) == 1 # failures are not cached
+
+
+def test_probe_cache_load_unreadable(tmp_path):
+    assert probe_cache_load(str(tmp_path / "missing.json")) == {}
+    (tmp_path / "broken.json").write_text("{not json")
+    assert probe_cache_load(str(tmp_path / "broken.json")) == {}
+    (tmp_path / "list.json").write_text("[]")
+    assert probe_cache_load(str(tmp_path / "list.json")) == {}
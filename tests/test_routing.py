@@ -0,0 +1,83 @@
+"""Routing each file to a model from the language and confidence of a short pre-pass."""
+
+import numpy as np
+import pytest
+
+import utils_helper
+import whisper_wrapper
+from whisper_wrapper import route_audio_file
+
+SAMPLE_RATE = 16000
+
+
+class ProbeModel:
+    """Stands in for route_probe_model, giving a fixed language and segments and recording the length of audio it was given."""
+
+    def __init__(self, language, segments):
+        self.language = language
+        self.segments = segments
+        self.samples = []
+
+    def transcribe(self, audio, **decode_options):
+        if self.language is None:
+            raise RuntimeError("probe failed")
+        self.samples.append(len(audio))
+        return {"text": "", "segments": self.segments, "language": self.language}
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(utils_helper, "use_log_file", False)
+    monkeypatch.setattr(whisper_wrapper, "route_probe_model", "Tiny_Multilingual")
+    monkeypatch.setattr(whisper_wrapper, "route_sample_secs", 30)
+    monkeypatch.setattr(whisper_wrapper, "route_models", {"english": "Small_English", "other": "Medium_Multilingual"})
+    monkeypatch.setattr(whisper_wrapper, "route_escalate_models", {"english": "Medium_English", "other": "Large_Multilingual"})
+    monkeypatch.setattr(whisper_wrapper, "route_escalate_logprob", -0.8)
+
+    def use_probe(language, segments):
+        probe = ProbeModel(language, segments)
+        monkeypatch.setattr(whisper_wrapper, "routed_models", {"Tiny_Multilingual": probe})
+        return probe
+    return use_probe
+
+
+AUDIO = np.zeros(120 * SAMPLE_RATE, dtype=np.float32)
+
+
+def test_english_and_other_languages(routing):
+    probe = routing("en", [{"start": 0, "end": 5, "avg_logprob": -0.2}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Small_English"
+    assert probe.samples == [30 * SAMPLE_RATE] # only the first route_sample_secs
+    routing("fr", [{"start": 0, "end": 5, "avg_logprob": -0.2}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Medium_Multilingual"
+
+
+def test_low_confidence_escalates(routing):
+    routing("en", [{"start": 0, "end": 5, "avg_logprob": -1.5}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Medium_English"
+    routing("de", [{"start": 0, "end": 5, "avg_logprob": -1.5}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Large_Multilingual"
+
+
+def test_logprob_weighted_by_duration(routing):
+    # a short unclear phrase does not outweigh a long clear one: (-2.0 * 1 + -0.1 * 19) / 20 = -0.195
+    routing("en", [{"start": 0, "end": 1, "avg_logprob": -2.0}, {"start": 1, "end": 20, "avg_logprob": -0.1}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Small_English"
+
+
+def test_no_escalation_threshold(routing, monkeypatch):
+    monkeypatch.setattr(whisper_wrapper, "route_escalate_logprob", None)
+    routing("en", [{"start": 0, "end": 5, "avg_logprob": -3.0}])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Small_English"
+
+
+def test_no_speech_is_not_escalated(routing):
+    routing("en", [])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Small_English"
+
+
+def test_falls_back_to_batch_model(routing):
+    routing("en", [])
+    assert route_audio_file("one.mp3", None, "Base_English") == "Base_English" # not decoded
+    routing(None, [])
+    assert route_audio_file("one.mp3", AUDIO, "Base_English") == "Base_English" # pre-pass failed
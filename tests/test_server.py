@@ -0,0 +1,111 @@
+"""Model server: socket ownership checks, and a request round trip."""
+
+import os
+import socket
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from utils_server import model_server_socket_path, prepare_socket_directory, socket_directory_trusted, socket_trusted, connect_model_server, ModelServer
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def transcribe(self, audio, **decode_options):
+        return {"text": f"{self.name} {len(audio)}", "segments": [], "language": decode_options.get("language")}
+
+
+def listening_socket(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(socket_path))
+    return sock
+
+
+def test_default_socket_path(monkeypatch):
+    assert model_server_socket_path("/srv/models.sock") == "/srv/models.sock"
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    assert model_server_socket_path("") == "/run/user/1000/whisper_wrapper/models.sock"
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert model_server_socket_path("").endswith(f"whisper_wrapper-{os.getuid()}{os.sep}models.sock")
+
+
+def test_prepare_socket_directory(tmp_path):
+    socket_path = tmp_path / "server" / "models.sock"
+    prepare_socket_directory(str(socket_path))
+    assert stat.S_IMODE(os.stat(socket_path.parent).st_mode) & 0o077 == 0
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        prepare_socket_directory(str(shared / "models.sock"))
+
+
+def test_socket_directory_trusted(tmp_path):
+    assert socket_directory_trusted(str(tmp_path))
+    os.chmod(tmp_path, 0o777)
+    assert not socket_directory_trusted(str(tmp_path)) # anyone could swap the socket
+    os.chmod(tmp_path, 0o1777)
+    assert socket_directory_trusted(str(tmp_path)) # sticky, as on /tmp
+    os.chmod(tmp_path, 0o700)
+    assert not socket_directory_trusted(str(tmp_path / "missing"))
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+def test_socket_trusted(tmp_path):
+    socket_path = tmp_path / "models.sock"
+    with listening_socket(socket_path):
+        assert socket_trusted(str(socket_path))
+        link_path = tmp_path / "link.sock"
+        os.symlink(socket_path, link_path)
+        assert not socket_trusted(str(link_path))
+        os.chmod(tmp_path, 0o777)
+        assert not socket_trusted(str(socket_path))
+        os.chmod(tmp_path, 0o700)
+    (tmp_path / "plain.sock").write_text("")
+    assert not socket_trusted(str(tmp_path / "plain.sock"))
+    assert not socket_trusted(str(tmp_path / "missing.sock"))
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="needs root to hand the socket to another user")
+def test_socket_of_another_user_not_trusted(tmp_path):
+    socket_path = tmp_path / "models.sock"
+    with listening_socket(socket_path):
+        os.chown(socket_path, 12345, 12345)
+        assert not socket_trusted(str(socket_path))
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+def test_connect_refuses_untrusted_socket(tmp_path):
+    plain_path = tmp_path / "plain.sock"
+    plain_path.write_text("")
+    assert connect_model_server(str(plain_path), "base.en", None, str(tmp_path / "log.txt")) is None
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+def test_transcribe_through_server(tmp_path):
+    socket_path = str(tmp_path / "models.sock")
+    loads = []
+
+    def model_loader(name):
+        loads.append(name)
+        return FakeModel(name)
+
+    server = ModelServer(socket_path, model_loader, lambda path: np.zeros(16000, dtype=np.float32), str(tmp_path / "log.txt"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        client = connect_model_server(socket_path, "base.en", None, str(tmp_path / "log.txt"))
+        assert client is not None
+        result = client.transcribe(np.ones(320, dtype=np.float32), language="en")
+        assert result == {"text": "base.en 320", "segments": [], "language": "en"}
+        assert client.transcribe(str(tmp_path / "one.mp3"))["text"] == "base.en 16000" # decoded by the server
+        assert connect_model_server(socket_path, "base.en", None, str(tmp_path / "log.txt")) is not None
+        assert loads == ["base.en"] # kept loaded between runs
+    finally:
+        server.shutdown()
+        server.server_close()
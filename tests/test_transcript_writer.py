@@ -0,0 +1,112 @@
+"""TranscriptWriter must give byte-identical output to the original format_transcript()."""
+
+import io
+import random
+
+import pytest
+
+from utils_helper import TranscriptWriter, insert_newlines
+
+
+def reference_insert_newlines(text, word_interval):
+    """insert_newlines() as it was before TranscriptWriter."""
+    if word_interval == 0:
+        return text
+    words = text.split()
+    for i in range(word_interval - 1, len(words), word_interval):
+        words[i] = words[i] + '\n'
+    return ' '.join(words)
+
+
+def reference_format_transcript(raw_transcript, word_interval, header, delimiter):
+    """format_transcript() as it was before TranscriptWriter: the whole transcript built as one string."""
+    linebreak_transcript = reference_insert_newlines(raw_transcript, word_interval)
+    formatted_transcript = header + linebreak_transcript
+    end_delimiter = f"\n{delimiter}\n"
+    word_count = f"\nWord count: {len(formatted_transcript.split())}"
+    formatted_transcript += word_count + end_delimiter
+    lines = formatted_transcript.splitlines()
+    return "\n".join(f"{i+1}: {line}" for i, line in enumerate(lines))
+
+
+# Words, punctuation and every kind of whitespace and line break str.split() and str.splitlines() recognise
+PIECES = ["a", "b", "é", "word", ".", " ", "  ", "\n", "\r", "\r\n", "\t", "\x0b", "\x0c", "\x1c", "\x85", " ", "　"]
+WORD_INTERVALS = [0, 1, 2, 3, 5, 10]
+
+
+def random_text(rng, length):
+    return "".join(rng.choice(PIECES) for _ in range(length))
+
+
+def cases(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng, random_text(rng, rng.randrange(0, 60)), rng.choice(WORD_INTERVALS), random_text(rng, rng.randrange(0, 12)), random_text(rng, rng.randrange(0, 5))
+
+
+def write_whole(raw, word_interval, header, delimiter, lines_per_write):
+    output = io.StringIO()
+    writer = TranscriptWriter(output, word_interval)
+    writer.lines_per_write = lines_per_write
+    writer.write_header(header)
+    writer.write_complete_transcript(raw)
+    writer.finish(delimiter)
+    return output.getvalue()
+
+
+def write_chunked(raw, word_interval, header, delimiter, cuts):
+    output = io.StringIO()
+    writer = TranscriptWriter(output, word_interval)
+    writer.write_header(header)
+    start = 0
+    for cut in sorted(cuts) + [len(raw)]:
+        writer.write_transcript(raw[start:cut])
+        start = cut
+    writer.finish(delimiter)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("lines_per_write", [1, 2, 1000])
+def test_write_complete_transcript_matches_reference(lines_per_write):
+    for _, raw, word_interval, header, delimiter in cases(5000, lines_per_write):
+        expected = reference_format_transcript(raw, word_interval, header, delimiter)
+        assert write_whole(raw, word_interval, header, delimiter, lines_per_write) == expected, (raw, word_interval, header, delimiter)
+
+
+def test_chunked_write_transcript_matches_reference():
+    # pieces split at arbitrary points, including part-way through words and through "\r\n", as when streaming segments
+    for rng, raw, word_interval, header, delimiter in cases(10000, 17):
+        cuts = [rng.randrange(len(raw) + 1) for _ in range(rng.randrange(0, 6))]
+        expected = reference_format_transcript(raw, word_interval, header, delimiter)
+        assert write_chunked(raw, word_interval, header, delimiter, cuts) == expected, (raw, word_interval, header, delimiter, cuts)
+
+
+def test_complete_transcript_after_chunks_matches_reference():
+    for rng, raw, word_interval, header, delimiter in cases(5000, 23):
+        cut = rng.randrange(len(raw) + 1)
+        output = io.StringIO()
+        writer = TranscriptWriter(output, word_interval)
+        writer.write_header(header)
+        writer.write_transcript(raw[:cut])
+        writer.write_complete_transcript(raw[cut:])
+        writer.finish(delimiter)
+        assert output.getvalue() == reference_format_transcript(raw, word_interval, header, delimiter), (raw, word_interval, header, delimiter, cut)
+
+
+def test_long_transcript_matches_reference():
+    rng = random.Random(5)
+    raw = " ".join(rng.choice(["the", "quick", "fox,", "jumps."]) for _ in range(50000))
+    header = "*****\nFilename: example.mp3\nTranscription Model: medium.en\n*****\n"
+    for word_interval in (0, 7, 10):
+        assert write_whole(raw, word_interval, header, "*****", 1000) == reference_format_transcript(raw, word_interval, header, "*****")
+
+
+def test_insert_newlines_matches_reference():
+    for _, raw, word_interval, _, _ in cases(5000, 31):
+        assert insert_newlines(raw, word_interval) == reference_insert_newlines(raw, word_interval), (raw, word_interval)
+
+
+def test_write_complete_transcript_rejects_failed_transcription():
+    writer = TranscriptWriter(io.StringIO(), 10)
+    with pytest.raises(TypeError):
+        writer.write_complete_transcript(False)
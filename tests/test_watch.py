@@ -0,0 +1,73 @@
+"""Watch-folder scanning: files are only picked up once they stop changing."""
+
+import os
+import threading
+import time
+
+from utils_watch import inotify_open, watch_wait, watch_scan, watch_settling
+
+
+def write(path, data):
+    with open(path, "wb") as audio_file:
+        audio_file.write(data)
+
+
+def test_file_queued_once_settled(tmp_path):
+    watched = {}
+    write(tmp_path / "one.mp3", b"a")
+    write(tmp_path / "notes.txt", b"a")
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == [] # first sighting
+    assert list(watched) == ["one.mp3"] and watch_settling(watched)
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == ["one.mp3"]
+    assert not watch_settling(watched)
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == [] # returned once only
+
+
+def test_growing_file_waits(tmp_path):
+    watched = {}
+    write(tmp_path / "two.mp3", b"a")
+    watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0)
+    write(tmp_path / "two.mp3", b"ab") # still being copied
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == []
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == ["two.mp3"]
+
+
+def test_settle_secs(tmp_path):
+    watched = {}
+    write(tmp_path / "one.mp3", b"a")
+    watch_scan(str(tmp_path), ".mp3", watched, settle_secs=60)
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=60) == []
+    watched["one.mp3"]["since"] -= 61
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=60) == ["one.mp3"]
+
+
+def test_replaced_file_queued_again_and_removed_file_forgotten(tmp_path):
+    watched = {}
+    write(tmp_path / "one.mp3", b"a")
+    watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0)
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == ["one.mp3"]
+    write(tmp_path / "one.mp3", b"a different recording")
+    watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0)
+    assert watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0) == ["one.mp3"]
+    os.remove(tmp_path / "one.mp3")
+    watch_scan(str(tmp_path), ".mp3", watched, settle_secs=0)
+    assert watched == {}
+
+
+def test_watch_wait_returns_on_stop_or_new_file(tmp_path):
+    stop_event = threading.Event()
+    stop_event.set()
+    start = time.monotonic()
+    watch_wait(None, 10, stop_event)
+    assert time.monotonic() - start < 1
+
+    inotify_fd = inotify_open(str(tmp_path))
+    if inotify_fd is None: # not Linux, or no inotify: polling only
+        return
+    try:
+        threading.Timer(0.2, write, (tmp_path / "one.mp3", b"a")).start()
+        start = time.monotonic()
+        watch_wait(inotify_fd, 10, threading.Event())
+        assert time.monotonic() - start < 5
+    finally:
+        os.close(inotify_fd)
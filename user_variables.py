@@ -15,11 +15,16 @@ use_log_file = True # True or False only
 """
 path_to_logs = "logs/" # supply empty string "" for the program directory, or a directory path. Do not use None.
 
+""" Choose the format of the log file.
+- "text" writes one readable "timestamp - message" entry at a time to a .txt file.
+- "json" writes one JSON object per line (keys "timestamp", "pid" and "message") to a .jsonl file, for loading into log analysis tools."""
+log_format = "text" # "text" or "json"
+
 
 """ Specify directory path containing audio files to be transcribed.
 - For relative paths, supply empty string "" to use the program directory, or a directory path i.e. "output/". 
 - Path cannot be None.
-- Files in subfolders will NOT be enumerated or processed.
+- Files in subfolders are only processed if search_subfolders is True (below).
 - If the directory does not exist, program will exit with an error message."""
 path_to_audio = "batch/" 
 
@@ -34,37 +39,211 @@ path_for_output = "output/"
 - Directory can be the same as path_for_output, or different.
 - For relative paths, supply empty string "" to use the program directory, or a directory path i.e. "output/". 
 - Path cannot be None.
-- Directory will be created if doesn't exist. """
+- Directory will be created if doesn't exist.
+- With background_moves = True, files are moved by a background thread while the next file is transcribed. This helps most when path_for_processed is on a different drive or network share (i.e. a NAS), where each move is a full copy.
+- Moves between drives copy the file (using the operating system's fast copy where available), check the copy is complete, and only then delete the original."""
 move_processed = True # True or False only
 path_for_processed = "output/" 
+background_moves = True # True or False only
 
 
 """Specify target audio file format.
-- only one file type at a time can be processed
-- include the . and make sure the case matches the actual file extension:
-".wav" will not match if the files are ".WAV" """
+- Either one extension, i.e. ".mp4", or a list of extensions, i.e. [".mp3", ".wav", ".m4a", ".mp4"]
+- include the . (extensions are matched regardless of case, so ".wav" also matches ".WAV")"""
 audio_format = ".mp4" # Note: 
 
 
+""" Choose which files in path_to_audio are processed.
+- search_subfolders = True also processes files in subfolders of path_to_audio (and their subfolders). Transcripts (and moved audio files) are saved in matching subfolders of path_for_output (and path_for_processed).
+- modified_after = "2024-03-01" (or "2024-03-01 18:30") only processes files last modified at or after that date and time. Supply an empty string "" to process files of any age.
+- lazy_discovery = True starts transcribing as soon as the first file is found, instead of first listing every file. Useful for very large folder trees, but the pre-processing summary will not have a file count or time estimate, and long_file_mode has no effect (as file durations are not measured in advance)."""
+search_subfolders = False # True or False only
+modified_after = ""
+lazy_discovery = False # True or False only
+
+
+""" Choose the order in which files are processed.
+- "alphabetical" processes files in filename order (original behaviour).
+- "shortest_first" processes the shortest recordings first, so short files are not kept waiting behind long ones.
+- "longest_first" processes the longest recordings first. With num_workers above 1, this keeps all the workers busy until near the end of the batch, so the whole batch finishes sooner.
+- Whatever the order, the "Batch process order" and episode numbers in the header follow alphabetical order, so they are the same on every run.
+- Uses the durations measured for the time estimate, so has no effect with lazy_discovery."""
+processing_order = "alphabetical" # "alphabetical", "shortest_first" or "longest_first"
+
+
 """Choose the Whisper transcription model"""
-# Whisper Model Options (tiny & base 1GB VRAM, small 2GB, medium 5GB, large 10GB). Non .en are multilingual. en's are best for English.
+# Whisper Model Options (tiny & base 1GB VRAM, small 2GB, medium 5GB, large 10GB, as memory_mb). Non .en are multilingual. en's are best for English.
 
 model_options = {
-    "Tiny_English": {"name": "tiny.en", "speed_x": 32, "alt_name": "tiny_en"},
-    "Base_English": {"name": "base.en", "speed_x": 16, "alt_name": "base_en"},
-    "Small_English": {"name": "small.en", "speed_x": 6, "alt_name": "small_en"},
-    "Medium_English": {"name": "medium.en", "speed_x": 2, "alt_name": "medium_en"},
-    "Tiny_Multilingual": {"name": "tiny", "speed_x": 32, "alt_name": "tiny_multi"},
-    "Base_Multilingual": {"name": "base", "speed_x": 16, "alt_name": "base_multi"},
-    "Small_Multilingual": {"name": "small", "speed_x": 6, "alt_name": "small_multi"},
-    "Medium_Multilingual": {"name": "medium", "speed_x": 2, "alt_name": "medium_multi"},
-    "Large_Multilingual": {"name": "large", "speed_x": 1, "alt_name": "large_multi"}
+    "Tiny_English": {"name": "tiny.en", "speed_x": 32, "alt_name": "tiny_en", "memory_mb": 1000},
+    "Base_English": {"name": "base.en", "speed_x": 16, "alt_name": "base_en", "memory_mb": 1000},
+    "Small_English": {"name": "small.en", "speed_x": 6, "alt_name": "small_en", "memory_mb": 2000},
+    "Medium_English": {"name": "medium.en", "speed_x": 2, "alt_name": "medium_en", "memory_mb": 5000},
+    "Tiny_Multilingual": {"name": "tiny", "speed_x": 32, "alt_name": "tiny_multi", "memory_mb": 1000},
+    "Base_Multilingual": {"name": "base", "speed_x": 16, "alt_name": "base_multi", "memory_mb": 1000},
+    "Small_Multilingual": {"name": "small", "speed_x": 6, "alt_name": "small_multi", "memory_mb": 2000},
+    "Medium_Multilingual": {"name": "medium", "speed_x": 2, "alt_name": "medium_multi", "memory_mb": 5000},
+    "Large_Multilingual": {"name": "large", "speed_x": 1, "alt_name": "large_multi", "memory_mb": 10000}
     }
 
 """ 
 - Supply the dictionary key ("Tiny_English"), NOT the model name ("tiny.en")
 - See print statements (each file) / log entry (file batch) produced by process_time_estimator() for processing time estimations."""
-model_key = "Medium_English" # spelling must match exactly. 
+model_key = "Medium_English" # spelling must match exactly.
+
+
+""" Choose models to compare, run with `python main.py --compare`.
+- Each file in path_to_audio is decoded once, and every model in compare_models transcribes the same decoded audio. Transcripts are saved as usual (in each of output_formats), with each model's alt_name suffix.
+- Models whose memory_mb (in model_options) fits in the memory available at the start run at the same time; the rest take turns. Enter a figure in MB for compare_memory_mb to use that instead of the measured available memory.
+- A report of each model's realtime factor (processing time / audio duration, lower is faster), word count and the word error rate between each pair of models is logged and saved as JSON in path_for_output.
+- The transcript cache, progress journal and moving of processed files are not used, so the same files can be compared again.
+- Supply dictionary keys, as for model_key."""
+compare_models = ["Small_English", "Medium_English"]
+compare_memory_mb = 0 # 0 = measure the available memory
+
+
+""" Choose whether each file should be routed to a model automatically, rather than transcribing the whole batch with model_key.
+- Before each file is transcribed, route_probe_model transcribes the first route_sample_secs of it, to detect the language and measure how confident it is (Whisper's average log-probability: 0 is certain, more negative is less sure, i.e. noisy or unclear audio).
+- English recordings go to route_models["english"], everything else to route_models["other"] (which should be multilingual).
+- If the average log-probability is below route_escalate_logprob, the file goes to the matching model in route_escalate_models instead. Enter None to never escalate.
+- Transcripts are saved with the suffix of the model actually used, and each routing decision and its cost are logged. model_key is still loaded, and used for any file which cannot be routed.
+- Each model is loaded the first time it is needed and then kept, so memory must allow for all of them (see the memory guide above model_options).
+- route_probe_model must be multilingual, as the English-only models cannot detect the language. Supply dictionary keys, as for model_key."""
+auto_route = False # True or False only
+route_probe_model = "Tiny_Multilingual"
+route_sample_secs = 30
+route_models = {"english": "Small_English", "other": "Medium_Multilingual"}
+route_escalate_models = {"english": "Medium_English", "other": "Large_Multilingual"}
+route_escalate_logprob = -0.8
+
+
+""" Choose how many seconds the pre-processing summary (and time estimate) stays on screen before transcription starts, giving a chance to stop the program with Ctrl+C if anything is wrong.
+- Enter 0 to start straight away (i.e. for scheduled or unattended runs)."""
+summary_pause_secs = 5
+
+
+""" Choose how many worker processes should transcribe files in parallel.
+- 1 processes the batch one file at a time with a single copy of the model (original behaviour).
+- Above 1, each worker process loads its own copy of the model and takes the next file from a shared queue, so CPU cores are shared out between the workers.
+- Each worker holds a full copy of the model, so check the memory guide above model_options before raising this (memory_plan, below, lowers it to what fits).
+- If an invalid value is entered, 1 will be substituted."""
+num_workers = 1
+
+
+""" Choose how many upcoming audio files should be decoded in the background while the current file is transcribed.
+- Whisper must decode each file (with ffmpeg) to 16 kHz audio before transcription starts. Decoding the next file(s) on a background thread means the model does not have to wait for this.
+- Enter 0 to switch this off and let Whisper decode each file itself.
+- Decoded audio takes roughly 230MB of memory per hour of recording, so prefetch_memory_mb caps the total decoded audio held waiting to be transcribed.
+- Only used when num_workers is 1."""
+prefetch_depth = 2
+prefetch_memory_mb = 1024
+
+
+""" Choose whether each file's steps should run as a staged pipeline, so that reading, decoding, saving and moving files overlap with transcription instead of waiting for it.
+- Files pass through the stages discover, probe (measure duration), decode, transcribe, format, save and move, each working on a different file at the same time. Each stage takes the files in batch order, and the transcripts, header numbering, journal and moves are the same as without the pipeline (log messages from different stages can interleave).
+- pipeline_queue_size is the most files waiting between one stage and the next, so at most pipeline_queue_size decoded files (roughly 230MB of memory per hour of recording each) wait to be transcribed. Replaces prefetch_depth when in use.
+- pipeline_concurrency sets how many files each stage works on at once. Transcription always handles one file at a time, as there is one copy of the model. Missing or invalid entries count as 1.
+- Only used when num_workers is 1."""
+use_pipeline = False # True or False only
+pipeline_queue_size = 2
+pipeline_concurrency = {"probe": 4, "decode": 1, "format": 2, "save": 2, "move": 1}
+
+
+""" Choose whether num_workers and prefetch_depth should be checked against the memory available before the batch starts, so a batch is not stopped part-way by running out of memory.
+- Memory needed is estimated from the model's memory_mb (in model_options; all the routing models with auto_route), once per worker process, plus the decoded audio of the longest file in the batch (about 220MB per hour of recording, and half as much again while it is being decoded) for each worker and for each file decoded ahead.
+- If Whisper will use a GPU, the models are counted against the free GPU memory instead, and system memory only has to hold the decoded audio. To check for a GPU, Whisper (and torch) is imported before the summary rather than when the model is loaded. python main.py --estimate and runs using the model server never import it, so they plan against system memory.
+- "downgrade" lowers num_workers and prefetch_depth (or pipeline_queue_size) to what fits, and warns if even one worker may not fit. "strict" does the same, but stops the program if even one worker would not fit. "warn" only reports what would fit. "off" skips the check.
+- memory_budget_mb is the system memory the batch may use. Enter 0 to use the memory available when the program starts, less memory_headroom_mb kept free for everything else running on the machine.
+- The plan is shown in the pre-processing summary. Without durations (lazy_discovery, or ffprobe unavailable), the longest file is assumed to be an hour long."""
+memory_plan = "downgrade" # "off", "warn", "downgrade" or "strict"
+memory_budget_mb = 0
+memory_headroom_mb = 1024
+
+
+""" Choose whether long recordings should be split into chunks and transcribed by all the workers at once.
+- Only used when num_workers is above 1. Files of at least long_file_threshold_mins are transcribed after the rest of the batch, with their chunks shared out between the workers.
+- Recordings are split at the quietest point near every chunk_length_secs, and each chunk includes chunk_overlap_secs of audio either side of the split for context. The chunk transcripts are joined back into one transcript.
+- Transcripts of split files can differ slightly from whole-file transcripts around the split points."""
+long_file_mode = True # True or False only
+long_file_threshold_mins = 30
+chunk_length_secs = 600
+chunk_overlap_secs = 5
+
+
+""" Choose whether transcripts should be written to disk as Whisper works through each file, rather than all at once at the end.
+- The transcript is built up in a '.partial' file in path_for_output (so progress on a long recording can be checked), then renamed to the usual .txt name when finished.
+- To do this, each file is transcribed in chunks of about stream_chunk_secs, split at quiet points (with chunk_overlap_secs above). The end of each chunk's text is passed to Whisper as context for the next chunk.
+- The finished file has exactly the same layout as a non-streamed transcript."""
+stream_transcript = False # True or False only
+stream_chunk_secs = 120
+
+
+""" Choose whether finished transcripts should be cached, so the same recording is never transcribed twice by the same model.
+- Recordings are recognised by their contents, not their filename, so a renamed copy of an earlier file is still a cache hit.
+- A different model or different decode_options (below) counts as a different transcript.
+- For relative paths, supply empty string "" to use the program directory, or a directory path i.e. "cache/". Directory will be created if doesn't exist.
+- When the cache grows beyond transcript_cache_mb, the least recently used transcripts are deleted.
+- Off by default, as every file has to be read once more to be recognised, and the cache keeps a copy of each transcript. Worth switching on if the same recordings are likely to come round again, i.e. re-running a batch with a different word_interval or output_formats, which are applied after the cache."""
+use_transcript_cache = False # True or False only
+path_for_cache = "cache/"
+transcript_cache_mb = 500
+
+
+""" Choose whether decoded audio should be cached, so each recording is only decoded by ffmpeg once, however many models or re-runs it goes through.
+- i.e. re-running a batch with Small_English and then Medium_English decodes each file once rather than twice.
+- Decoded audio is stored as .npy files in an "audio" folder in path_for_cache, and is read straight from disk (memory-mapped) when used again.
+- Decoded audio takes about 230MB per hour of recording. When the cache grows beyond audio_cache_mb, the least recently used recordings are deleted."""
+use_audio_cache = False # True or False only
+audio_cache_mb = 20000
+
+
+""" Optional decoding options passed to Whisper's transcribe function, i.e. {"language": "en", "temperature": 0}.
+- Leave as an empty dictionary {} to use Whisper's defaults."""
+decode_options = {}
+
+
+""" Choose how many files ffprobe should read at once when measuring durations for the processing time estimate.
+- Durations are cached in path_for_cache, so files which have not changed since the last run are not probed again."""
+probe_workers = 8
+
+
+""" Choose whether progress should be recorded in a journal, so an interrupted batch can be resumed.
+- Each file's progress (transcribed, saved, moved) is recorded as each stage completes, in a "journals" folder in path_for_cache, one journal per model and output directory. Nothing is added to path_for_output.
+- With resume_batch = True, files already transcribed and saved in an earlier run are skipped (and moved, if that step had not happened yet). A file is only skipped if its output file(s) are still in path_for_output and it was processed with the same settings (word_interval, delimiter, header fields, output_formats, wrap_on_segments, decode_options, auto_route and path_for_output); otherwise it is transcribed again.
+- With resume_batch = False, the journal is started afresh and every file is processed."""
+use_journal = True # True or False only
+resume_batch = False # True or False only
+
+
+""" Choose whether the time and memory taken by each processing stage (probing, model load, decoding, transcription, saving, moving etc.) should be measured.
+- At the end of each batch, a JSON report (metrics_<date-time>.json) is saved to path_for_metrics.
+- A Prometheus file (whisper_wrapper.prom) is also written to prometheus_textfile_dir, for node exporter's textfile collector to pick up. Supply an empty string "" to write it to path_for_metrics instead.
+- With collect_metrics = False, nothing is measured and processing is unaffected."""
+collect_metrics = False # True or False only
+path_for_metrics = "metrics/"
+prometheus_textfile_dir = "" # i.e. the directory given to node exporter's --collector.textfile.directory
+
+
+""" Choose whether the program should keep running and watch path_to_audio for new files, rather than processing the files already there and exiting.
+- The model is loaded once and kept in memory, so each new file is transcribed as soon as it has finished arriving.
+- A file is only picked up once its size has stayed the same for watch_settle_secs, so files still being copied or uploaded are not transcribed part-way through.
+- On Linux the directory is watched with inotify; elsewhere it is checked every watch_poll_secs.
+- Stop with Ctrl+C or SIGTERM (i.e. `systemctl stop`): the file being transcribed is finished first. A second Ctrl+C stops immediately.
+- Files are processed one at a time (num_workers is not used)."""
+watch_folder = False # True or False only
+watch_settle_secs = 5
+watch_poll_secs = 10
+
+
+""" Choose whether to use a model server (started separately with `python model_server.py`) which keeps models loaded between runs.
+- If the server is running, the model is not loaded by this program at all: transcription is sent to the server over model_server_socket, which saves the model load time and memory on every run.
+- If the server is not running, the model is loaded here as usual, so it is safe to leave this on.
+- Requires a Unix domain socket (Linux or macOS).
+- Only the server's own user can use it: the socket is created in a directory only that user can open, and a run only connects to a socket owned by its own user.
+- model_server_socket: "" for the default, $XDG_RUNTIME_DIR/whisper_wrapper/models.sock, or if XDG_RUNTIME_DIR is not set, whisper_wrapper-<user id>/models.sock in the temporary directory (i.e. /tmp). A path chosen here should be in a directory that other users cannot write to.
+- With num_workers above 1, each worker process loads its own copy of the model rather than using the server, as the server transcribes with each model one file at a time."""
+use_model_server = False # True or False only
+model_server_socket = ""
 
 
 """ Choose word interval for line wrapping and to insert line-numbers into the final transcript.
@@ -81,6 +260,22 @@ word_interval = 10  # approx 9 - 12 is English average
 delimiter = "---"
 
 
+""" Choose which output files to write for each audio file. All are made from the same transcription, so adding formats costs very little extra time.
+- "txt": the transcript with header, line numbers and word count, as set up above
+- "srt": SubRip subtitles, one subtitle per Whisper segment (a phrase or sentence), with start and end times
+- "vtt": WebVTT subtitles, as "srt" but in the format used by web video players
+- "json": the full text plus every segment's start and end time (in seconds), text and confidence scores, for use by other programs
+- Each file is named like the transcript (i.e. episode_medium_en.srt) and saved in path_for_output. The files are written in parallel.
+- With stream_transcript = True, the .txt transcript is always written; other formats are written once the transcript is complete."""
+output_formats = ["txt"] # i.e. ["txt", "srt", "vtt", "json"]
+
+
+""" Choose whether lines in the .txt transcript should follow Whisper's segments rather than word_interval.
+- With wrap_on_segments = True, each line of the transcript is one segment (usually a phrase or sentence), so lines break at natural pauses. word_interval is then not used.
+- With wrap_on_segments = False, lines break every word_interval words as described above."""
+wrap_on_segments = False # True or False only
+
+
 ############# MANUAL SECTION 2 : POPULATE TRANSCRIPT HEADER ####################
 
 """OPTION 1: Populate header fields as a group.
@@ -0,0 +1,206 @@
+"""AUDIO DECODING UTILITIES"""
+
+from collections import deque
+import os
+import threading
+import numpy as np
+
+from utils_helper import log_file_write
+
+# Whisper works on 16 kHz mono float32 PCM
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 4
+
+
+def import_whisper():
+    """
+    Imports Whisper (and with it torch) the first time it is actually needed, rather than when the program starts. The import alone takes several seconds, and the pre-processing checks, the time estimate and runs served by the model server do not need it at all.
+
+    Returns:
+        module: The whisper package.
+    """
+    import whisper
+    return whisper
+
+
+def estimate_decoded_bytes(duration):
+    """
+    Estimates how much memory an audio file will take up once decoded to 16 kHz mono float32 PCM.
+
+    Args:
+        duration (float): Duration of the audio file in seconds, as returned by audio_file_durations().
+
+    Returns:
+        int: Estimated size in bytes of the decoded audio.
+    """
+    return int(duration * BYTES_PER_SECOND)
+
+
+def prefetch_audio(path_to_audio, batch, prefetch_depth, prefetch_memory_mb, log_path, audio_durations=None, audio_loader=None):
+    """
+    Decodes upcoming audio files on a background thread while the current file is being transcribed, so the ffmpeg decode of file N+1 overlaps with inference on file N.
+
+    Args:
+        path_to_audio (str): Path to directory containing the audio files.
+        batch (list): (index, audio_file) pairs in the order they will be transcribed.
+        prefetch_depth (int): Maximum number of decoded files held in memory waiting to be transcribed.
+        prefetch_memory_mb (int): Cap, in MB, on the decoded audio held in memory waiting to be transcribed.
+        log_path (str): Full path of log file to which status messages are written.
+        audio_durations (dict, optional): Filename (key) and duration in seconds (value), from audio_file_durations(). Where a duration is known, the decoded size is estimated up front so the cap is respected before decoding starts.
+        audio_loader (callable, optional): Decodes one file, given its filename, i.e. load_decoded_audio() in whisper_wrapper.py, which uses the decoded audio cache. Defaults to Whisper's load_audio.
+
+    Note:
+        A file which on its own is larger than prefetch_memory_mb is only decoded once nothing else is waiting, so at most one oversized file is held at a time.
+
+    Yields:
+        tuple: (index (int), audio_file (str), audio (numpy.ndarray or None)). audio is None if decoding failed, in which case transcribe() falls back to passing the file path to Whisper, which will report the error as before.
+    """
+    memory_cap = prefetch_memory_mb * 1024 * 1024
+    audio_durations = audio_durations or {}
+    decoded = deque()
+    state = {"bytes": 0, "done": False, "stop": False}
+    condition = threading.Condition()
+
+    def decode_worker():
+        for index, audio_file in batch:
+            estimate = estimate_decoded_bytes(audio_durations.get(audio_file) or 0)
+            with condition:
+                condition.wait_for(lambda: state["stop"] or not decoded or (len(decoded) < prefetch_depth and state["bytes"] + estimate <= memory_cap))
+                if state["stop"]:
+                    break
+            try:
+                if audio_loader is not None:
+                    audio = audio_loader(audio_file)
+                else:
+                    audio = import_whisper().load_audio(os.path.join(path_to_audio, audio_file))
+            except Exception as e:
+                msg_error = f"Error pre-loading audio for {audio_file} - {e}.\n"
+                log_file_write(msg_error, log_path)
+                audio = None
+            with condition:
+                decoded.append((index, audio_file, audio))
+                state["bytes"] += audio.nbytes if audio is not None else 0
+                condition.notify_all()
+        with condition:
+            state["done"] = True
+            condition.notify_all()
+
+    thread = threading.Thread(target=decode_worker, name="audio-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            with condition:
+                condition.wait_for(lambda: decoded or state["done"])
+                if not decoded:
+                    break
+                index, audio_file, audio = decoded.popleft()
+                state["bytes"] -= audio.nbytes if audio is not None else 0
+                condition.notify_all()
+            yield index, audio_file, audio
+            del audio # release the buffer before the next file is waited on
+    finally:
+        # Stop the decoder if the loop finishes early
+        with condition:
+            state["stop"] = True
+            condition.notify_all()
+
+
+def find_chunk_boundaries(audio, chunk_length_secs, frame_secs=0.1):
+    """
+    Chooses where to split a long recording into chunks of roughly chunk_length_secs. Each split point is moved to the quietest moment within a search window around the target, so that chunks break in pauses rather than mid-word.
+
+    Args:
+        audio (numpy.ndarray): The decoded 16 kHz audio.
+        chunk_length_secs (float): Target chunk length in seconds.
+        frame_secs (float, optional): Length of the frames over which loudness is measured. Defaults to 0.1 seconds.
+
+    Returns:
+        list: Sample positions of the chunk boundaries, starting with 0 and ending with len(audio).
+    """
+    chunk_samples = int(chunk_length_secs * SAMPLE_RATE)
+    search_samples = chunk_samples // 4 # look up to a quarter of a chunk either side of the target
+    frame = max(1, int(frame_secs * SAMPLE_RATE))
+    boundaries = [0]
+
+    while len(audio) - boundaries[-1] > chunk_samples + search_samples:
+        target = boundaries[-1] + chunk_samples
+        window_start = target - search_samples
+        window = audio[window_start:target + search_samples]
+        frame_count = len(window) // frame
+        if frame_count == 0: # search window shorter than one frame
+            boundaries.append(target)
+            continue
+        energy = np.square(window[:frame_count * frame].reshape(frame_count, frame)).mean(axis=1)
+        boundaries.append(window_start + int(np.argmin(energy)) * frame + frame // 2)
+
+    boundaries.append(len(audio))
+    return boundaries
+
+
+def split_audio_chunks(audio, chunk_length_secs, chunk_overlap_secs):
+    """
+    Splits a long recording into chunks at quiet points (see find_chunk_boundaries()). Each chunk is padded with chunk_overlap_secs of the neighbouring audio either side, so Whisper has context for words close to the split.
+
+    Args:
+        audio (numpy.ndarray): The decoded 16 kHz audio.
+        chunk_length_secs (float): Target chunk length in seconds.
+        chunk_overlap_secs (float): Seconds of audio shared with each neighbouring chunk.
+
+    Returns:
+        list: One dict per chunk with keys "offset" (start of the padded chunk, seconds), "core_start" and "core_end" (the part of the recording this chunk is responsible for, seconds) and "audio" (the padded chunk).
+    """
+    overlap = int(chunk_overlap_secs * SAMPLE_RATE)
+    boundaries = find_chunk_boundaries(audio, chunk_length_secs)
+    chunks = []
+    for core_start, core_end in zip(boundaries, boundaries[1:]):
+        start = max(0, core_start - overlap)
+        end = min(len(audio), core_end + overlap)
+        chunks.append({
+            "offset": start / SAMPLE_RATE,
+            "core_start": core_start / SAMPLE_RATE,
+            "core_end": core_end / SAMPLE_RATE,
+            "audio": audio[start:end],
+        })
+    return chunks
+
+
+def stitch_chunk_results(chunks, results):
+    """
+    Joins the transcripts of the chunks back into one transcript in the same shape as Whisper returns for a whole file. Segment timestamps are shifted to the position of the chunk in the recording, and where chunks overlap each segment is kept only by the chunk whose core contains the segment's midpoint, so nothing is repeated.
+
+    Args:
+        chunks (list): Chunks from split_audio_chunks().
+        results (list): Whisper results (dicts with "segments") for each chunk, in the same order.
+
+    Returns:
+        dict: {"text": full transcript (str), "segments": list of segments with recording-level timestamps and renumbered ids}.
+    """
+    segments = []
+    last = len(chunks) - 1
+    for position, (chunk, result) in enumerate(zip(chunks, results)):
+        segments.extend(chunk_core_segments(chunk, result, position == last, len(segments)))
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def chunk_core_segments(chunk, result, is_last, first_id):
+    """
+    Shifts one chunk's segments to recording-level timestamps and keeps only those whose midpoint lies in the chunk's core (the part of the recording it is responsible for), so segments in the overlap with a neighbouring chunk are not repeated.
+
+    Args:
+        chunk (dict): Chunk from split_audio_chunks().
+        result (dict): Whisper's result for the chunk (dict with "segments").
+        is_last (bool): True for the final chunk, which also keeps segments running up to the very end of the recording.
+        first_id (int): Id given to the first segment kept, so ids continue from earlier chunks.
+
+    Returns:
+        list: The kept segments, with shifted timestamps and renumbered ids.
+    """
+    kept = []
+    for segment in result["segments"]:
+        start = segment["start"] + chunk["offset"]
+        end = segment["end"] + chunk["offset"]
+        midpoint = (start + end) / 2
+        if midpoint < chunk["core_start"] or (midpoint >= chunk["core_end"] and not is_last):
+            continue
+        kept.append({**segment, "id": first_id + len(kept), "start": round(start, 2), "end": round(end, 2)})
+    return kept
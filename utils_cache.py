@@ -0,0 +1,254 @@
+"""CACHE UTILITIES"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from utils_helper import log_file_write, atomic_write_json
+
+# Running totals for the batch summary (per process: worker processes pass theirs back to the parent)
+cache_stats = {"hits": 0, "misses": 0, "audio_hits": 0, "audio_misses": 0}
+
+
+def file_content_hash(full_path, block_size=1024 * 1024):
+    """
+    Calculates the SHA-256 hash of a file's contents, reading in blocks so that large video files are not read into memory in one go.
+
+    Args:
+        full_path (str): Path of the file to be hashed.
+        block_size (int, optional): Number of bytes read at a time. Defaults to 1MB.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(full_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def transcript_cache_key(content_hash, model_name, decode_options):
+    """
+    Builds the cache key for a transcript. The same recording transcribed with a different model or different decoding options gets a different key.
+
+    Args:
+        content_hash (str): Hash of the audio file contents, from file_content_hash().
+        model_name (str): Whisper model name, i.e. "medium.en".
+        decode_options (dict): Options passed to model.transcribe(). Imported from user_variables.py
+
+    Returns:
+        str: Hex digest used as the cache filename.
+    """
+    key_source = json.dumps({"audio": content_hash, "model": model_name, "options": decode_options}, sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+def cache_lookup(path_for_cache, key):
+    """
+    Looks up a cached transcript. A hit refreshes the entry's modification time, which is used as its 'last used' time for LRU eviction.
+
+    Args:
+        path_for_cache (str): Path to the cache directory.
+        key (str): Cache key from transcript_cache_key().
+
+    Returns:
+        dict or None: The cached result (keys "text" and "segments") if found, otherwise None.
+    """
+    full_path = os.path.join(path_for_cache, f"{key}.json")
+    try:
+        with open(full_path, "r", encoding="utf-8") as cache_file:
+            result = json.load(cache_file)
+        os.utime(full_path)
+    except (FileNotFoundError, ValueError, OSError):
+        cache_stats["misses"] += 1
+        return None
+    cache_stats["hits"] += 1
+    return result
+
+
+def cache_store(path_for_cache, key, result, cache_max_mb, log_path):
+    """
+    Saves a transcript to the cache, then evicts the least recently used entries if the cache has grown beyond cache_max_mb. Failure to write to the cache is logged but does not interrupt processing.
+
+    Args:
+        path_for_cache (str): Path to the cache directory.
+        key (str): Cache key from transcript_cache_key().
+        result (dict): Transcript to store (keys "text" and "segments").
+        cache_max_mb (int): Maximum total size of the cache directory in MB.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Returns: None
+    """
+    try:
+        os.makedirs(path_for_cache, exist_ok=True)
+        atomic_write_json(result, os.path.join(path_for_cache, f"{key}.json"))
+        evict_cache(path_for_cache, cache_max_mb * 1024 * 1024, ".json")
+    except (OSError, TypeError, ValueError) as e:
+        msg_error = f"Error writing transcript to cache - {e}. Processing will continue.\n"
+        log_file_write(msg_error, log_path)
+
+
+def evict_cache(path_for_cache, max_bytes, suffix):
+    """
+    Deletes the least recently used cache entries (oldest modification time first) until the total size of entries with the given suffix is within max_bytes.
+
+    Args:
+        path_for_cache (str): Path to the cache directory.
+        max_bytes (int): Maximum total size in bytes.
+        suffix (str): File extension of the cache entries, i.e. ".json".
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    entries = []
+    total_bytes = 0
+    with os.scandir(path_for_cache) as scan:
+        for entry in scan:
+            if entry.name.endswith(suffix) and not entry.name.startswith(".tmp_") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+    deleted = 0
+    for _, size, full_path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(full_path)
+            total_bytes -= size
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def audio_cache_load(path_for_audio_cache, content_hash):
+    """
+    Looks up a recording's decoded audio in the audio cache. The .npy file is memory-mapped rather than read, so the samples are paged in from disk (or the operating system's file cache) as Whisper uses them, and processes working on the same recording share the same memory. A hit refreshes the entry's modification time, which is used as its 'last used' time for LRU eviction.
+
+    Args:
+        path_for_audio_cache (str): Path to the audio cache directory.
+        content_hash (str): Hash of the audio file contents, from file_content_hash().
+
+    Note:
+        The array is mapped copy-on-write, so it can be used like an ordinary array (i.e. turned into a torch tensor by Whisper) without ever changing the cached file.
+
+    Returns:
+        numpy.ndarray or None: The decoded 16 kHz mono float32 audio if found, otherwise None. An unreadable or invalid entry is deleted and counted as a miss.
+    """
+    full_path = os.path.join(path_for_audio_cache, f"{content_hash}.npy")
+    try:
+        audio = np.load(full_path, mmap_mode="c", allow_pickle=False)
+        if audio.dtype != np.float32 or audio.ndim != 1:
+            raise ValueError(f"unexpected audio array {audio.dtype} {audio.shape}")
+        os.utime(full_path)
+    except FileNotFoundError:
+        cache_stats["audio_misses"] += 1
+        return None
+    except (OSError, ValueError):
+        cache_stats["audio_misses"] += 1
+        try:
+            os.remove(full_path)
+        except OSError:
+            pass
+        return None
+    cache_stats["audio_hits"] += 1
+    return audio
+
+
+def audio_cache_store(path_for_audio_cache, content_hash, audio, cache_max_mb, log_path):
+    """
+    Saves a recording's decoded audio to the audio cache as a .npy file (via a temporary file, so other processes never map a half-written entry), then evicts the least recently used entries if the cache has grown beyond cache_max_mb. Failure to write to the cache is logged but does not interrupt processing.
+
+    Args:
+        path_for_audio_cache (str): Path to the audio cache directory.
+        content_hash (str): Hash of the audio file contents, from file_content_hash().
+        audio (numpy.ndarray): The decoded 16 kHz mono float32 audio.
+        cache_max_mb (int): Maximum total size of the audio cache in MB.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Returns: None
+    """
+    temp_path = None
+    try:
+        os.makedirs(path_for_audio_cache, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path_for_audio_cache, prefix=".tmp_", suffix=".npy")
+        with os.fdopen(fd, "wb") as temp_file:
+            np.save(temp_file, np.ascontiguousarray(audio, dtype=np.float32), allow_pickle=False)
+        os.replace(temp_path, os.path.join(path_for_audio_cache, f"{content_hash}.npy"))
+        temp_path = None
+        evict_cache(path_for_audio_cache, cache_max_mb * 1024 * 1024, ".npy")
+    except (OSError, ValueError) as e:
+        msg_error = f"Error writing decoded audio to cache - {e}. Processing will continue.\n"
+        log_file_write(msg_error, log_path)
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def cache_stats_merge(stats):
+    """
+    Adds the hit/miss counts passed back from a worker process to this process's totals.
+
+    Args:
+        stats (dict): Hit/miss counts, with the keys of cache_stats.
+
+    Returns: None
+    """
+    for key in cache_stats:
+        cache_stats[key] += stats.get(key, 0)
+
+
+def cache_stats_collect():
+    """
+    Hands back and resets this process's hit/miss counts. Used by worker processes to report per file.
+
+    Returns:
+        dict: Hit/miss counts, with the keys of cache_stats.
+    """
+    stats = dict(cache_stats)
+    for key in cache_stats:
+        cache_stats[key] = 0
+    return stats
+
+
+def cache_summary(path_for_cache):
+    """
+    Summarises cache use for the end-of-batch log entry.
+
+    Args:
+        path_for_cache (str): Path to the cache directory.
+
+    Returns:
+        str: Hit/miss counts and the current size of the cache.
+    """
+    total_bytes = 0
+    if os.path.isdir(path_for_cache):
+        with os.scandir(path_for_cache) as scan:
+            total_bytes = sum(entry.stat().st_size for entry in scan if entry.is_file())
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    hit_rate = (cache_stats["hits"] / lookups * 100) if lookups else 0
+    return f"Transcript cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es) ({hit_rate:.0f}% hit rate). Cache size {total_bytes / (1024 * 1024):.1f}MB.\n"
+
+
+def audio_cache_summary(path_for_audio_cache):
+    """
+    Summarises decoded-audio cache use for the end-of-batch log entry.
+
+    Args:
+        path_for_audio_cache (str): Path to the audio cache directory.
+
+    Returns:
+        str: Hit/miss counts and the current size of the audio cache.
+    """
+    total_bytes = 0
+    if os.path.isdir(path_for_audio_cache):
+        with os.scandir(path_for_audio_cache) as scan:
+            total_bytes = sum(entry.stat().st_size for entry in scan if entry.is_file())
+    lookups = cache_stats["audio_hits"] + cache_stats["audio_misses"]
+    hit_rate = (cache_stats["audio_hits"] / lookups * 100) if lookups else 0
+    return f"Decoded audio cache: {cache_stats['audio_hits']} hit(s), {cache_stats['audio_misses']} miss(es) ({hit_rate:.0f}% hit rate). Cache size {total_bytes / (1024 * 1024):.1f}MB.\n"
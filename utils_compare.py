@@ -0,0 +1,160 @@
+"""MODEL COMPARISON UTILITIES"""
+
+import re
+
+import numpy as np
+
+# Words for the word error rate: runs of letters, digits and apostrophes, so punctuation and capitalisation (which the models vary on freely) are not counted as errors
+WORD_PATTERN = re.compile(r"[\w']+")
+
+
+def transcript_words(raw_transcript):
+    """
+    Splits a transcript into the words compared by word_edit_distance(): lower case, without punctuation.
+
+    Args:
+        raw_transcript (str): Unformatted transcript text from Whisper.
+
+    Returns:
+        list: The words, in order.
+    """
+    return WORD_PATTERN.findall(raw_transcript.lower())
+
+
+def word_edit_distance(reference_words, hypothesis_words):
+    """
+    Counts the word substitutions, deletions and insertions needed to turn one transcript into another (the Levenshtein distance over words), which is the numerator of the word error rate.
+
+    Args:
+        reference_words (list): Words of the transcript treated as correct, from transcript_words().
+        hypothesis_words (list): Words of the transcript being measured against it.
+
+    Note:
+        The table is filled one reference word at a time, with each row computed by numpy: the insertion step, which depends on the cell to its left, is a running minimum (np.minimum.accumulate), so a pair of hour-long transcripts (around 10,000 words each) takes around a second rather than the minutes a pure Python loop would.
+
+    Returns:
+        int: The number of word edits.
+    """
+    if not reference_words or not hypothesis_words:
+        return max(len(reference_words), len(hypothesis_words))
+
+    vocabulary = {}
+    reference_ids = [vocabulary.setdefault(word, len(vocabulary)) for word in reference_words]
+    hypothesis_ids = np.array([vocabulary.setdefault(word, len(vocabulary)) for word in hypothesis_words], dtype=np.int64)
+
+    offsets = np.arange(len(hypothesis_ids) + 1, dtype=np.int64)
+    row = offsets.copy() # distance from an empty reference: one insertion per word
+    for count, word_id in enumerate(reference_ids, start=1):
+        best = np.empty_like(row)
+        best[0] = count
+        # substitution (free if the words match), or deletion of the reference word
+        np.minimum(row[:-1] + (hypothesis_ids != word_id), row[1:] + 1, out=best[1:])
+        # insertion: row[j] = min over k <= j of best[k] + (j - k)
+        row = np.minimum.accumulate(best - offsets) + offsets
+    return int(row[-1])
+
+
+def comparison_report(file_results, model_keys, model_options):
+    """
+    Builds the report of a model comparison: each model's speed and word count over the batch, and the word error rate between each pair of models.
+
+    Args:
+        file_results (dict): audio_file (key) and {model_key: {"audio_secs", "process_secs", "words" (list from transcript_words()), "saved"}} (value). Models which failed to transcribe a file are absent from its entry.
+        model_keys (list): Keys of the compared models, from model_options.
+        model_options (dict): Imported from user_variables.py
+
+    Note:
+        Realtime factor is processing time divided by audio duration, so 0.5 means a model transcribes an hour of audio in 30 minutes (lower is faster).
+        Word error rate is not symmetrical: "wer" gives, for each reference model (key), the rate of each other model's transcripts measured against it. Totals are over the files both models transcribed, so one failed file does not distort the others.
+
+    Returns:
+        dict: Report with keys "models" (per model totals), "wer" (pairwise word error rates) and "files" (per file figures).
+    """
+    models = {}
+    for model_key in model_keys:
+        runs = [runs[model_key] for runs in file_results.values() if model_key in runs]
+        audio_secs = sum(run["audio_secs"] for run in runs)
+        process_secs = sum(run["process_secs"] for run in runs)
+        models[model_key] = {
+            "model": model_options[model_key]["name"],
+            "files": len(runs),
+            "audio_secs": round(audio_secs, 2),
+            "process_secs": round(process_secs, 2),
+            "realtime_factor": round(process_secs / audio_secs, 4) if audio_secs else None,
+            "words": sum(len(run["words"]) for run in runs),
+        }
+
+    wer = {reference_key: {} for reference_key in model_keys}
+    files = {}
+    for audio_file, runs in file_results.items():
+        file_wer = {reference_key: {} for reference_key in model_keys if reference_key in runs}
+        for reference_key in file_wer:
+            for hypothesis_key in file_wer:
+                if hypothesis_key == reference_key:
+                    continue
+                edits = word_edit_distance(runs[reference_key]["words"], runs[hypothesis_key]["words"])
+                reference_count = len(runs[reference_key]["words"])
+                file_wer[reference_key][hypothesis_key] = round(edits / reference_count, 4) if reference_count else None
+                totals = wer[reference_key].setdefault(hypothesis_key, [0, 0])
+                totals[0] += edits
+                totals[1] += reference_count
+        files[audio_file] = {
+            "models": {model_key: {"audio_secs": round(run["audio_secs"], 2), "process_secs": round(run["process_secs"], 2), "realtime_factor": round(run["process_secs"] / run["audio_secs"], 4) if run["audio_secs"] else None, "words": len(run["words"]), "saved": run["saved"]} for model_key, run in runs.items()},
+            "wer": file_wer,
+        }
+
+    for reference_key, hypotheses in wer.items():
+        for hypothesis_key, (edits, reference_count) in hypotheses.items():
+            hypotheses[hypothesis_key] = round(edits / reference_count, 4) if reference_count else None
+    return {"models": models, "wer": wer, "files": files}
+
+
+def comparison_summary(report):
+    """
+    Formats the totals of a comparison report as a table for the screen and log file.
+
+    Args:
+        report (dict): Report from comparison_report().
+
+    Returns:
+        str: One line per model (realtime factor, word count and files transcribed), then the pairwise word error rates.
+    """
+    lines = ["Model comparison:", f"{'Model':<22}{'Files':>7}{'Audio (s)':>12}{'Process (s)':>13}{'RTF':>9}{'Words':>10}"]
+    for model_key, totals in report["models"].items():
+        rtf = f"{totals['realtime_factor']:.3f}" if totals["realtime_factor"] is not None else "-"
+        lines.append(f"{model_key:<22}{totals['files']:>7}{totals['audio_secs']:>12.1f}{totals['process_secs']:>13.1f}{rtf:>9}{totals['words']:>10}")
+    lines.append("Word error rate (row = reference, column = compared model):")
+    model_keys = list(report["models"])
+    lines.append(f"{'':<22}" + "".join(f"{model_key:>22}" for model_key in model_keys))
+    for reference_key in model_keys:
+        cells = []
+        for hypothesis_key in model_keys:
+            rate = report["wer"].get(reference_key, {}).get(hypothesis_key)
+            cells.append(f"{'-' if rate is None else f'{rate:.2%}':>22}")
+        lines.append(f"{reference_key:<22}" + "".join(cells))
+    return "\n".join(lines) + "\n"
+
+
+def plan_model_groups(model_keys, model_memory_mb, budget_mb):
+    """
+    Splits the compared models into groups which fit in memory together, so each group can transcribe a file concurrently. Models are packed in the order given, each into the first group with room for it.
+
+    Args:
+        model_keys (list): Keys of the compared models.
+        model_memory_mb (dict): model_key (key) and its approximate memory needs in MB (value).
+        budget_mb (float or None): Memory available for transcription, in MB. If None (unknown), every model runs on its own.
+
+    Returns:
+        list: Groups (lists of model keys). A model which needs more than the whole budget is given a group of its own.
+    """
+    if budget_mb is None:
+        return [[model_key] for model_key in model_keys]
+    groups = []
+    for model_key in model_keys:
+        for group in groups:
+            if sum(model_memory_mb[member] for member in group) + model_memory_mb[model_key] <= budget_mb:
+                group.append(model_key)
+                break
+        else:
+            groups.append([model_key])
+    return groups
@@ -1,11 +1,34 @@
 """HELPER UTILTIES"""
 
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
+import json
+import math
 import os
+import queue
 import re
-
+import shutil
+import socket
+import statistics
 import subprocess
-from user_variables import use_log_file
+import sys
+import tempfile
+import threading
+
+from user_variables import use_log_file, log_format
+
+# Per-file log buffer used by worker processes (see log_buffer_start()). None means write straight to the log file.
+log_buffer = None
+
+# Background log writer (see log_writer_start()). Created on first use in each process.
+log_queue = None
+log_thread = None
+log_pid = None
+
+# Daily log file names, i.e. log_whisper_transcripts_2024-02-08.txt, so the date can be moved on at midnight
+log_filename_regex = re.compile(r"^(log_whisper_transcripts_)\d{4}-\d{2}-\d{2}(\.\w+)$")
+
 
 def log_file_write(msg, log_path):
     """
@@ -17,6 +40,8 @@ def log_file_write(msg, log_path):
     
     Note:
         'use_log_file' should be a global boolean variable that controls whether logging to file is enabled.
+        The entry is handed to a background writer thread (see log_writer_start()) rather than written here, so logging does not wait on the disk.
+        If log_buffer_start() has been called (worker processes), the timestamped entry is held in memory instead, so that the parent process can write each file's entries as one contiguous block.
     
     Returns: None
     """
@@ -25,76 +50,459 @@ def log_file_write(msg, log_path):
     if use_log_file == False:
         return
     else:
-        formatted_timestamp = dt.now().strftime("%Y-%m-%d_%H-%M-%S")
-        msg_timestamped = f"{formatted_timestamp} - " + msg
-        with open(log_path, "a", encoding="utf-8") as log_file:
-            log_file.write(msg_timestamped)
-    
+        timestamp = dt.now()
+        if log_buffer is not None:
+            log_buffer.append((timestamp, msg))
+            return
+        log_writer_start()
+        log_queue.put((timestamp, msg, log_path))
+
+
+def log_buffer_start():
+    """
+    Starts holding log file entries in memory rather than writing them. Used by worker processes so that the entries for one audio file are not interleaved with entries from files being processed by other workers.
+
+    Returns: None
+    """
+    global log_buffer
+    log_buffer = []
+
+
+def log_buffer_collect():
+    """
+    Stops buffering and hands back the log file entries held since log_buffer_start() was called.
+
+    Returns:
+        list: (timestamp (datetime), msg (str)) log entries, in the order they were logged.
+    """
+    global log_buffer
+    entries = log_buffer or []
+    log_buffer = None
+    return entries
+
+
+def log_entries_write(entries, log_path):
+    """
+    Writes a block of log entries (collected by log_buffer_collect() in a worker process) to the log file, keeping their original timestamps. Nothing is printed, as the worker's screen output is passed back and printed separately.
+
+    Args:
+        entries (list): (timestamp (datetime), msg (str)) log entries.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Returns: None
+    """
+    if use_log_file == False or not entries:
+        return
+    log_writer_start()
+    for timestamp, msg in entries:
+        log_queue.put((timestamp, msg, log_path))
+
+
+def log_format_entry(timestamp, msg):
+    """
+    Formats a log entry for the file: "timestamp - message" (log_format "text"), or one JSON object per line with "timestamp", "pid" and "message" keys (log_format "json") so the log can be ingested without parsing the text.
+
+    Args:
+        timestamp (datetime): Time the message was logged.
+        msg (str): Message to be written to log file.
+
+    Returns:
+        str: The formatted entry.
+    """
+    if log_format == "json":
+        return json.dumps({"timestamp": timestamp.isoformat(timespec="seconds"), "pid": os.getpid(), "message": msg.rstrip("\n")}, ensure_ascii=False) + "\n"
+    return f"{timestamp.strftime('%Y-%m-%d_%H-%M-%S')} - " + msg
+
+
+def log_dated_path(log_path, timestamp):
+    """
+    Works out which daily log file an entry belongs in. log_file_setup() fixes the date in the filename when the program starts, so for a run which carries on past midnight, entries from the next day are moved on to that day's log file.
+
+    Args:
+        log_path (str): Full path of log file set up by log_file_setup().
+        timestamp (datetime): Time the message was logged.
+
+    Returns:
+        str: Full path of the log file for that date (log_path unchanged if it is not a daily log file).
+    """
+    directory, filename = os.path.split(log_path)
+    match = log_filename_regex.match(filename)
+    if not match:
+        return log_path
+    return os.path.join(directory, f"{match.group(1)}{timestamp.strftime('%Y-%m-%d')}{match.group(2)}")
+
+
+def log_writer_start():
+    """
+    Starts the background log writer thread for this process, if it is not already running. The thread keeps each log file open, writes queued entries in batches and flushes after each batch. log_flush() is registered to run at exit (including sys.exit() after a fatal error) so queued entries are not lost.
+
+    Returns: None
+    """
+    global log_queue, log_thread, log_pid
+    if log_pid == os.getpid() and log_thread is not None and log_thread.is_alive():
+        return
+    log_queue = queue.Queue()
+    log_pid = os.getpid()
+    log_thread = threading.Thread(target=log_writer, args=(log_queue,), name="log-writer", daemon=True)
+    log_thread.start()
+    atexit.register(log_flush)
 
 
-def audio_file_durations(path_to_audio, audio_filenames, log_path):
+def log_writer(entry_queue, max_batch=500):
     """
-    Extracts the duration of each audio file in the batch.
+    Body of the background log writer thread. Waits for an entry, then takes whatever else is already queued (up to max_batch entries), so that bursts of messages are written with one write and one flush per log file.
+
+    Args:
+        entry_queue (queue.Queue): Queue of (timestamp, msg, log_path) entries.
+        max_batch (int, optional): Maximum number of entries written at once. Defaults to 500.
+
+    Returns: None (runs until the program exits)
+    """
+    open_files = {}
+    while True:
+        batch = [entry_queue.get()]
+        while len(batch) < max_batch:
+            try:
+                batch.append(entry_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        grouped = {}
+        for timestamp, msg, log_path in batch:
+            grouped.setdefault(log_dated_path(log_path, timestamp), []).append(log_format_entry(timestamp, msg))
+        try:
+            for full_path, lines in grouped.items():
+                if full_path not in open_files:
+                    # After midnight the previous day's file is no longer needed
+                    for old_path in list(open_files):
+                        if os.path.dirname(old_path) == os.path.dirname(full_path):
+                            open_files.pop(old_path).close()
+                    open_files[full_path] = open(full_path, "a", encoding="utf-8")
+                open_files[full_path].write("".join(lines))
+                open_files[full_path].flush()
+        except OSError as e:
+            print(f"Error writing to log file - {e}. {len(batch)} log entries lost.", file=sys.stderr)
+        finally:
+            for _ in batch:
+                entry_queue.task_done()
+
+
+def log_flush():
+    """
+    Waits until every queued log entry has been written to the log file. Runs automatically at exit; call it directly before anything which could end the process abruptly.
+
+    Returns: None
+    """
+    if log_queue is not None and log_pid == os.getpid() and log_thread is not None and log_thread.is_alive():
+        log_queue.join()
+
+
+def atomic_write_json(data, full_path):
+    """
+    Writes data to a JSON file via a temporary file in the same directory, which is then renamed over the target. A crash part-way through therefore leaves either the old file or the new one, never a half-written file.
+
+    Args:
+        data (dict or list): JSON-serialisable data to be written.
+        full_path (str): Path of the JSON file to be written.
+
+    Returns: None
+    """
+    directory = os.path.dirname(full_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            json.dump(data, temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, full_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def audio_format_extensions(audio_format):
+    """
+    Turns audio_format into the tuple of lower-case extensions used to match filenames, so that ".mp4" also matches ".MP4".
+
+    Args:
+        audio_format (str or list): A single extension, i.e. ".mp4", or a list of extensions, i.e. [".mp3", ".wav"]. Imported from user_variables.py
+
+    Returns:
+        tuple: Lower-case extensions, each starting with ".".
+    """
+    formats = [audio_format] if isinstance(audio_format, str) else list(audio_format)
+    return tuple(extension.lower() if extension.startswith(".") else f".{extension.lower()}" for extension in formats)
+
+
+def discover_audio_files(path_to_audio, audio_format, log_path, search_subfolders=False, modified_after=None):
+    """
+    Finds the audio files to be transcribed, one at a time as the directory tree is read, so a very large tree can start being processed before the whole of it has been read. Uses os.scandir(), which gets each entry's type from the directory listing itself rather than checking every file separately.
+
+    Args:
+        path_to_audio (str): Path to directory containing the audio files.
+        audio_format (str or list): Extension(s) of the audio files, matched regardless of case (see audio_format_extensions()).
+        log_path (str): Full path of log file to which status messages are written.
+        search_subfolders (bool, optional): If True, subfolders (and their subfolders) are searched too. Defaults to False.
+        modified_after (float, optional): If supplied, only files last modified at or after this time (seconds since the epoch) are included.
+
+    Note:
+        Each folder's entries are taken in alphabetical order, its files before its subfolders, so the order is the same on every run (and, without subfolders, the same alphabetical order as before).
+        Symbolic links to folders are not followed, so a link cannot send the search round in a loop.
+
+    Raises:
+        OSError: If path_to_audio itself cannot be read. A subfolder which cannot be read is logged and skipped.
+
+    Yields:
+        str: Path of each audio file relative to path_to_audio, i.e. "2024-03/episode_S01E02.mp3" (just the filename for files directly in path_to_audio).
+    """
+    extensions = audio_format_extensions(audio_format)
+    folders = [""] # relative paths of folders still to be read, last one next
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(os.path.join(path_to_audio, folder)) as scan:
+                entries = sorted(scan, key=lambda entry: entry.name)
+        except OSError as e:
+            if not folder:
+                raise
+            msg_error = f"Error reading folder {folder} - {e}. Files in it will be skipped.\n"
+            log_file_write(msg_error, log_path)
+            continue
+
+        subfolders = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if search_subfolders:
+                        subfolders.append(os.path.join(folder, entry.name))
+                    continue
+                if not entry.name.lower().endswith(extensions) or not entry.is_file():
+                    continue
+                if modified_after is not None and entry.stat().st_mtime < modified_after:
+                    continue
+            except OSError: # removed since the folder was read
+                continue
+            yield os.path.join(folder, entry.name) if folder else entry.name
+        folders.extend(reversed(subfolders))
+
+
+def probe_cache_load(probe_cache_path):
+    """
+    Loads the ffprobe duration cache. A missing or unreadable cache is treated as empty.
+
+    Args:
+        probe_cache_path (str): Full path of the probe cache file.
+
+    Returns:
+        dict: Full file path (key) and {"size", "mtime", "duration"} (value).
+    """
+    try:
+        with open(probe_cache_path, "r", encoding="utf-8") as cache_file:
+            probe_cache = json.load(cache_file)
+        return probe_cache if isinstance(probe_cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def probe_duration(full_path, timeout=60):
+    """
+    Runs ffprobe on a single file to read its duration. The command is passed as a list of arguments (no shell), so filenames containing quotes or other special characters cannot break the command.
+
+    Args:
+        full_path (str): Path of the audio file.
+        timeout (int, optional): Seconds to wait for ffprobe before giving up on the file. Defaults to 60.
+
+    Raises:
+        subprocess.CalledProcessError: If the ffprobe command fails.
+        subprocess.TimeoutExpired: If ffprobe takes longer than timeout.
+        ValueError: If the output of the ffprobe command cannot be converted to a float.
+
+    Returns:
+        float: Duration in seconds, rounded to 2 decimal places.
+    """
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", full_path]
+    # NB: command elements:
+    # -v error: only error messages should be displayed
+    # -show_entries format=duration: extract duration of the file
+    # -of default=noprint_wrappers=1:nokey=1: removes key and wrappers from output so that it's easier to parse
+    output = subprocess.run(cmd, capture_output=True, check=True, timeout=timeout).stdout.decode('utf-8')
+    return round(float(output), 2)  # duration in seconds
+
+
+def audio_file_durations(path_to_audio, audio_filenames, log_path, probe_workers=8, probe_cache_path=None):
+    """
+    Extracts the duration of each audio file in the batch. Files are probed concurrently on a bounded thread pool, and durations are cached (keyed on path, size and modification time) so that repeat runs over the same directory only probe new or changed files.
 
     Args:
         path_to_audio (str): Path to directory containing the audio files.
         audio_filenames (list): List of audio file names in the batch, generated by obtain_audio_filenames()
         log_path (str): Full path of log file to which status messages are written.
+        probe_workers (int, optional): Maximum number of ffprobe processes run at once. Defaults to 8.
+        probe_cache_path (str, optional): Full path of the probe cache file. If None, no cache is used.
 
     Dependencies: 
         ffprobe is tool (for extracting info about media files) included with ffmpeg. This method was chosen because ffmpeg should already be installed as OpenAi's Whisper model requires it.
     
     Raises:
-        FileNotFoundError: If the audio file is not found at the provided path.
-        subprocess.CalledProcessError: If the ffprobe command fails.
-        ValueError: If the output of the ffprobe command cannot be converted to a float.
+        FileNotFoundError: If ffprobe is not installed (no duration could be obtained for any file).
+
+    Contingency:
+        If an individual file cannot be probed (missing, not a valid audio file, ffprobe failure or timeout), the error is logged, its duration is recorded as None and the remaining files are still probed.
     
     Returns:
-        dict: Dictionary containing filename (key) and the duration in seconds(value) of each audio file. This data is then used in process_time_estimator() to calculate the time required to process the batch, relative to the model's processing speed.
+        dict: Dictionary containing filename (key) and the duration in seconds(value) of each audio file, or None for a file which could not be probed. This data is then used in process_time_estimator() to calculate the time required to process the batch, relative to the model's processing speed.
     """
     
-    audio_time_dict = dict.fromkeys(audio_filenames, 0)
-    
+    audio_time_dict = dict.fromkeys(audio_filenames, None)
+    probe_cache = probe_cache_load(probe_cache_path) if probe_cache_path else {}
+
+    # Use cached durations for files which have not changed since they were last probed
+    to_probe = []
     for filename in audio_filenames:
         full_path = os.path.join(path_to_audio, filename)
-        cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "{full_path}"'
-        # NB: creates command-line string to be run, elements:
-        # -v error: only error messages should be displayed
-        # -show_entries format=duration: extract duration of the file
-        # -of default=noprint_wrappers=1:nokey=1: removes key and wrappers from output so that it's easier to parse
-        try:    
-            output = subprocess.check_output(cmd, shell=True).decode('utf-8')
-        except FileNotFoundError:
-            msg_error = f"Error, file '{full_path}' not found."
+        try:
+            stat = os.stat(full_path)
+        except OSError as e:
+            msg_error = f"Error, file '{full_path}' could not be read - {e}. It will be left out of the time estimate.\n"
             log_file_write(msg_error, log_path)
-            raise
-        except subprocess.CalledProcessError:
-            msg_error = f"Error: ffprobe command failed. Check that ffprobe is installed and that the file '{full_path}' is a valid audio file."
-            log_file_write(msg_error, log_path)
-            raise    
+            continue
+        cached = probe_cache.get(os.path.abspath(full_path))
+        if cached and cached.get("size") == stat.st_size and cached.get("mtime") == stat.st_mtime:
+            audio_time_dict[filename] = cached["duration"]
+        else:
+            to_probe.append((filename, full_path, stat))
+
+    if to_probe and shutil.which("ffprobe") is None:
+        msg_error = "Error: ffprobe not found. Check that ffmpeg (which includes ffprobe) is installed and on your PATH.\n"
+        log_file_write(msg_error, log_path)
+        raise FileNotFoundError("ffprobe")
 
-        try:           
-            duration = round(float(output), 2)  # duration in seconds
+    def probe(item):
+        filename, full_path, stat = item
+        try:
+            return item, probe_duration(full_path)
+        except subprocess.CalledProcessError:
+            msg_error = f"Error: ffprobe command failed. Check that the file '{full_path}' is a valid audio file. It will be left out of the time estimate.\n"
+        except subprocess.TimeoutExpired:
+            msg_error = f"Error: ffprobe timed out on '{full_path}'. It will be left out of the time estimate.\n"
         except ValueError:
-            msg_error = f"Error, Could not convert output to float. Check that the file '{full_path}' is a valid audio file."
-            log_file_write(msg_error, log_path)
-            raise
+            msg_error = f"Error, Could not convert output to float. Check that the file '{full_path}' is a valid audio file. It will be left out of the time estimate.\n"
+        log_file_write(msg_error, log_path)
+        return item, None
 
-        audio_time_dict[filename] = duration
-    print(audio_time_dict) # remove after testing   
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=max(1, probe_workers)) as executor:
+            for (filename, full_path, stat), duration in executor.map(probe, to_probe):
+                audio_time_dict[filename] = duration
+                if duration is not None:
+                    probe_cache[os.path.abspath(full_path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "duration": duration}
+
+        if probe_cache_path:
+            try:
+                os.makedirs(os.path.dirname(probe_cache_path) or ".", exist_ok=True)
+                atomic_write_json(probe_cache, probe_cache_path)
+            except (OSError, TypeError, ValueError) as e:
+                msg_error = f"Error saving probe cache {probe_cache_path} - {e}.\n"
+                log_file_write(msg_error, log_path)
 
     return audio_time_dict
 
 
-def process_time_estimator(audio_time_dict, model_key, model_options, log_path):
+def throughput_key(model_name, threads):
+    """
+    Builds the key under which measured processing speeds are stored. Speed depends on the model, the machine and the number of CPU threads each model instance may use, so each combination is measured separately.
+
+    Args:
+        model_name (str): Whisper model name, i.e. "medium.en".
+        threads (int): CPU threads available to each model instance.
+
+    Returns:
+        str: Key in the format "model|hostname|threads".
+    """
+    return f"{model_name}|{socket.gethostname()}|{threads}"
+
+
+def throughput_stats_load(stats_path):
+    """
+    Loads the measured processing speeds. A missing or unreadable file is treated as having no history.
+
+    Args:
+        stats_path (str): Full path of the throughput stats file.
+
+    Returns:
+        dict: throughput_key() (key) and list of measurements (value), each {"audio_secs", "process_secs", "date"}.
+    """
+    try:
+        with open(stats_path, "r", encoding="utf-8") as stats_file:
+            stats = json.load(stats_file)
+        return stats if isinstance(stats, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def throughput_record(stats_path, key, audio_secs, process_secs, log_path, max_history=100):
     """
-    Estimates the time required to process the audio files based on the chosen model's processing speed. Converts times to mins/secs format. Prints to screen (only) a summary of the time for each individual file. The final batch processing time is written to log file.
+    Adds one measurement (how long Whisper took to transcribe a file of a given duration) to the throughput stats file. Only the most recent max_history measurements per key are kept, so the estimate follows changes to the machine.
 
     Args:
-        audio_time_dict (dict): Dictionary containing filename (key) and the duration (value) of each audio file. Provided by audio_file_durations.
+        stats_path (str): Full path of the throughput stats file.
+        key (str): Key from throughput_key().
+        audio_secs (float): Duration of the audio transcribed, in seconds.
+        process_secs (float): Time taken to transcribe it, in seconds.
+        log_path (str): Full path of log file to which status messages are written.
+        max_history (int, optional): Measurements kept per key. Defaults to 100.
+
+    Contingency:
+        Failure to save the measurement is logged but does not interrupt processing.
+
+    Returns: None
+    """
+    if not audio_secs or process_secs <= 0:
+        return
+    stats = throughput_stats_load(stats_path)
+    history = stats.setdefault(key, [])
+    history.append({"audio_secs": round(audio_secs, 2), "process_secs": round(process_secs, 4), "date": dt.now().strftime("%Y-%m-%d_%H-%M-%S")})
+    del history[:-max_history]
+    try:
+        os.makedirs(os.path.dirname(stats_path) or ".", exist_ok=True)
+        atomic_write_json(stats, stats_path)
+    except (OSError, TypeError, ValueError) as e:
+        msg_error = f"Error saving throughput measurement to {stats_path} - {e}.\n"
+        log_file_write(msg_error, log_path)
+
+
+def throughput_estimate(history, min_samples=3):
+    """
+    Summarises measured processing speeds as the average processing time per second of audio, with a 95% confidence interval for that average.
+
+    Args:
+        history (list): Measurements for one throughput_key(), from throughput_stats_load().
+        min_samples (int, optional): Fewest measurements needed before they are used. Defaults to 3.
+
+    Returns:
+        tuple or None: (mean processing seconds per audio second (float), 95% interval half-width (float), number of measurements (int)), or None if there are too few measurements.
+    """
+    ratios = [entry["process_secs"] / entry["audio_secs"] for entry in history or [] if entry.get("audio_secs")]
+    if len(ratios) < min_samples:
+        return None
+    mean = statistics.fmean(ratios)
+    if mean <= 0:
+        return None
+    half_width = 1.96 * statistics.stdev(ratios) / math.sqrt(len(ratios))
+    return mean, half_width, len(ratios)
+
+
+def process_time_estimator(audio_time_dict, model_key, model_options, log_path, throughput_history=None):
+    """
+    Estimates the time required to process the audio files. Where this machine has a history of measured processing speeds for the chosen model (see throughput_record()), the estimate is based on those, with a 95% range; otherwise it falls back on the model's nominal speed_x. Converts times to mins/secs format. Prints to screen (only) a summary of the time for each individual file. The final batch processing time is written to log file.
+
+    Args:
+        audio_time_dict (dict): Dictionary containing filename (key) and the duration (value) of each audio file. Provided by audio_file_durations. Files with a duration of None (could not be probed) are left out of the estimate.
         model_key (str): Key representing the chosen model from model_options dictionary.
         model_options (dict): Dictionary containing the options for different models (see user_variables.py).
         log_path (str): Full path of log file to which status messages are written.
+        throughput_history (list, optional): Measured speeds for this model, machine and thread count, from throughput_stats_load(). If None or too short, speed_x is used.
 
     Interactions:
         Called by provide_pre_processing_summary in whisper_wrapper.py.
@@ -119,27 +527,70 @@ def process_time_estimator(audio_time_dict, model_key, model_options, log_path):
         msg_error = f"Error: {e.args[0]}"
         log_file_write(msg_error, log_path)
         raise
+
+    measured = throughput_estimate(throughput_history)
+    if measured:
+        secs_per_audio_sec, half_width, sample_count = measured
+        speed_description = f"a measured {1 / secs_per_audio_sec:.1f}x (from {sample_count} files on this machine)"
+    else:
+        secs_per_audio_sec, half_width = 1 / speed_ratio, 0
+        speed_description = f"{speed_ratio}x"
     
     batch_est_seconds = 0
+    batch_audio_seconds = 0
     for file in audio_time_dict:
         file_duration = audio_time_dict[file]
+        if file_duration is None:
+            log_file_write(f"Duration of '{file}' unknown, so it is not included in the batch estimate.\n", log_path)
+            continue
         file_mins = int((file_duration) / 60)
         file_secs = round(int(file_duration % 60), 2) 
-        est_file_process_secs = round(file_duration / speed_ratio, 2)
+        est_file_process_secs = round(file_duration * secs_per_audio_sec, 2)
         est_mins = int(est_file_process_secs / 60) 
         est_seconds = round(int(est_file_process_secs % 60), 2) 
         file_summary = (
         f"At a duration of {file_mins}min {file_secs}sec, processing '{file}'\n"
-        f"with {model_options[model_key]['name']} at {speed_ratio}x is estimated to take {est_mins}min {est_seconds}sec.\n")
+        f"with {model_options[model_key]['name']} at {speed_description} is estimated to take {est_mins}min {est_seconds}sec.\n")
         log_file_write(file_summary, log_path)
         batch_est_seconds += est_file_process_secs
+        batch_audio_seconds += file_duration
         print(f"Running total batch processing seconds: {batch_est_seconds}\n")
     formatted_batch_est_mins = int(batch_est_seconds/ 60)
     formatted_batch_est_seconds = round(int(batch_est_seconds % 60), 2)
     batch_summary = f"Total processing time for batch is approx {formatted_batch_est_mins}min {formatted_batch_est_seconds}sec\n"
+    if measured:
+        low_seconds = batch_audio_seconds * max(0, secs_per_audio_sec - half_width)
+        high_seconds = batch_audio_seconds * (secs_per_audio_sec + half_width)
+        batch_summary += f"(95% range {int(low_seconds / 60)}min {int(low_seconds % 60)}sec to {int(high_seconds / 60)}min {int(high_seconds % 60)}sec, based on {sample_count} measured files)\n"
+    else:
+        batch_summary += f"(based on the nominal speed_x of {speed_ratio}x, as there are not yet enough measurements for this model on this machine)\n"
     return batch_summary
 
 
+def schedule_batch(batch, processing_order, audio_durations):
+    """
+    Puts the batch in the order in which the files will be processed. Each file keeps its index (its position in alphabetical order), so the header numbering is the same whatever the processing order.
+
+    Args:
+        batch (list): (index, audio_file) pairs, in alphabetical order.
+        processing_order (str): "alphabetical" (unchanged), "shortest_first" (shortest recordings first, so short files are not stuck waiting behind long ones and the average wait per file is lowest) or "longest_first" (longest recordings first, so with several workers the batch does not end with one worker still busy on a long file while the others sit idle). Imported from user_variables.py
+        audio_durations (dict): Filename (key) and duration in seconds (value), from audio_file_durations().
+
+    Note:
+        Files whose duration is unknown go after the files whose duration is known. Files of equal duration stay in alphabetical order, so the order is the same on every run.
+
+    Returns:
+        list: The same (index, audio_file) pairs in processing order.
+    """
+    if processing_order not in ("shortest_first", "longest_first"):
+        return batch
+    direction = -1 if processing_order == "longest_first" else 1
+    known = [(index, audio_file) for index, audio_file in batch if audio_durations.get(audio_file) is not None]
+    unknown = [(index, audio_file) for index, audio_file in batch if audio_durations.get(audio_file) is None]
+    known.sort(key=lambda pair: (direction * audio_durations[pair[1]], pair[0]))
+    return known + unknown
+
+
 def extract_series_episode(
         audio_file, log_path, default_series="S0", default_episode="E00"):
     """
@@ -183,7 +634,7 @@ def insert_newlines(text, word_interval):
         word_interval (int): The user-specified word interval at which to insert newlines into the transcript. Note, that check_word_interval may alter this value (substituting 0 if an invalid interval was entered, so and this potentially altered value is what is passed to master_call_loop().
 
     Interactions:
-        Called by format_transcript().
+        Not used by the wrapper itself, which formats with TranscriptWriter (same layout, single pass); kept for scripts and benchmark.py.
         
     Returns:
         str: The formatted transcript with newlines inserted at the specified interval.
@@ -193,9 +644,11 @@ def insert_newlines(text, word_interval):
             return text # Returns original text without any newlines
         
         words = text.split() # NB: list of individual words
-        for i in range(word_interval -1, len(words), word_interval): 
-            words[i] = words[i] + '\n'
-        return ' '.join(words)
+        # Lines of word_interval words; as each newline is followed by the joining space, every line after the first starts with a space
+        lines = "\n ".join(" ".join(words[i:i + word_interval]) for i in range(0, len(words), word_interval))
+        if words and len(words) % word_interval == 0:
+            lines += "\n" # the last word also ends a line
+        return lines
 
     except TypeError as e:
         print(f"TypeError: {e}")
@@ -203,4 +656,146 @@ def insert_newlines(text, word_interval):
 
     except ValueError as e:
         print(f"ValueError: {e}")
-        raise
\ No newline at end of file
+        raise
+
+# Characters which end a line for str.splitlines() (the same as those which end a line in format_transcript())
+LINE_BREAKS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+
+
+class TranscriptWriter:
+    """
+    Formats a transcript piece by piece, in exactly the layout produced by format_transcript() (header, newlines every word_interval words, word count, delimiter and line numbers), writing each line to the open output file as soon as it is complete. This means a long transcript never has to be held in memory as one string, and can be written to disk while Whisper is still working.
+
+    Usage:
+        writer = TranscriptWriter(output_file, word_interval)
+        writer.write_header(header)
+        writer.write_transcript(text) # as many times as needed, i.e. once per Whisper segment
+        writer.finish(delimiter)
+
+    or, for a transcript which is already complete, writer.write_complete_transcript(text) in place of the write_transcript() calls.
+
+    Args:
+        output_file (file): Open text file to which the formatted transcript is written.
+        word_interval (int): Word interval at which to insert newlines, as checked by check_word_interval(). 0 leaves the transcript text as it is.
+    """
+
+    lines_per_write = 1000 # lines written to the file at a time by write_complete_transcript()
+
+    def __init__(self, output_file, word_interval):
+        self.output_file = output_file
+        self.word_interval = word_interval
+        self.line_number = 0 # number of the last line written
+        self.partial_line = "" # text of the current line, not yet ended by a newline
+        self.word_count = 0 # words written so far, counted as str.split() would count them
+        self.in_word = False # True if the last character written was not whitespace
+        self.transcript_words = 0 # transcript words wrapped so far (word_interval > 0 only)
+        self.carry = "" # possible part-word at the end of the last piece of transcript (word_interval > 0 only)
+        self.segment_lines = 0 # segments written as lines of their own by write_segment_line()
+
+    def write_text(self, text):
+        """Counts the words in text, adds line numbers and writes each completed line. Any incomplete final line is held until more text arrives."""
+        if not text:
+            return
+        words = len(text.split())
+        if words and self.in_word and not text[0].isspace():
+            words -= 1 # the first word continues the last word already counted
+        self.word_count += words
+        self.in_word = not text[-1].isspace()
+
+        pieces = (self.partial_line + text).splitlines(keepends=True)
+        # The last piece is held back if it has no line ending yet, or ends in "\r" (which may be the first half of "\r\n")
+        last = pieces[-1]
+        if last[-1] == "\r" or last[-1] not in LINE_BREAKS:
+            self.partial_line = pieces.pop()
+        else:
+            self.partial_line = ""
+        self.write_lines(piece[:-2] if piece.endswith("\r\n") else piece[:-1] for piece in pieces)
+
+    def write_lines(self, lines):
+        """Writes complete lines, each prefixed with its line number. Lines are separated (not terminated) by newlines, as in format_transcript()."""
+        numbered = []
+        for line in lines:
+            self.line_number += 1
+            separator = "\n" if self.line_number > 1 else ""
+            numbered.append(f"{separator}{self.line_number}: {line}")
+        self.output_file.write("".join(numbered))
+
+    def write_header(self, header):
+        """Writes the header constructed by create_header()."""
+        self.write_text(header)
+
+    def write_transcript(self, text):
+        """Writes the next piece of transcript text (i.e. one Whisper segment), inserting a newline after every word_interval words across the transcript as a whole."""
+        if self.word_interval == 0:
+            self.write_text(text)
+            return
+        text = self.carry + text
+        words = text.split()
+        # A piece that ends mid-word may be continued by the next piece
+        self.carry = words.pop() if words and not text[-1].isspace() else ""
+        self.write_text(self.wrap_words(words))
+
+    def write_segment_line(self, text):
+        """Writes the text of one of Whisper's segments as a line of its own (wrap_on_segments True, with a word_interval of 0), giving the same layout as write_complete_transcript() with the segments joined by newlines."""
+        self.write_text(f"\n{text}" if self.segment_lines else text)
+        self.segment_lines += 1
+
+    def write_complete_transcript(self, text):
+        """
+        Writes the whole of a transcript (or all that remains of it) in one pass, with the same result as write_transcript(text). The text is split into words once; after the first line, the newlines, word count and line numbers are worked out from the list of words, and lines are written lines_per_write at a time, so a long transcript is never held as one formatted string. This keeps peak memory down; it is not faster than formatting the transcript as one string (see benchmark.py).
+
+        Raises:
+            TypeError: If text is not a string (i.e. transcription failed and returned False).
+        """
+        if not isinstance(text, str):
+            raise TypeError(f"transcript must be a string, not {type(text).__name__}")
+        if self.word_interval == 0:
+            self.write_text(text)
+            return
+        words = (self.carry + text).split()
+        self.carry = ""
+        interval = self.word_interval
+
+        # Finish the current line (which may continue the header) the ordinary way
+        first = interval - self.transcript_words % interval
+        self.write_text(self.wrap_words(words[:first]))
+        if len(words) <= first:
+            return
+
+        # Every later line holds interval words and starts with a space, as after insert_newlines()
+        self.word_count += len(words) - first
+        self.transcript_words += len(words) - first
+        full_end = first + (len(words) - first) // interval * interval
+        step = interval * self.lines_per_write
+        for block_start in range(first, full_end, step):
+            block = words[block_start:min(block_start + step, full_end)]
+            # The newline and number of each following line go on the last word of a line, so one join writes the whole block
+            number = self.line_number + 1
+            for end in range(interval - 1, len(block) - 1, interval):
+                number += 1
+                block[end] = f"{block[end]}\n{number}: "
+            self.output_file.write(f"\n{self.line_number + 1}:  " + " ".join(block))
+            self.line_number = number
+        if full_end < len(words):
+            self.partial_line = " " + " ".join(words[full_end:])
+            self.in_word = True
+
+    def wrap_words(self, words):
+        """Joins words as insert_newlines() would, continuing the word numbering from earlier pieces."""
+        parts = []
+        for word in words:
+            self.transcript_words += 1
+            separator = " " if self.transcript_words > 1 else ""
+            ending = "\n" if self.transcript_words % self.word_interval == 0 else ""
+            parts.append(f"{separator}{word}{ending}")
+        return "".join(parts)
+
+    def finish(self, delimiter):
+        """Writes any remaining transcript, then the word count and end delimiter, and the final line."""
+        if self.carry:
+            self.write_text(self.wrap_words([self.carry]))
+            self.carry = ""
+        self.write_text(f"\nWord count: {self.word_count}\n{delimiter}\n")
+        if self.partial_line:
+            self.write_lines([self.partial_line.splitlines()[0]])
+            self.partial_line = ""
@@ -0,0 +1,138 @@
+"""PROGRESS JOURNAL UTILITIES"""
+
+from datetime import datetime as dt
+import hashlib
+import json
+import os
+import threading
+
+from utils_helper import log_file_write, atomic_write_json
+
+# Per-file stages recorded in the journal, in the order they complete
+journal_stages = ("transcribed", "saved", "moved")
+
+# Journal updates may come from the main thread and from background threads
+journal_lock = threading.Lock()
+
+
+def journal_load(journal_path, log_path):
+    """
+    Loads the progress journal for a batch. A missing journal simply means nothing has been completed yet; an unreadable one is logged and ignored, so the batch is processed in full rather than aborted.
+
+    Args:
+        journal_path (str): Full path of the journal file.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Returns:
+        dict: The journal, in the format {"files": {audio_file: {"size": int, "mtime": float, "settings": str, "stages": {stage: timestamp}, "outputs": [path]}}}.
+    """
+    try:
+        with open(journal_path, "r", encoding="utf-8") as journal_file:
+            journal = json.load(journal_file)
+        if not isinstance(journal.get("files"), dict):
+            raise ValueError("missing 'files' entry")
+        return journal
+    except FileNotFoundError:
+        return {"files": {}}
+    except (OSError, ValueError, AttributeError) as e:
+        msg_error = f"Error reading progress journal {journal_path} - {e}. All files will be processed.\n"
+        log_file_write(msg_error, log_path)
+        return {"files": {}}
+
+
+def journal_file_path(path_for_cache, path_for_output, model_name):
+    """
+    Builds the path of the progress journal for one model's transcripts in one output directory. Journals are kept in a "journals" folder in path_for_cache rather than beside the transcripts, named after the model and a key of the output directory's full path, so each output directory has its own journal.
+
+    Args:
+        path_for_cache (str): Path to the cache directory. Imported from user_variables.py
+        path_for_output (str): Path to the directory where transcripts are saved. Imported from user_variables.py
+        model_name (str): The model's alt_name, i.e. "medium_en".
+
+    Returns:
+        str: Full path of the journal file, i.e. cache/journals/journal_medium_en_3f2a9c41d0b7.json.
+    """
+    output_key = hashlib.sha256(os.path.abspath(path_for_output).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(path_for_cache, "journals", f"journal_{model_name}_{output_key}.json")
+
+
+def journal_settings_key(settings):
+    """
+    Condenses the settings which shape a transcript into a short key for journal entries, so a file processed with different settings is not treated as done.
+
+    Args:
+        settings (dict): The settings, i.e. word interval, delimiter and output formats. Values which are not JSON types are compared by their text.
+
+    Returns:
+        str: Hex digest of the settings.
+    """
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def journal_completed_stages(journal, audio_file, full_path, settings_key=None):
+    """
+    Returns the stages already completed for an audio file. Entries are only trusted if the file still has the size and modification time recorded when its first stage completed, so a different recording saved under the same name is processed afresh, and if they were recorded with the same settings. "saved" is only trusted while every output file recorded with it still exists.
+
+    Args:
+        journal (dict): Journal loaded by journal_load().
+        audio_file (str): Filename of the audio file (journal key).
+        full_path (str): Current path of the audio file.
+        settings_key (str, optional): Key of the current settings, from journal_settings_key().
+
+    Returns:
+        set: Names of the completed stages (see journal_stages).
+    """
+    entry = journal["files"].get(audio_file)
+    if not entry or entry.get("settings") != settings_key:
+        return set()
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return set()
+    if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+        return set()
+    stages = set(entry.get("stages", {}))
+    outputs = entry.get("outputs")
+    if "saved" in stages and not (outputs and all(os.path.exists(output_path) for output_path in outputs)):
+        stages -= {"saved", "moved"}
+    return stages
+
+
+def journal_mark(journal, journal_path, audio_file, stage, full_path, log_path, settings_key=None, outputs=None):
+    """
+    Records that a stage has completed for an audio file and rewrites the journal atomically, so a crash part-way through a write leaves the previous journal intact. The first stage ("transcribed") starts a new entry for the file, so nothing recorded by an earlier run (perhaps with other settings) is carried over.
+
+    Args:
+        journal (dict): Journal loaded by journal_load(), updated in place.
+        journal_path (str): Full path of the journal file.
+        audio_file (str): Filename of the audio file (journal key).
+        stage (str): Stage which has completed (see journal_stages).
+        full_path (str): Path of the audio file when the stage started, used to record its size and modification time.
+        log_path (str): Full path of log file to which status messages are written.
+        settings_key (str, optional): Key of the settings the file is processed with, from journal_settings_key().
+        outputs (list, optional): Paths of the output files, recorded with "saved" so that resuming can check they are still there.
+
+    Contingency:
+        A failure to write the journal is logged but does not interrupt processing: at worst, the file is processed again on resume.
+
+    Returns: None
+    """
+    with journal_lock:
+        entry = journal["files"].get(audio_file)
+        if entry is None or not entry.get("stages") or stage == journal_stages[0]:
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                stat = None
+            entry = {"size": stat.st_size if stat else None, "mtime": stat.st_mtime if stat else None, "settings": settings_key, "stages": {}}
+            journal["files"][audio_file] = entry
+        entry["stages"][stage] = dt.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if outputs is not None:
+            entry["outputs"] = list(outputs)
+        try:
+            os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+            atomic_write_json(journal, journal_path)
+        except (OSError, TypeError, ValueError) as e:
+            msg_error = f"Error writing progress journal {journal_path} - {e}.\n"
+            log_file_write(msg_error, log_path)
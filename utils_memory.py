@@ -0,0 +1,68 @@
+"""MEMORY PLANNING UTILITIES"""
+
+from utils_audio import estimate_decoded_bytes
+
+# While Whisper converts ffmpeg's 16-bit output to float32, both copies are held: half as much again as the decoded audio
+DECODE_OVERHEAD = 0.5
+
+# Duration assumed for the longest file when no durations are known (i.e. lazy_discovery, or ffprobe unavailable)
+DEFAULT_LONGEST_SECS = 3600
+
+
+def decoded_audio_mb(duration_secs):
+    """Memory taken by a recording of duration_secs once decoded for Whisper (16 kHz mono float32, roughly 220MB per hour), in MB. See estimate_decoded_bytes() in utils_audio.py."""
+    return estimate_decoded_bytes(duration_secs) / (1024 * 1024)
+
+
+def plan_memory(model_mb, longest_secs, worker_secs, workers, ahead_files, ahead_cap_mb, budget_mb, gpu_budget_mb=None):
+    """
+    Works out the largest number of worker processes, and of files decoded ahead of transcription, that fit in a memory budget, without going above the numbers requested.
+
+    Args:
+        model_mb (float): Memory needed by one copy of the model(s), in MB (each worker process holds its own copy).
+        longest_secs (float): Duration of the longest file in the batch, in seconds.
+        worker_secs (float): Longest audio a worker process holds at once, in seconds: less than longest_secs when long files are split into chunks for the workers (long_file_mode), in which case the parent process decodes the whole of the longest file.
+        workers (int): Number of worker processes requested (num_workers).
+        ahead_files (int): Number of files requested to be decoded ahead of transcription (prefetch_depth, or the staged pipeline's decode queue), only used with one worker.
+        ahead_cap_mb (float or None): Limit on memory for files decoded ahead (prefetch_memory_mb), or None for no limit.
+        budget_mb (float): System memory (RAM) available to the batch, in MB.
+        gpu_budget_mb (float or None, optional): GPU memory available, in MB, if the models run on a GPU. Each copy of the model is then counted against gpu_budget_mb, and budget_mb only has to hold the decoded audio. Defaults to None: the models are in system memory.
+
+    Note:
+        Each process holding a model needs the model, the decoded audio it is transcribing and, while decoding, the extra copy of DECODE_OVERHEAD. With one worker, each file decoded ahead adds the decoded audio of the longest file (up to ahead_cap_mb). Whisper's own working memory is included in the memory_mb figures from the memory guide.
+
+    Returns:
+        dict: "workers" and "ahead_files" (the numbers that fit, never more than requested; at least 1 worker), "need_mb" (estimated system memory for that plan), "gpu_need_mb" (estimated GPU memory for that plan, or None without a GPU), "budget_mb", "fits" (False if even one worker with nothing decoded ahead is over budget), "worker_mb" (system memory per worker process) and "longest_secs".
+    """
+    ram_model_mb = model_mb if gpu_budget_mb is None else 0
+    longest_mb = decoded_audio_mb(longest_secs)
+    single_mb = ram_model_mb + longest_mb * (1 + DECODE_OVERHEAD)
+
+    def gpu_need_mb(count):
+        return None if gpu_budget_mb is None else count * model_mb
+
+    chosen_workers = 1
+    if workers > 1:
+        worker_mb = ram_model_mb + decoded_audio_mb(worker_secs) * (1 + DECODE_OVERHEAD)
+        parent_mb = longest_mb * (1 + DECODE_OVERHEAD) if worker_secs < longest_secs else 0
+        if worker_mb <= 0 or parent_mb + workers * worker_mb <= budget_mb:
+            fit_workers = workers
+        else:
+            fit_workers = int((budget_mb - parent_mb) // worker_mb)
+        if gpu_budget_mb is not None and model_mb > 0 and workers * model_mb > gpu_budget_mb:
+            fit_workers = min(fit_workers, int(gpu_budget_mb // model_mb))
+        chosen_workers = max(1, min(workers, fit_workers))
+        if chosen_workers > 1:
+            need_mb = parent_mb + chosen_workers * worker_mb
+            return {"workers": chosen_workers, "ahead_files": 0, "need_mb": need_mb, "gpu_need_mb": gpu_need_mb(chosen_workers), "budget_mb": budget_mb, "fits": True, "worker_mb": worker_mb, "longest_secs": longest_secs}
+
+    def ahead_mb(files):
+        memory = files * longest_mb
+        return memory if ahead_cap_mb is None else min(memory, ahead_cap_mb)
+
+    chosen_ahead = max(0, ahead_files)
+    while chosen_ahead > 0 and single_mb + ahead_mb(chosen_ahead) > budget_mb:
+        chosen_ahead -= 1
+    need_mb = single_mb + ahead_mb(chosen_ahead)
+    fits = need_mb <= budget_mb and (gpu_budget_mb is None or model_mb <= gpu_budget_mb)
+    return {"workers": 1, "ahead_files": chosen_ahead, "need_mb": need_mb, "gpu_need_mb": gpu_need_mb(1), "budget_mb": budget_mb, "fits": fits, "worker_mb": single_mb, "longest_secs": longest_secs}
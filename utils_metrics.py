@@ -0,0 +1,315 @@
+"""STAGE TIMING AND MEMORY METRICS"""
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime as dt
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+from user_variables import collect_metrics
+from utils_helper import log_file_write, atomic_write_json
+
+# Per-stage totals for this process: stage name (key) and {"calls", "total_secs", "max_secs", "rss_mb", "peak_rss_mb", "peak_gpu_mb"} (value). Worker processes pass theirs back to the parent.
+stage_metrics = {}
+run_started = time.time()
+
+# Stages are measured on the main thread, the pipeline's stage threads and the background mover's thread at once
+metrics_lock = threading.Lock()
+
+# The stages which run the model. torch keeps a single peak GPU memory counter for the whole process, so it is only reset and read around these: resetting it at the start of every stage, on every thread, would lose the peak of a transcription still running
+GPU_STAGES = ("transcribe", "stream_transcript", "compare_transcribe")
+
+# Returned by stage_timer() when collect_metrics is False, so switched-off instrumentation costs one function call per stage
+no_op_timer = nullcontext()
+
+
+def memory_usage_mb():
+    """
+    Reads this process's current and peak resident memory (RSS).
+
+    Returns:
+        tuple: (current RSS in MB or None, peak RSS in MB or None). Current RSS is only available on Linux (from /proc); peak RSS is unavailable on Windows.
+    """
+    current = None
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            current = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    peak = None
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024 # bytes on macOS, KB elsewhere
+    return current, peak
+
+
+def gpu_peak_mb(reset=False):
+    """
+    Reads the peak GPU memory allocated by torch since the last reset. torch is only consulted if it has already been imported (by Whisper), so measuring never loads it.
+
+    Args:
+        reset (bool, optional): If True, the peak is reset (at the start of a stage) and None is returned.
+
+    Returns:
+        float or None: Peak GPU memory in MB, or None if no GPU is in use.
+    """
+    torch = sys.modules.get("torch")
+    try:
+        if torch is None or not torch.cuda.is_available() or not torch.cuda.is_initialized():
+            return None
+        if reset:
+            torch.cuda.reset_peak_memory_stats()
+            return None
+        return torch.cuda.max_memory_allocated() / (1024 * 1024)
+    except (AttributeError, RuntimeError):
+        return None
+
+
+def gpu_memory_mb():
+    """
+    Reads how much GPU memory is free, if torch has already been imported (by Whisper) and a GPU is available, i.e. whether Whisper will load models onto a GPU.
+
+    Returns:
+        float or None: Free GPU memory in MB, or None if no GPU is available (or torch has not been imported).
+    """
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return torch.cuda.mem_get_info()[0] / (1024 * 1024)
+    except (AttributeError, RuntimeError):
+        pass
+    return None
+
+
+def system_memory_mb():
+    """
+    Reads the system's available memory (MemAvailable, which counts reclaimable file cache as free).
+
+    Returns:
+        float or None: Available memory in MB, or None if it cannot be read (i.e. on Windows or macOS).
+    """
+    try:
+        with open("/proc/meminfo", "r") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 # reported in KB
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def available_memory_mb():
+    """
+    Reads how much memory is free for models to use: free GPU memory if torch has already been imported (by Whisper) and a GPU is available (gpu_memory_mb()), otherwise the system's available memory (system_memory_mb()).
+
+    Returns:
+        float or None: Available memory in MB, or None if it cannot be read (i.e. system memory on Windows or macOS).
+    """
+    gpu_mb = gpu_memory_mb()
+    return gpu_mb if gpu_mb is not None else system_memory_mb()
+
+
+def stage_timer(stage):
+    """
+    Context manager which measures one run of a processing stage, i.e. `with stage_timer("transcribe"): ...`. Adds the elapsed time and the process's memory use at the end of the stage to stage_metrics.
+
+    Args:
+        stage (str): Name of the stage, used as the metric label.
+
+    Note:
+        Peak RSS is the process's high-water mark at the end of the stage (the operating system does not report a per-stage peak), so the first stage to reach it is the one that caused it.
+
+    Returns:
+        context manager: A shared do-nothing context if collect_metrics is False.
+    """
+    if not collect_metrics:
+        return no_op_timer
+    return measure_stage(stage)
+
+
+@contextmanager
+def measure_stage(stage):
+    """Measures one run of a stage for stage_timer(), when collect_metrics is True. Peak GPU memory is only measured for GPU_STAGES."""
+    gpu_stage = stage in GPU_STAGES
+    if gpu_stage:
+        gpu_peak_mb(reset=True)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        current, peak = memory_usage_mb()
+        record_stage_metrics(stage, {"calls": 1, "total_secs": elapsed, "max_secs": elapsed, "rss_mb": current, "peak_rss_mb": peak, "peak_gpu_mb": gpu_peak_mb() if gpu_stage else None})
+
+
+def timed_iter(iterable, stage):
+    """
+    Times how long each item of iterable takes to arrive, i.e. how long processing waits on a background decoder. Returns iterable unchanged if collect_metrics is False.
+
+    Args:
+        iterable (iterable): The items, i.e. the generator from prefetch_audio().
+        stage (str): Name of the stage, used as the metric label.
+
+    Returns:
+        iterable: The same items, in the same order.
+    """
+    if not collect_metrics:
+        return iterable
+
+    def timed():
+        iterator = iter(iterable)
+        while True:
+            with stage_timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    return timed()
+
+
+def record_stage_metrics(stage, measurement):
+    """
+    Adds one measurement (or a worker process's totals) to stage_metrics: times and call counts are summed, memory readings keep the maximum.
+
+    Args:
+        stage (str): Name of the stage.
+        measurement (dict): Keys "calls", "total_secs", "max_secs", "rss_mb", "peak_rss_mb" and "peak_gpu_mb" (memory readings may be None).
+
+    Returns: None
+    """
+    with metrics_lock:
+        entry = stage_metrics.setdefault(stage, {"calls": 0, "total_secs": 0.0, "max_secs": 0.0, "rss_mb": None, "peak_rss_mb": None, "peak_gpu_mb": None})
+        entry["calls"] += measurement["calls"]
+        entry["total_secs"] += measurement["total_secs"]
+        entry["max_secs"] = max(entry["max_secs"], measurement["max_secs"])
+        for key in ("rss_mb", "peak_rss_mb", "peak_gpu_mb"):
+            if measurement[key] is not None:
+                entry[key] = measurement[key] if entry[key] is None else max(entry[key], measurement[key])
+
+
+def stage_metrics_merge(metrics):
+    """
+    Adds the stage metrics passed back from a worker process to this process's totals.
+
+    Args:
+        metrics (dict): Stage metrics from stage_metrics_collect() in the worker.
+
+    Returns: None
+    """
+    for stage, measurement in metrics.items():
+        record_stage_metrics(stage, measurement)
+
+
+def stage_metrics_collect():
+    """
+    Hands back and resets this process's stage metrics. Used by worker processes to report per file.
+
+    Returns:
+        dict: Stage metrics, in the format of stage_metrics.
+    """
+    with metrics_lock:
+        metrics = {stage: dict(entry) for stage, entry in stage_metrics.items()}
+        stage_metrics.clear()
+    return metrics
+
+
+def prometheus_text(report):
+    """
+    Formats the metrics report in the Prometheus text exposition format.
+
+    Args:
+        report (dict): Report built by metrics_report_write().
+
+    Returns:
+        str: The metrics, one "name{labels} value" line each, with HELP and TYPE comments.
+    """
+    model = report["model"].replace("\\", "\\\\").replace('"', '\\"')
+    lines = []
+
+    def add(name, help_text, metric_type, values):
+        lines.append(f"# HELP whisper_wrapper_{name} {help_text}")
+        lines.append(f"# TYPE whisper_wrapper_{name} {metric_type}")
+        for labels, value in values:
+            label_text = ",".join([f'model="{model}"'] + [f'{key}="{label}"' for key, label in labels.items()])
+            lines.append(f"whisper_wrapper_{name}{{{label_text}}} {value}")
+
+    stages = report["stages"]
+    add("stage_seconds", "Total time spent in each stage during the last run.", "gauge", [({"stage": stage}, entry["total_secs"]) for stage, entry in stages.items()])
+    add("stage_calls", "Number of times each stage ran during the last run.", "gauge", [({"stage": stage}, entry["calls"]) for stage, entry in stages.items()])
+    add("stage_max_seconds", "Longest single run of each stage during the last run.", "gauge", [({"stage": stage}, entry["max_secs"]) for stage, entry in stages.items()])
+    add("stage_peak_rss_bytes", "Process peak resident memory at the end of each stage.", "gauge", [({"stage": stage}, entry["peak_rss_mb"] * 1024 * 1024) for stage, entry in stages.items() if entry["peak_rss_mb"] is not None])
+    add("stage_peak_gpu_bytes", "Peak GPU memory allocated by torch during each stage which runs the model.", "gauge", [({"stage": stage}, entry["peak_gpu_mb"] * 1024 * 1024) for stage, entry in stages.items() if entry["peak_gpu_mb"] is not None])
+    add("run_duration_seconds", "Wall-clock duration of the last run.", "gauge", [({}, report["run_secs"])])
+    add("run_files", "Number of files in the last run.", "gauge", [({}, report["file_count"])])
+    add("last_run_timestamp_seconds", "Unix time at which the last run finished.", "gauge", [({}, report["finished_unix"])])
+    return "\n".join(lines) + "\n"
+
+
+def metrics_report_write(path_for_metrics, prometheus_textfile_dir, model_name, file_count, log_path):
+    """
+    Writes the stage metrics gathered during the run as a JSON report (metrics_<date-time>.json in path_for_metrics) and as a Prometheus textfile (whisper_wrapper.prom), if collect_metrics is True. Both are written via a temporary file and renamed into place, so the textfile collector never reads a half-written file.
+
+    Args:
+        path_for_metrics (str): Directory for the JSON reports. Imported from user_variables.py
+        prometheus_textfile_dir (str): Directory watched by node exporter's textfile collector, or "" to use path_for_metrics. Imported from user_variables.py
+        model_name (str): Whisper model name, i.e. "medium.en", used as a label.
+        file_count (int): Number of files in the batch.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Contingency:
+        Failure to write either file is logged but does not affect the batch, which has already finished.
+
+    Returns: None
+    """
+    if not collect_metrics:
+        return
+    finished = time.time()
+    with metrics_lock:
+        stages = {stage: dict(entry) for stage, entry in stage_metrics.items()}
+    report = {
+        "model": model_name,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started": dt.fromtimestamp(run_started).strftime("%Y-%m-%d_%H-%M-%S"),
+        "finished": dt.fromtimestamp(finished).strftime("%Y-%m-%d_%H-%M-%S"),
+        "finished_unix": finished,
+        "run_secs": finished - run_started,
+        "file_count": file_count,
+        "stages": stages,
+    }
+
+    try:
+        os.makedirs(path_for_metrics or ".", exist_ok=True)
+        report_path = os.path.join(path_for_metrics, f"metrics_{report['finished']}.json")
+        atomic_write_json(report, report_path)
+
+        textfile_dir = prometheus_textfile_dir or path_for_metrics or "."
+        os.makedirs(textfile_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=textfile_dir, prefix=".tmp_", suffix=".prom")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                temp_file.write(prometheus_text(report))
+            os.chmod(temp_path, 0o644) # mkstemp creates the file readable by its owner only
+            os.replace(temp_path, os.path.join(textfile_dir, "whisper_wrapper.prom"))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        slowest = sorted(stages.items(), key=lambda item: item[1]["total_secs"], reverse=True)[:5]
+        pretty_slowest = "\n".join(f"- {stage}: {entry['total_secs']:.1f}s over {entry['calls']} call(s)" for stage, entry in slowest)
+        msg_success = f"Stage metrics saved to {report_path}. Most time spent in:\n{pretty_slowest}\n"
+        log_file_write(msg_success, log_path)
+    except (OSError, TypeError, ValueError) as e:
+        msg_error = f"Error writing stage metrics - {e}.\n"
+        log_file_write(msg_error, log_path)
@@ -0,0 +1,131 @@
+"""MOVING PROCESSED FILES"""
+
+import errno
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+# Largest amount copied by one copy_file_range/sendfile call (the kernel limits a single call to just under 2GB)
+COPY_CHUNK_BYTES = 1024 * 1024 * 1024
+
+
+def copy_file_kernel(source_file, destination_file, size):
+    """
+    Copies size bytes between two open files inside the kernel, without passing the data through Python. copy_file_range is tried first, as it lets the filesystem do the copy itself (i.e. a server-side copy on an NFS or SMB share); sendfile is used where copy_file_range is not supported, and an ordinary buffered copy where neither is available (i.e. on Windows).
+
+    Args:
+        source_file (file): Source, opened for reading in binary mode.
+        destination_file (file): Destination, opened for writing in binary mode.
+        size (int): Number of bytes to copy (the size of the source file).
+
+    Returns:
+        int: Number of bytes copied.
+    """
+    source_fd = source_file.fileno()
+    destination_fd = destination_file.fileno()
+    copied = 0
+    for copy_call in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copy_call is None:
+            continue
+        # copy_file_range is given explicit offsets, so it leaves the destination's position where it was; sendfile writes at that position
+        os.lseek(destination_fd, copied, os.SEEK_SET)
+        try:
+            while copied < size:
+                if copy_call is os.sendfile:
+                    sent = os.sendfile(destination_fd, source_fd, copied, min(COPY_CHUNK_BYTES, size - copied))
+                else:
+                    sent = os.copy_file_range(source_fd, destination_fd, min(COPY_CHUNK_BYTES, size - copied), copied, copied)
+                if sent == 0: # end of the source, or a filesystem which reports nothing copied rather than an error
+                    break
+                copied += sent
+        except OSError as e:
+            # not supported for this pair of files (i.e. different filesystem types, or sendfile on macOS, which only sends to sockets): try the next method from where this one stopped
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ENOTSOCK):
+                raise
+        if copied >= size:
+            return copied
+
+    source_file.seek(copied)
+    destination_file.seek(copied)
+    shutil.copyfileobj(source_file, destination_file, 8 * 1024 * 1024)
+    return destination_file.tell()
+
+
+def move_file(source_path, destination_path):
+    """
+    Moves a file. If the source and destination are on the same device, the file is simply renamed. Otherwise it is copied to a temporary file beside the destination (by copy_file_kernel()), the copy is checked to be the same size as the source, and only then is it renamed into place and the source deleted. An interrupted or failed copy therefore never leaves a partial file under the destination name, and never loses the source.
+
+    Args:
+        source_path (str): Path of the file to move.
+        destination_path (str): Path to move it to. An existing file at this path is replaced.
+
+    Raises:
+        OSError: If the file cannot be moved, or if the copy is incomplete (in which case the source is kept).
+
+    Returns:
+        str: "renamed" or "copied".
+    """
+    destination_dir = os.path.dirname(destination_path) or "."
+    source_stat = os.stat(source_path)
+    if source_stat.st_dev == os.stat(destination_dir).st_dev:
+        try:
+            os.replace(source_path, destination_path)
+            return "renamed"
+        except OSError as e:
+            if e.errno != errno.EXDEV: # i.e. a bind mount of the same device
+                raise
+
+    fd, temp_path = tempfile.mkstemp(dir=destination_dir, prefix=".tmp_", suffix=os.path.splitext(destination_path)[1])
+    try:
+        with open(source_path, "rb") as source_file, os.fdopen(fd, "wb") as destination_file:
+            copied = copy_file_kernel(source_file, destination_file, source_stat.st_size)
+            destination_file.flush()
+            os.fsync(destination_file.fileno())
+            copied_size = os.fstat(destination_file.fileno()).st_size
+        if copied != source_stat.st_size or copied_size != source_stat.st_size or os.stat(source_path).st_size != source_stat.st_size:
+            raise OSError(errno.EIO, f"copy incomplete ({copied_size} of {source_stat.st_size} bytes), so the original was kept", source_path)
+        shutil.copystat(source_path, temp_path)
+        os.replace(temp_path, destination_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.remove(source_path)
+    return "copied"
+
+
+class BackgroundMover:
+    """
+    Moves processed files in a background thread, one at a time and in the order they were queued, so that a slow move (i.e. copying a large file to a network share) overlaps with transcription of the next file instead of delaying it.
+
+    Args:
+        move_function (callable): Called in the background thread with each queued item, i.e. a function which moves one processed file and records the result.
+    """
+
+    def __init__(self, move_function):
+        self.move_function = move_function
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="background_mover", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Moves queued items until close() is called."""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            try:
+                self.move_function(item)
+            except Exception: # move_function reports its own errors; one failed move must not stop the others
+                pass
+
+    def submit(self, item):
+        """Queues an item to be moved."""
+        self.pending.put(item)
+
+    def close(self):
+        """Waits for every queued move to finish, then stops the background thread."""
+        self.pending.put(None)
+        self.thread.join()
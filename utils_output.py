@@ -0,0 +1,128 @@
+"""SUBTITLE AND SEGMENT OUTPUT FORMATS"""
+
+import json
+
+# Output formats which can be listed in output_formats, in user_variables.py
+OUTPUT_FORMATS = ("txt", "srt", "vtt", "json")
+
+# Segment keys copied into the .json output, besides "start", "end" and "text"
+SEGMENT_SCORES = ("avg_logprob", "compression_ratio", "no_speech_prob", "temperature")
+
+
+def normalise_output_formats(output_formats):
+    """
+    Turns output_formats into the formats to be written: lower case, without a leading ".", in the order given and without repeats. Unrecognised formats are left out.
+
+    Args:
+        output_formats (str or list): A single format, i.e. "srt", or a list, i.e. ["txt", "srt"]. Imported from user_variables.py
+
+    Returns:
+        tuple: (formats (tuple of str), unrecognised (list of str)). If no format is recognised, formats is ("txt",).
+    """
+    if isinstance(output_formats, str):
+        output_formats = [output_formats]
+    formats = []
+    unrecognised = []
+    for output_format in output_formats:
+        name = str(output_format).lower().lstrip(".")
+        if name not in OUTPUT_FORMATS:
+            unrecognised.append(output_format)
+        elif name not in formats:
+            formats.append(name)
+    return tuple(formats) or ("txt",), unrecognised
+
+
+def segment_lines(segments):
+    """
+    Gives the text of each of Whisper's segments as one line, without the surrounding spaces Whisper adds. Segments with no text are skipped. Used for subtitles, and for the .txt transcript when wrap_on_segments is True.
+
+    Args:
+        segments (list): Whisper's timestamped segments (dicts with "start", "end" and "text" among other keys).
+
+    Returns:
+        generator: (segment (dict), text (str)) for each segment with text. Any line breaks within a segment's text are replaced with spaces.
+    """
+    for segment in segments:
+        text = " ".join(segment["text"].split())
+        if text:
+            yield segment, text
+
+
+def subtitle_timestamp(seconds, decimal_marker):
+    """
+    Formats a time in seconds as a subtitle timestamp, HH:MM:SS followed by milliseconds, i.e. 01:02:03,456 (SRT uses "," as the decimal marker, WebVTT uses ".").
+
+    Args:
+        seconds (float): Time from the start of the recording.
+        decimal_marker (str): "," or ".".
+
+    Returns:
+        str: The timestamp. Hours are not limited to two digits, so recordings over 100 hours are still timed correctly.
+    """
+    milliseconds = max(0, round(float(seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def write_srt(output_file, segments):
+    """
+    Writes Whisper's segments to an open file as SubRip (.srt) subtitles, one numbered cue per segment.
+
+    Args:
+        output_file (file): Open text file.
+        segments (list): Whisper's timestamped segments.
+
+    Returns: None
+    """
+    for number, (segment, text) in enumerate(segment_lines(segments), start=1):
+        output_file.write(f"{number}\n{subtitle_timestamp(segment['start'], ',')} --> {subtitle_timestamp(segment['end'], ',')}\n{text}\n\n")
+
+
+def write_vtt(output_file, segments):
+    """
+    Writes Whisper's segments to an open file as WebVTT (.vtt) subtitles, one cue per segment. "&", "<" and ">" are escaped, as WebVTT treats them as markup.
+
+    Args:
+        output_file (file): Open text file.
+        segments (list): Whisper's timestamped segments.
+
+    Returns: None
+    """
+    output_file.write("WEBVTT\n\n")
+    for segment, text in segment_lines(segments):
+        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        output_file.write(f"{subtitle_timestamp(segment['start'], '.')} --> {subtitle_timestamp(segment['end'], '.')}\n{text}\n\n")
+
+
+def write_segments_json(output_file, segments, raw_transcript, audio_file, model_name):
+    """
+    Writes the transcript to an open file as JSON: the full text, plus each of Whisper's segments with its start and end time (in seconds), text and Whisper's confidence scores for it.
+
+    Args:
+        output_file (file): Open text file.
+        segments (list): Whisper's timestamped segments.
+        raw_transcript (str): The full transcript text.
+        audio_file (str): Filename of the audio file transcribed.
+        model_name (str): Whisper model name, i.e. "medium.en".
+
+    Returns: None
+    """
+    output = {
+        "audio_file": audio_file,
+        "model": model_name,
+        "text": raw_transcript,
+        "segments": [
+            {
+                "id": number,
+                "start": round(float(segment["start"]), 3),
+                "end": round(float(segment["end"]), 3),
+                "text": segment["text"],
+                **{key: float(segment[key]) for key in SEGMENT_SCORES if segment.get(key) is not None},
+            }
+            for number, segment in enumerate(segments)
+        ],
+    }
+    json.dump(output, output_file, ensure_ascii=False, indent=2)
+    output_file.write("\n")
@@ -0,0 +1,90 @@
+"""STAGED PIPELINE UTILITIES"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Passed down a queue to tell a stage's workers that there are no more items
+STAGE_DONE = object()
+
+
+async def run_stage(name, function, concurrency, inbox, outbox, downstream_concurrency, on_error):
+    """
+    Runs one stage of the pipeline: concurrency workers take items from inbox, run function on each in the stage's own thread pool (so blocking work never holds up the event loop or another stage), and put the results on outbox. Results are passed on in the order the items arrived, even when several workers finish out of order, so every stage sees the files in batch order.
+
+    Args:
+        name (str): Name of the stage, used in error reports.
+        function (callable): Called with each item; returns the item for the next stage, or None to drop it (i.e. a file which could not be processed further).
+        concurrency (int): Number of items processed at once.
+        inbox (asyncio.Queue): Items from the previous stage, in order, ended by one STAGE_DONE per worker.
+        outbox (asyncio.Queue or None): Queue of the next stage, or None for the last stage. Bounded, so a stage waits (backpressure) when the next stage falls behind.
+        downstream_concurrency (int): Number of workers in the next stage, each of which is sent STAGE_DONE once this stage has finished.
+        on_error (callable): Called with (name, item, exception) if function raises; the item is then dropped and the stage carries on.
+
+    Returns: None
+    """
+    loop = asyncio.get_running_loop()
+    turn = {"next": 0, "taken": 0}
+    in_order = asyncio.Condition()
+
+    async def pass_on(sequence, result):
+        # wait for every earlier item to be passed on (or dropped) first
+        async with in_order:
+            await in_order.wait_for(lambda: turn["next"] == sequence)
+            if outbox is not None and result is not None:
+                await outbox.put(result)
+            turn["next"] += 1
+            in_order.notify_all()
+
+    async def worker(executor):
+        while True:
+            item = await inbox.get()
+            if item is STAGE_DONE:
+                return
+            # numbered as taken (items arrive in order), so items dropped by earlier stages leave no gaps
+            sequence = turn["taken"]
+            turn["taken"] += 1
+            try:
+                result = await loop.run_in_executor(executor, function, item)
+            except Exception as e:
+                on_error(name, item, e)
+                result = None
+            await pass_on(sequence, result)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"pipeline_{name}") as executor:
+        await asyncio.gather(*[worker(executor) for _ in range(concurrency)])
+    if outbox is not None:
+        for _ in range(downstream_concurrency):
+            await outbox.put(STAGE_DONE)
+
+
+async def run_pipeline(source, stages, queue_size, on_error):
+    """
+    Runs items through a chain of stages connected by bounded queues, with every stage working at the same time on different items, i.e. one file decoding while the previous one is transcribed and the one before that is saved.
+
+    Args:
+        source (iterable): The items. It is read in a thread of its own, so a source which blocks (i.e. finding files as it goes) does not hold up the stages. Items keep this order through every stage.
+        stages (list): (name, function, concurrency) for each stage, in order. See run_stage().
+        queue_size (int): Maximum number of items waiting between one stage and the next.
+        on_error (callable): Called with (stage name, item, exception) for an item whose stage function raised.
+
+    Returns: None
+    """
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue(maxsize=max(1, queue_size)) for _ in stages]
+
+    async def feed():
+        iterator = iter(source)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline_source") as executor:
+            while True:
+                item = await loop.run_in_executor(executor, next, iterator, STAGE_DONE)
+                if item is STAGE_DONE:
+                    break
+                await queues[0].put(item)
+        for _ in range(stages[0][2]):
+            await queues[0].put(STAGE_DONE)
+
+    runners = [feed()]
+    for position, (name, function, concurrency) in enumerate(stages):
+        last = position == len(stages) - 1
+        runners.append(run_stage(name, function, concurrency, queues[position], None if last else queues[position + 1], 0 if last else stages[position + 1][2], on_error))
+    await asyncio.gather(*runners)
@@ -0,0 +1,369 @@
+"""MODEL SERVER UTILITIES"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+from utils_helper import log_file_write
+
+# Each message is a 4-byte length, a JSON header of that length, then header["payload_bytes"] bytes of raw data (decoded audio, if any)
+HEADER_LENGTH = struct.Struct("!I")
+
+
+def send_message(sock, header, payload=b""):
+    """
+    Sends one message over the model server socket.
+
+    Args:
+        sock (socket.socket): Connected socket.
+        header (dict): JSON-serialisable message header.
+        payload (bytes, optional): Raw data sent after the header, i.e. decoded audio. Defaults to none.
+
+    Returns: None
+    """
+    header = dict(header, payload_bytes=len(payload))
+    encoded = json.dumps(header, default=json_default).encode("utf-8")
+    sock.sendall(HEADER_LENGTH.pack(len(encoded)) + encoded)
+    if payload:
+        sock.sendall(payload)
+
+
+def receive_message(sock):
+    """
+    Receives one message sent by send_message().
+
+    Args:
+        sock (socket.socket): Connected socket.
+
+    Raises:
+        ConnectionError: If the other end closes the connection part-way through a message.
+
+    Returns:
+        tuple: (header (dict), payload (bytes)), or (None, b"") if the connection was closed cleanly before a new message.
+    """
+    length_bytes = receive_exactly(sock, HEADER_LENGTH.size, allow_eof=True)
+    if length_bytes is None:
+        return None, b""
+    header = json.loads(receive_exactly(sock, HEADER_LENGTH.unpack(length_bytes)[0]).decode("utf-8"))
+    payload = receive_exactly(sock, header.get("payload_bytes", 0)) if header.get("payload_bytes") else b""
+    return header, payload
+
+
+def receive_exactly(sock, size, allow_eof=False):
+    """Reads exactly size bytes from sock (returns None on a clean close before any byte, if allow_eof)."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if allow_eof and received == 0:
+                return None
+            raise ConnectionError("model server connection closed mid-message")
+        received += count
+    return bytes(buffer)
+
+
+def json_default(value):
+    """Converts numpy values in Whisper's results (i.e. token arrays) to plain Python for JSON."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def server_request(socket_path, header, payload=b"", timeout=None):
+    """
+    Sends one request to the model server and waits for its reply.
+
+    Args:
+        socket_path (str): Path of the model server's Unix domain socket.
+        header (dict): Request header, with key "op" ("ping", "load" or "transcribe").
+        payload (bytes, optional): Decoded audio for a "transcribe" request.
+        timeout (float, optional): Seconds to wait for the reply. Defaults to no limit (transcription can take a long time).
+
+    Raises:
+        OSError: If the server cannot be reached, or the connection fails (ConnectionError, socket.timeout and FileNotFoundError are all OSErrors).
+        RuntimeError: If the server reports an error.
+
+    Returns:
+        dict: The server's reply.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        check_server_user(sock)
+        send_message(sock, header, payload)
+        reply, _ = receive_message(sock)
+    if reply is None:
+        raise ConnectionError("model server closed the connection without replying")
+    if not reply.get("ok"):
+        raise RuntimeError(f"model server error - {reply.get('error')}")
+    return reply
+
+
+def model_server_socket_path(socket_path):
+    """
+    Resolves the path of the model server's socket.
+
+    Args:
+        socket_path (str): model_server_socket, imported from user_variables.py, or "" for the default.
+
+    Returns:
+        str: socket_path if set, otherwise models.sock in a per-user directory: whisper_wrapper in $XDG_RUNTIME_DIR (which only this user can open), or whisper_wrapper-<user id> in the temporary directory.
+    """
+    if socket_path:
+        return socket_path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "whisper_wrapper", "models.sock")
+    return os.path.join(tempfile.gettempdir(), f"whisper_wrapper-{os.getuid()}", "models.sock")
+
+
+def prepare_socket_directory(socket_path):
+    """
+    Creates the directory of the model server's socket, readable only by this user (mode 0700), if it does not exist.
+
+    Args:
+        socket_path (str): Path of the model server's Unix domain socket.
+
+    Raises:
+        PermissionError: If the directory already exists but belongs to another user, or other users can write to it (without the sticky bit, as on /tmp), so they could put their own socket in its place.
+
+    Returns: None
+    """
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    if not socket_directory_trusted(socket_dir):
+        raise PermissionError(f"{socket_dir} is not owned by this user, or other users can write to it")
+
+
+def socket_directory_trusted(socket_dir):
+    """Checks that socket_dir is a directory owned by this user (or root) which other users cannot add files to or remove them from."""
+    try:
+        dir_stat = os.stat(socket_dir)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(dir_stat.st_mode) or dir_stat.st_uid not in (os.getuid(), 0):
+        return False
+    return not dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH) or bool(dir_stat.st_mode & stat.S_ISVTX)
+
+
+def socket_trusted(socket_path):
+    """
+    Checks that socket_path is a socket created by this user, in a directory other users cannot tamper with, before anything (i.e. audio) is sent to it.
+
+    Args:
+        socket_path (str): Path of the model server's Unix domain socket.
+
+    Returns:
+        bool: True if socket_path is a Unix domain socket (not a symbolic link) owned by this user.
+    """
+    try:
+        socket_stat = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(socket_stat.st_mode) and socket_stat.st_uid == os.getuid() and socket_directory_trusted(os.path.dirname(os.path.abspath(socket_path)))
+
+
+def check_server_user(sock):
+    """
+    Checks that the process at the other end of a connected socket runs as this user, where the operating system reports it (SO_PEERCRED, Linux), so a socket swapped in between socket_trusted() and connecting is never sent anything.
+
+    Args:
+        sock (socket.socket): Socket connected to the model server.
+
+    Raises:
+        PermissionError: If the server process belongs to another user.
+
+    Returns: None
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, peer_uid, _ = struct.unpack("3i", credentials)
+    if peer_uid != os.getuid():
+        raise PermissionError(f"model server is running as user {peer_uid}, not this user")
+
+
+def connect_model_server(socket_path, model_name, fallback_loader, log_path):
+    """
+    Asks the model server (see model_server.py) to make model_name ready, loading it there if it is not loaded already.
+
+    Args:
+        socket_path (str): Path of the model server's Unix domain socket, from model_server_socket_path().
+        model_name (str): Whisper model name, i.e. "medium.en".
+        fallback_loader (callable): Loads the model in this process; used if the server stops responding part-way through the batch.
+        log_path (str): Full path of log file to which status messages are written.
+
+    Returns:
+        ModelServerClient or None: A stand-in for the model which sends transcription to the server, or None if no server is running (or it could not load the model, or the socket is not this user's), in which case the model should be loaded in this process as usual.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    if not socket_trusted(socket_path):
+        msg_error = f"Model server socket {socket_path} is not a socket owned by this user, in a directory only this user can write to - not used. The model will be loaded in this process instead.\n"
+        log_file_write(msg_error, log_path)
+        return None
+    try:
+        server_request(socket_path, {"op": "ping"}, timeout=5)
+    except (OSError, RuntimeError, ValueError):
+        return None # no server listening (i.e. a socket file left behind by a server that was killed)
+    try:
+        server_request(socket_path, {"op": "load", "model": model_name})
+    except (OSError, RuntimeError, ValueError) as e:
+        msg_error = f"Model server at {socket_path} could not provide {model_name} - {e}. The model will be loaded in this process instead.\n"
+        log_file_write(msg_error, log_path)
+        return None
+    return ModelServerClient(socket_path, model_name, fallback_loader, log_path)
+
+
+class ModelServerClient:
+    """
+    Stands in for a Whisper model in this process: transcribe() has the same signature and return value as the model's, but the work is done by the model server, which keeps the model loaded between runs. If the server stops responding, the model is loaded in this process (once) and used from then on.
+
+    Args:
+        socket_path (str): Path of the model server's Unix domain socket.
+        model_name (str): Whisper model name, i.e. "medium.en".
+        fallback_loader (callable): Loads the model in this process, if the server is lost.
+        log_path (str): Full path of log file to which status messages are written.
+    """
+
+    def __init__(self, socket_path, model_name, fallback_loader, log_path):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.fallback_loader = fallback_loader
+        self.log_path = log_path
+        self.local_model = None
+
+    def transcribe(self, audio, **decode_options):
+        """
+        Transcribes audio on the model server.
+
+        Args:
+            audio (str or numpy.ndarray): Path of the audio file (sent as an absolute path, as the server runs on the same machine) or decoded 16 kHz audio (sent as raw float32 samples).
+            **decode_options: Options for Whisper's transcribe function.
+
+        Returns:
+            dict: Whisper's result, with keys "text", "segments" and "language".
+        """
+        if self.local_model is None:
+            header = {"op": "transcribe", "model": self.model_name, "decode_options": decode_options}
+            payload = b""
+            if isinstance(audio, str):
+                header["path"] = os.path.abspath(audio)
+            else:
+                payload = np.ascontiguousarray(audio, dtype=np.float32).tobytes()
+            try:
+                return server_request(self.socket_path, header, payload)["result"]
+            except (OSError, ValueError) as e:
+                msg_error = f"Lost connection to the model server - {e}. Loading {self.model_name} in this process to continue.\n"
+                log_file_write(msg_error, self.log_path)
+                self.local_model = self.fallback_loader()
+        return self.local_model.transcribe(audio, **decode_options)
+
+
+class ModelRequestHandler(socketserver.BaseRequestHandler):
+    """Handles one connection to the model server: reads requests and replies until the client disconnects."""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = receive_message(self.request)
+            except (OSError, ValueError):
+                return
+            if header is None:
+                return
+            try:
+                reply = {"ok": True, **self.server.handle_request_header(header, payload)}
+            except Exception as e: # any failure is reported to the client rather than ending the server
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            try:
+                send_message(self.request, reply)
+            except OSError:
+                return
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves transcription requests from whisper_wrapper runs on this machine over a Unix domain socket. Each model is loaded the first time it is requested and kept in memory; requests for the same model are handled one at a time (a Whisper model is not safe to use from several threads at once), while different models can work in parallel.
+
+    Args:
+        socket_path (str): Path of the Unix domain socket to listen on.
+        model_loader (callable): Loads a model by name, i.e. whisper.load_model.
+        audio_loader (callable): Decodes an audio file to 16 kHz audio, i.e. whisper.load_audio.
+        log_path (str): Full path of log file to which status messages are written.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_loader, audio_loader, log_path):
+        self.model_loader = model_loader
+        self.audio_loader = audio_loader
+        self.log_path = log_path
+        self.models = {}
+        self.model_locks = {}
+        self.loading_locks = {}
+        self.load_lock = threading.Lock()
+        super().__init__(socket_path, ModelRequestHandler)
+        os.chmod(socket_path, 0o600) # only this user's runs may use the server
+
+    def get_model(self, model_name):
+        """
+        Returns the named model and its lock, loading it first if this is the first request for it.
+
+        Note:
+            load_lock is only held to look up the dictionaries; the load itself holds a lock for that model name alone, so requests for a model which is already loaded (and loads of other models) are not held up by a model which is still loading.
+        """
+        with self.load_lock:
+            if model_name in self.models:
+                return self.models[model_name], self.model_locks[model_name]
+            loading_lock = self.loading_locks.setdefault(model_name, threading.Lock())
+        with loading_lock:
+            with self.load_lock:
+                if model_name in self.models: # loaded by another request while this one waited
+                    return self.models[model_name], self.model_locks[model_name]
+            msg_loading = f"Model server - loading {model_name}.\n"
+            log_file_write(msg_loading, self.log_path)
+            model = self.model_loader(model_name)
+            with self.load_lock:
+                self.models[model_name] = model
+                self.model_locks[model_name] = threading.Lock()
+            msg_success = f"Model server - {model_name} loaded and ready.\n"
+            log_file_write(msg_success, self.log_path)
+            return model, self.model_locks[model_name]
+
+    def handle_request_header(self, header, payload):
+        """
+        Carries out one request.
+
+        Args:
+            header (dict): Request header from the client. "op" is "ping" (is the server up?), "load" (make sure a model is loaded) or "transcribe".
+            payload (bytes): Decoded float32 audio for "transcribe", unless the header gives a "path" instead.
+
+        Raises:
+            ValueError: If the request is not recognised.
+
+        Returns:
+            dict: Reply fields ("models" for ping and load, "result" for transcribe).
+        """
+        op = header.get("op")
+        if op == "ping":
+            return {"models": sorted(self.models)}
+        if op == "load":
+            self.get_model(header["model"])
+            return {"models": sorted(self.models)}
+        if op == "transcribe":
+            model, model_lock = self.get_model(header["model"])
+            audio = header["path"] if "path" in header else np.frombuffer(payload, dtype=np.float32)
+            if isinstance(audio, str):
+                audio = self.audio_loader(audio) # decoded outside the model lock, so other requests can use the model meanwhile
+            with model_lock:
+                result = model.transcribe(audio, **header.get("decode_options", {}))
+            return {"result": {"text": result["text"], "segments": result["segments"], "language": result.get("language")}}
+        raise ValueError(f"unknown request {op!r}")
@@ -0,0 +1,128 @@
+"""WATCH-FOLDER UTILITIES"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+from utils_helper import audio_format_extensions
+
+# inotify flags (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def inotify_open(path_to_audio):
+    """
+    Starts watching a directory for new, changed or moved-in files using Linux's inotify, via the C library (no extra packages needed).
+
+    Args:
+        path_to_audio (str): Path to the directory to be watched.
+
+    Returns:
+        int or None: The inotify file descriptor, or None if inotify is not available (i.e. on Windows or macOS, or if the system's watch limit has been reached), in which case the directory should be polled instead.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(path_to_audio), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def watch_wait(inotify_fd, timeout, stop_event):
+    """
+    Waits until something changes in the watched directory (inotify), until timeout seconds have passed, or until stop_event is set, whichever is first. Without inotify, simply waits for the timeout (polling).
+
+    Args:
+        inotify_fd (int or None): File descriptor from inotify_open(), or None to poll.
+        timeout (float): Maximum number of seconds to wait.
+        stop_event (threading.Event): Set by the shutdown signal handler.
+
+    Returns: None
+    """
+    deadline = time.monotonic() + timeout
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # wait in short steps so a shutdown request is noticed promptly
+        step = min(remaining, 1.0)
+        if inotify_fd is None:
+            stop_event.wait(step)
+            continue
+        readable, _, _ = select.select([inotify_fd], [], [], step)
+        if readable:
+            try:
+                while os.read(inotify_fd, 65536): # the events themselves are not needed: the directory is rescanned
+                    pass
+            except BlockingIOError:
+                pass
+            return
+
+
+def watch_scan(path_to_audio, audio_format, watched, settle_secs):
+    """
+    Scans the watched directory and returns the files which are ready to be transcribed: files of the target type whose size and modification time have not changed for at least settle_secs, so a file still being copied or uploaded is never picked up part-written. Each version of a file is returned once; if a file is replaced by a different recording with the same name, it is returned again once that has settled.
+
+    Args:
+        path_to_audio (str): Path to the directory being watched.
+        audio_format (str or list): The file extension(s) of the audio files, matched regardless of case. Imported from user_variables.py
+        watched (dict): State carried between scans, updated in place: filename (key) and {"size", "mtime", "since", "queued"} (value).
+        settle_secs (float): Seconds a file's size must stay the same before it is treated as complete.
+
+    Returns:
+        list: Filenames ready to be transcribed, in alphabetical order.
+    """
+    extensions = audio_format_extensions(audio_format)
+    now = time.monotonic()
+    present = set()
+    ready = []
+    with os.scandir(path_to_audio) as scan:
+        for entry in scan:
+            if not entry.name.lower().endswith(extensions):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError: # removed since the directory was listed
+                continue
+            present.add(entry.name)
+            state = watched.get(entry.name)
+            if state is None or state["size"] != stat.st_size or state["mtime"] != stat.st_mtime_ns:
+                watched[entry.name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "since": now, "queued": False}
+            elif not state["queued"] and now - state["since"] >= settle_secs:
+                state["queued"] = True
+                ready.append(entry.name)
+
+    for audio_file in list(watched):
+        if audio_file not in present: # moved away once processed, or deleted
+            del watched[audio_file]
+    return sorted(ready)
+
+
+def watch_settling(watched):
+    """
+    Reports whether any file seen by watch_scan() is still waiting for its size to settle, in which case the directory should be rescanned soon even if no change is reported.
+
+    Args:
+        watched (dict): State from watch_scan().
+
+    Returns:
+        bool: True if any file is still settling.
+    """
+    return any(not state["queued"] for state in watched.values())
@@ -1,23 +1,68 @@
 """MAIN UTILITIES"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
 from datetime import datetime as dt
+import gc
+import io
+import multiprocessing
 import os
 import shutil
+import signal
 import sys
+import tempfile
+import threading
 import time
-import whisper
 
-from user_variables import use_log_file, path_to_logs, path_to_audio, path_for_output, move_processed, path_for_processed, audio_format, model_options, audio_info_batch, audio_file_info, delimiter
+from user_variables import use_log_file, path_to_logs, log_format, path_to_audio, path_for_output, move_processed, path_for_processed, background_moves, audio_format, model_options, audio_info_batch, audio_file_info, delimiter, num_workers, prefetch_depth, prefetch_memory_mb, use_transcript_cache, path_for_cache, transcript_cache_mb, use_audio_cache, audio_cache_mb, decode_options, use_journal, resume_batch, probe_workers, path_for_metrics, prometheus_textfile_dir, watch_settle_secs, watch_poll_secs, use_model_server, model_server_socket, summary_pause_secs, search_subfolders, modified_after, lazy_discovery, processing_order, long_file_mode, long_file_threshold_mins, chunk_length_secs, chunk_overlap_secs, stream_transcript, stream_chunk_secs, output_formats, wrap_on_segments, compare_memory_mb, auto_route, route_probe_model, route_sample_secs, route_models, route_escalate_models, route_escalate_logprob, use_pipeline, pipeline_queue_size, pipeline_concurrency, memory_plan, memory_budget_mb, memory_headroom_mb
 
-from utils_helper import log_file_write, audio_file_durations, process_time_estimator, extract_series_episode, insert_newlines
+from utils_helper import log_file_write, discover_audio_files, audio_file_durations, probe_duration, process_time_estimator, throughput_estimate, extract_series_episode, schedule_batch, log_buffer_start, log_buffer_collect, log_entries_write, log_flush, TranscriptWriter, throughput_key, throughput_stats_load, throughput_record, atomic_write_json
+
+from utils_audio import import_whisper, SAMPLE_RATE, prefetch_audio, split_audio_chunks, stitch_chunk_results, chunk_core_segments
+
+from utils_cache import file_content_hash, transcript_cache_key, cache_lookup, cache_store, audio_cache_load, audio_cache_store, cache_stats_collect, cache_stats_merge, cache_summary, audio_cache_summary
+
+from utils_journal import journal_file_path, journal_load, journal_completed_stages, journal_mark, journal_settings_key
+
+from utils_metrics import stage_timer, timed_iter, stage_metrics_collect, stage_metrics_merge, metrics_report_write, available_memory_mb, gpu_memory_mb, system_memory_mb
+
+from utils_watch import inotify_open, watch_wait, watch_scan, watch_settling
+
+from utils_server import connect_model_server, model_server_socket_path
+
+from utils_output import normalise_output_formats, segment_lines, write_srt, write_vtt, write_segments_json
+
+from utils_move import move_file, BackgroundMover
+
+from utils_compare import transcript_words, comparison_report, comparison_summary, plan_model_groups
+
+from utils_pipeline import run_pipeline
+
+from utils_memory import plan_memory, DEFAULT_LONGEST_SECS
 
 # Instanciate global variables
 log_path = "" 
 audio_filenames = []
+audio_durations = {} # filename (key) and duration in seconds (value), filled in by provide_pre_processing_summary()
+worker_model = None # model instance held by each worker process when num_workers > 1
+transcript_cache_path = os.path.join(path_for_cache, "transcripts")
+audio_cache_path = os.path.join(path_for_cache, "audio")
+content_hashes = {} # (path, size, modification time) (key) and content hash (value), so a file used by both caches is only hashed once
+journal = None # progress journal, loaded by journal_setup() in the parent process when use_journal is True
+journal_path = ""
+journal_settings = None # key of the settings which shape the outputs (see journal_setup()), recorded with each journal entry
+pending_stages = [] # stages completed in a worker process, passed back for the parent to record in the journal
+throughput_stats_path = os.path.join(path_for_cache, "throughput_stats.json")
+pending_throughput = [] # speed measurements taken in a worker process, passed back for the parent to record
+file_mover = None # BackgroundMover used by move_after_processing() while a batch runs, if background_moves is True
+is_worker = False # True in worker processes of the parallel pool, which pass their moves back to the parent
+pending_moves = [] # files processed in a worker process, passed back for the parent to move
+routed_models = {} # model_key (key) and model instance (value) for each model loaded by routed_model() when auto_route is True
 
 #########################  PRE-PROCESSING ######################### 
 def log_file_setup(use_log_file, path_to_logs):
     """
-    Instanciates a datestamped .txt log file so activity in a single day is aggregated. Creates the specified directory for the log file if it doesn't already exist.
+    Instanciates a datestamped .txt (or .jsonl, if log_format is "json") log file so activity in a single day is aggregated. Creates the specified directory for the log file if it doesn't already exist. A run which continues past midnight carries on in the next day's file (see log_dated_path() in utils_helper.py).
 
     Args:
         use_log_file (bool): Flag. If True, a log file will be created. If False, no log file will be created. User-set in user_variables.py.
@@ -50,7 +95,8 @@ def log_file_setup(use_log_file, path_to_logs):
     
     global log_path 
     run_date = dt.now().strftime("%Y-%m-%d")
-    logfilename = f"log_whisper_transcripts_{run_date}.txt"
+    log_extension = "jsonl" if log_format == "json" else "txt"
+    logfilename = f"log_whisper_transcripts_{run_date}.{log_extension}"
     log_path = os.path.join(path_to_logs, logfilename)
 
     try:
@@ -154,13 +200,15 @@ def check_processed_directory(move_processed, path_for_processed):
         log_file_write(msg_success, log_path)
 
 
-def obtain_audio_filenames(path_to_audio, audio_format):   
+def obtain_audio_filenames(path_to_audio, audio_format, search_subfolders=False, modified_after=None):   
     """
-    Obtains a list of audio file filenames in the target directory, incorporating a check to ensure that at least one file of the specified type is present. If no files are found, the program will exit with an error message and log entry.
+    Obtains a list of audio file filenames in the target directory (see discover_audio_files() in utils_helper.py), incorporating a check to ensure that at least one file of the specified type is present. If no files are found, the program will exit with an error message and log entry.
 
     Args:
         path_to_audio (str): Path to directory containing the audio files. Imported from user_variables.py
-        audio_format (str): The file extension of the audio files. Imported from user_variables.py
+        audio_format (str or list): The file extension(s) of the audio files, matched regardless of case. Imported from user_variables.py
+        search_subfolders (bool, optional): If True, files in subfolders are included, as paths relative to path_to_audio. Defaults to False.
+        modified_after (float, optional): If supplied, only files modified at or after this time (seconds since the epoch, from check_modified_after()) are included.
 
     Returns:
         tuple: A tuple containing the number of files (file_count) and a list of the audio_filenames.
@@ -170,14 +218,15 @@ def obtain_audio_filenames(path_to_audio, audio_format):
     """   
     
     try:
-        # Obtain list of filenames, filtered by specified filetype(s), and being file vs directory
-        audio_filenames = [f for f in os.listdir(path_to_audio) if f.endswith(audio_format) and os.path.isfile(os.path.join(path_to_audio, f))]
-        # Sort filenames in ascending order (alphabetical and numerical)
-        audio_filenames = sorted(audio_filenames) 
-        print(audio_filenames)
+        # Obtain list of filenames, filtered by specified filetype(s) and modification time, in alphabetical order within each folder
+        audio_filenames = list(discover_audio_files(path_to_audio, audio_format, log_path, search_subfolders, modified_after))
         file_count = len(audio_filenames)
         
-        pretty_audio_filenames = '\n'.join(audio_filenames)
+        # Only the first few names are listed, as a large batch would swamp the screen and log file
+        shown_count = 10
+        pretty_audio_filenames = '\n'.join(audio_filenames[:shown_count])
+        if file_count > shown_count:
+            pretty_audio_filenames += f"\n... and {file_count - shown_count} more"
         summary_files = f"Directory contains {file_count} {audio_format} file(s):\n{pretty_audio_filenames}\n"
         log_file_write(summary_files, log_path)    
 
@@ -197,6 +246,26 @@ def obtain_audio_filenames(path_to_audio, audio_format):
         sys.exit(1)
 
 
+def check_modified_after(modified_after):
+    """
+    Converts the modified_after date (i.e. "2024-03-01" or "2024-03-01 18:30") to a timestamp for filtering files by modification time. If the value is invalid, the error is logged and files of any age are processed.
+
+    Args:
+        modified_after (str): Date (and optionally time) in ISO format, or "" for no filter. Imported from user_variables.py
+
+    Returns:
+        float or None: Seconds since the epoch (local time), or None if no filter is to be applied.
+    """
+    if not modified_after:
+        return None
+    try:
+        return dt.fromisoformat(str(modified_after)).timestamp()
+    except ValueError:
+        msg_error = f"Error, modified_after must be a date in the format YYYY-MM-DD (optionally followed by a time, i.e. 2024-03-01 18:30), not '{modified_after}'. Files of any age will be processed.\n"
+        log_file_write(msg_error, log_path)
+        return None
+
+
 def check_word_interval(word_interval):
     """
     Checks if word_interval entered is a positive integer or 0. If value is invalid, 0 is substituted and a raw transcript with no newlines or line numbers will be outputted.
@@ -221,6 +290,142 @@ def check_word_interval(word_interval):
         return word_interval
 
 
+def check_num_workers(num_workers):
+    """
+    Checks if num_workers is a positive integer. If value is invalid, 1 is substituted and the batch will be processed sequentially by a single model instance.
+
+    Args:
+        num_workers (int): Number of worker processes to transcribe files in parallel. Imported from user_variables.py
+
+    Raises:
+        ValueError: If the value of num_workers cannot be converted to an integer, or is less than 1.
+
+    Returns:
+        num_workers (int): The number of worker processes to use, which may have been changed to 1 if the user-input was invalid.
+    """
+
+    try:
+        num_workers = int(num_workers)
+        if num_workers < 1:
+            raise ValueError
+        if num_workers > 1:
+            msg_success = f"Pre Processing Checks - {num_workers} worker processes will transcribe files in parallel.\n"
+            log_file_write(msg_success, log_path)
+        return num_workers
+    except (TypeError, ValueError):
+        msg_error = "Error, num_workers must be a positive integer. Defaulting to 1 (sequential processing).\n"
+        log_file_write(msg_error, log_path)
+        return 1
+
+
+def check_prefetch_depth(prefetch_depth):
+    """
+    Checks if prefetch_depth is a whole number of files, 0 or more. If value is invalid, 2 is substituted.
+
+    Args:
+        prefetch_depth (int): Number of upcoming files to decode in the background while the current file is transcribed. Imported from user_variables.py
+
+    Raises:
+        ValueError: If the value of prefetch_depth cannot be converted to an integer, or is less than 0.
+
+    Returns:
+        prefetch_depth (int): The number of files to decode ahead, which may have been changed to 2 if the user-input was invalid.
+    """
+
+    try:
+        prefetch_depth = int(prefetch_depth)
+        if prefetch_depth < 0:
+            raise ValueError
+        return prefetch_depth
+    except (TypeError, ValueError):
+        msg_error = "Error, prefetch_depth must be a whole number, 0 or more. Defaulting to 2.\n"
+        log_file_write(msg_error, log_path)
+        return 2
+
+
+def check_prefetch_memory_mb(prefetch_memory_mb):
+    """
+    Checks if prefetch_memory_mb is a positive number. If value is invalid, 1024 is substituted.
+
+    Args:
+        prefetch_memory_mb (int): Cap, in MB, on the decoded audio held waiting to be transcribed. Imported from user_variables.py
+
+    Raises:
+        ValueError: If the value of prefetch_memory_mb cannot be converted to a number, or is not above 0.
+
+    Returns:
+        prefetch_memory_mb (float): The cap in MB, which may have been changed to 1024 if the user-input was invalid.
+    """
+
+    try:
+        prefetch_memory_mb = float(prefetch_memory_mb)
+        if not prefetch_memory_mb > 0:
+            raise ValueError
+        return prefetch_memory_mb
+    except (TypeError, ValueError):
+        msg_error = "Error, prefetch_memory_mb must be a positive number. Defaulting to 1024.\n"
+        log_file_write(msg_error, log_path)
+        return 1024
+
+
+def check_processing_order(processing_order):
+    """
+    Checks if processing_order is one of the supported orders. If value is invalid, "alphabetical" is substituted.
+
+    Args:
+        processing_order (str): "alphabetical", "shortest_first" or "longest_first". Imported from user_variables.py
+
+    Returns:
+        processing_order (str): The order to use, which may have been changed to "alphabetical" if the user-input was invalid.
+    """
+    if processing_order in ("alphabetical", "shortest_first", "longest_first"):
+        return processing_order
+    msg_error = f"Error, processing_order must be \"alphabetical\", \"shortest_first\" or \"longest_first\", not {processing_order!r}. Files will be processed in alphabetical order.\n"
+    log_file_write(msg_error, log_path)
+    return "alphabetical"
+
+
+def check_pipeline_concurrency(pipeline_concurrency):
+    """
+    Checks the number of files each stage of the staged pipeline may work on at once. Each must be a whole number of at least 1.
+
+    Args:
+        pipeline_concurrency (dict): Stage name (key) and number of files (value). Imported from user_variables.py
+
+    Contingency:
+        Invalid values are logged and replaced with 1; missing stages are given 1. Transcription is always 1, as there is one copy of the model.
+
+    Returns:
+        pipeline_concurrency (dict): A valid number of files for each of the stages "probe", "decode", "format", "save" and "move".
+    """
+    checked = {}
+    for stage in ("probe", "decode", "format", "save", "move"):
+        value = pipeline_concurrency.get(stage, 1) if isinstance(pipeline_concurrency, dict) else 1
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            msg_error = f"Error, pipeline_concurrency for the {stage} stage must be a whole number of at least 1, not {value!r}. 1 will be used.\n"
+            log_file_write(msg_error, log_path)
+            value = 1
+        checked[stage] = value
+    return checked
+
+
+def check_output_formats(output_formats):
+    """
+    Checks that output_formats lists only supported formats ("txt", "srt", "vtt" and "json"). Unsupported formats are left out; if none is supported, "txt" is substituted.
+
+    Args:
+        output_formats (str or list): The output format(s) to write for each audio file. Imported from user_variables.py
+
+    Returns:
+        output_formats (tuple): The formats to write.
+    """
+    formats, unrecognised = normalise_output_formats(output_formats)
+    if unrecognised:
+        msg_error = f"Error, output_formats may only include \"txt\", \"srt\", \"vtt\" and \"json\", not {', '.join(repr(output_format) for output_format in unrecognised)}. Writing {', '.join(formats)} only.\n"
+        log_file_write(msg_error, log_path)
+    return formats
+
+
 def check_model(model_key):
     """Checks if selected model is a valid choice from model_options dictionary.
     
@@ -243,7 +448,56 @@ def check_model(model_key):
         sys.exit(1)
 
 
-def provide_pre_processing_summary(path_to_audio, path_for_output, audio_format, file_count, model_key, word_interval, audio_filenames):
+def check_route_models(auto_route):
+    """
+    Checks the models used for auto-routing, if auto_route is True: route_probe_model, and the "english" and "other" entries of route_models and route_escalate_models, must all be keys of the model_options dictionary, and route_probe_model must be multilingual (the English-only models cannot detect the language).
+
+    Args:
+        auto_route (bool): Flag. If True, each file is routed to a model by route_audio_file(). Imported from user_variables.py
+
+    Contingency:
+        If any of the routing models is invalid, the error is logged and auto-routing is switched off, so the whole batch is transcribed with model_key.
+
+    Returns:
+        auto_route (bool): False if auto-routing was switched off, otherwise as supplied.
+    """
+    if not auto_route:
+        return False
+    try:
+        route_keys = [route_probe_model] + [models[group] for models in (route_models, route_escalate_models) for group in ("english", "other")]
+    except (KeyError, TypeError) as e:
+        msg_error = f"Error, route_models and route_escalate_models must each have an \"english\" and an \"other\" model - {e}. Auto-routing switched off, so {model_options[model_key]['name']} will be used for every file.\n"
+        log_file_write(msg_error, log_path)
+        return False
+    invalid_keys = [route_key for route_key in route_keys if route_key not in model_options]
+    if invalid_keys:
+        msg_error = f"Error, {', '.join(repr(route_key) for route_key in invalid_keys)} in the auto-routing models not found in model_options. Auto-routing switched off, so {model_options[model_key]['name']} will be used for every file.\n"
+        log_file_write(msg_error, log_path)
+        return False
+    if model_options[route_probe_model]["name"].endswith(".en"):
+        msg_error = f"Error, route_probe_model must be multilingual to detect the language, not {model_options[route_probe_model]['name']}. Auto-routing switched off, so {model_options[model_key]['name']} will be used for every file.\n"
+        log_file_write(msg_error, log_path)
+        return False
+    return True
+
+
+def model_summary(model_key):
+    """
+    Describes the transcription model(s) for the pre-processing summary.
+
+    Args:
+        model_key (str): The key for the chosen model in the model_options dictionary. Imported from user_variables.py
+
+    Returns:
+        str: The model name, or if auto_route is True, the routing models and escalation threshold.
+    """
+    if not auto_route:
+        return model_options[model_key]["name"]
+    escalation = f", escalating to {model_options[route_escalate_models['english']]['name']} / {model_options[route_escalate_models['other']]['name']} below an average log-probability of {route_escalate_logprob}" if route_escalate_logprob is not None else ""
+    return f"auto-routed by {model_options[route_probe_model]['name']} to {model_options[route_models['english']]['name']} (English) / {model_options[route_models['other']]['name']} (other languages){escalation}; {model_options[model_key]['name']} if a file cannot be routed"
+
+
+def provide_pre_processing_summary(path_to_audio, path_for_output, audio_format, file_count, model_key, word_interval, audio_filenames, pause_secs=summary_pause_secs, detect_gpu=True):
     """Provides a summary of the processing parameters to the user, including, where possible, an estimate of the time required to process the batch.
     
     Args:
@@ -254,43 +508,167 @@ def provide_pre_processing_summary(path_to_audio, path_for_output, audio_format,
         model_key (str): The key for the chosen model in the model_options dictionary. Imported from user_variables.py
         word_interval (int) - The word interval at which to insert newlines into the transcript, which may have been changed to 0 by  check_word_interval() since it's original pass to master_call_single(), if the user-input was invalid.
         audio_filenames (list): List of audio file names in the batch, generated by obtain_audio_filenames()
+        pause_secs (float, optional): Seconds to leave the summary on screen before processing starts. Defaults to summary_pause_secs, imported from user_variables.py
+        detect_gpu (bool, optional): Passed to plan_memory_budget(). Defaults to True.
 
     Interactions:
-        Calls two helper functions: audio_file_durations() and process_time_estimator() to extract the audio file duration and then calculate the estimated time required to process the batch. If there are errors in either of these functions, the program will simply continue without the time estimation.
+        Calls plan_memory_budget() once the durations are known, which may lower num_workers and prefetch_depth to fit in memory (see memory_plan in user_variables.py), so the time estimate reflects the plan.
+        Calls two helper functions: audio_file_durations() and process_time_estimator() to extract the audio file duration and then calculate the estimated time required to process the batch. The estimate uses this machine's measured processing speeds for the model where there are enough of them (see record_throughput()). If there are errors in either of these functions, the program will simply continue without the time estimation.
 
     Returns:
-        None. Does output to screen and log file a summary of the processing parameters, and where possible, an estimate of the time required to process the batch. Processing time for individual files is only printed to screen - a batch processing time estimate is printed and written to the log file.
+        None. Does output to screen and log file a summary of the processing parameters, and where possible, an estimate of the time required to process the batch. Processing time for individual files is only printed to screen - a batch processing time estimate is printed and written to the log file. The file durations are kept in the global audio_durations for use during processing.
     
     """
+    global audio_durations
     model_chosen = model_options[model_key]["name"]
-    summary = f"Summary of transcription parameters \n- Input Path: {path_to_audio} \n- Output Path: {path_for_output} \n- Audio format: {audio_format} \n- Number of {audio_format} files: {file_count} \n- Transcription Model: {model_chosen} \n- Newline interval: {word_interval} words.\n"
+    newline_interval = "one line per Whisper segment" if wrap_on_segments else f"{word_interval} words"
+    summary = f"Summary of transcription parameters \n- Input Path: {path_to_audio} \n- Output Path: {path_for_output} \n- Audio format: {audio_format} \n- Number of {audio_format} files: {file_count} \n- Processing order: {processing_order} \n- Transcription Model: {model_summary(model_key)} \n- Output formats: {', '.join(output_formats)} \n- Newline interval: {newline_interval}.\n"
     log_file_write(summary, log_path)
 
     audio_duration_success = True # if audio_file_durations fails, then process_time_estimator should also be skipped
     try:
-        audio_time_dict = audio_file_durations(path_to_audio, audio_filenames, log_path) # calls helper fuction to extract audio file durations
+        with stage_timer("probe_durations"):
+            audio_time_dict = audio_file_durations(path_to_audio, audio_filenames, log_path, probe_workers, os.path.join(path_for_cache, "probe_cache.json")) # calls helper fuction to extract audio file durations
+        audio_durations = audio_time_dict
     except Exception as e:
         msg_error = f"Error, unable to extract audio file durations. The following error occurred: {e}.\n"
         log_file_write(msg_error, log_path)
         audio_duration_success = False
 
+    with stage_timer("memory_plan"):
+        plan_summary = plan_memory_budget(model_key, audio_time_dict if audio_duration_success else {}, detect_gpu)
+
     if audio_duration_success:
         try:
-            batch_summary = process_time_estimator(audio_time_dict, model_key, model_options, log_path) # calls helper function to estimate time required to process batch
+            throughput_history = throughput_stats_load(throughput_stats_path).get(throughput_key(model_chosen, inference_threads()))
+            batch_summary = process_time_estimator(audio_time_dict, model_key, model_options, log_path, throughput_history) # calls helper function to estimate time required to process batch
             log_file_write(batch_summary, log_path)
-            msg_preprocessing_w_time = f"A large batch of files and/or a using the largest models may take significant time and compute.\nPlease ensure this summary of processing is correct:\n{summary}Estimated {batch_summary}\n"
+            msg_preprocessing_w_time = f"A large batch of files and/or a using the largest models may take significant time and compute.\nPlease ensure this summary of processing is correct:\n{summary}{plan_summary}Estimated {batch_summary}\n"
             print(msg_preprocessing_w_time)
-            time.sleep(5)
+            time.sleep(pause_secs)
         except Exception as e:
             msg_error = f"Error, unable to estimate time required to process batch. The following error occurred: {e}.\n"
             log_file_write(msg_error, log_path)
 
     else:
-        msg_preprocessing = f"A large batch of files and/or a using the largest models may take significant time and compute.\nPlease ensure this summary of processing is correct:\n{summary}"
+        msg_preprocessing = f"A large batch of files and/or a using the largest models may take significant time and compute.\nPlease ensure this summary of processing is correct:\n{summary}{plan_summary}"
         print(msg_preprocessing)
-        time.sleep(5)
+        time.sleep(pause_secs)
     
+def plan_memory_budget(model_key, durations, detect_gpu=True):
+    """
+    Checks num_workers and prefetch_depth (or pipeline_queue_size, if use_pipeline is True) against the memory available, as set by memory_plan (see plan_memory() in utils_memory.py). With "downgrade" or "strict", they are lowered to what fits.
+
+    Args:
+        model_key (str): The key for the chosen model in the model_options dictionary. Imported from user_variables.py
+        durations (dict): File durations in seconds from audio_file_durations() (None for files which could not be probed). Empty if not known.
+        detect_gpu (bool, optional): If True, Whisper is imported first (as in master_call_compare()), so that a GPU can be detected. False for runs which do not load a model in this process (--estimate, or the model server), so they never wait for the import. Defaults to True.
+
+    Interactions:
+        The model's memory_mb from model_options is used (with auto_route, the total for every model which may be loaded; the largest model's figure if memory_mb is missing). The system memory budget is memory_budget_mb, or if 0, system_memory_mb() less memory_headroom_mb.
+        Whisper loads the models onto the GPU if there is one, in which case each copy of the model is counted against the free GPU memory (gpu_memory_mb()) and the system memory budget only has to hold the decoded audio. gpu_memory_mb() only consults torch once it has been imported, so with detect_gpu False (or if Whisper is not installed) the models are counted against system memory.
+
+    Contingency:
+        An invalid memory_plan is logged and "downgrade" substituted. If the available memory cannot be measured (i.e. on Windows or macOS) and no memory_budget_mb is given, the check is skipped.
+
+    Exits:
+        sys.exit(): With memory_plan "strict", the program will exit if even one worker would not fit in memory.
+
+    Returns:
+        str: The plan, as lines for the pre-processing summary (empty if memory_plan is "off"). The plan is also written to the log file.
+    """
+    global num_workers, prefetch_depth, pipeline_queue_size
+    mode = memory_plan
+    if mode not in ("off", "warn", "downgrade", "strict"):
+        msg_error = f"Error, memory_plan must be \"off\", \"warn\", \"downgrade\" or \"strict\", not {mode!r}. \"downgrade\" will be used.\n"
+        log_file_write(msg_error, log_path)
+        mode = "downgrade"
+    if mode == "off":
+        return ""
+
+    largest_mb = max(model.get("memory_mb", 0) for model in model_options.values())
+    plan_keys = {model_key}
+    if auto_route:
+        plan_keys.update([route_probe_model, *route_models.values(), *route_escalate_models.values()])
+    model_mb = sum(model_options[plan_key].get("memory_mb", largest_mb) for plan_key in plan_keys)
+
+    if detect_gpu:
+        try:
+            import_whisper() # so that a GPU is seen if there is one, as Whisper will load the models onto it
+        except ImportError:
+            pass # reported when the model is loaded; planned against system memory meanwhile
+    gpu_budget_mb = gpu_memory_mb()
+    if memory_budget_mb:
+        budget_mb = memory_budget_mb
+    else:
+        available_mb = system_memory_mb()
+        budget_mb = available_mb - memory_headroom_mb if available_mb is not None else None
+    if budget_mb is None:
+        plan_summary = "- Memory plan: available memory unknown, so num_workers and prefetch_depth are not checked (set memory_budget_mb to check them).\n"
+        log_file_write(plan_summary, log_path)
+        return plan_summary
+
+    known_durations = [duration for duration in durations.values() if duration is not None]
+    longest_secs = max(known_durations) if known_durations else DEFAULT_LONGEST_SECS
+    worker_secs = longest_secs
+    if long_file_mode and num_workers > 1:
+        # long files are decoded by the parent process and shared out to the workers in chunks
+        short_durations = [duration for duration in known_durations if duration < long_file_threshold_mins * 60]
+        worker_secs = min(longest_secs, max(short_durations + [chunk_length_secs + 2 * chunk_overlap_secs]))
+    ahead_name = "pipeline_queue_size" if use_pipeline else "prefetch_depth"
+    ahead_files = pipeline_queue_size if use_pipeline else prefetch_depth
+    ahead_cap_mb = None if use_pipeline else prefetch_memory_mb
+    requested = plan_memory(model_mb, longest_secs, worker_secs, num_workers, ahead_files, ahead_cap_mb, float("inf"), None if gpu_budget_mb is None else float("inf"))
+    plan = plan_memory(model_mb, longest_secs, worker_secs, num_workers, ahead_files, ahead_cap_mb, budget_mb, gpu_budget_mb)
+
+    longest_text = f"{int(longest_secs // 3600)}h{int(longest_secs % 3600 // 60):02d}m" + ("" if known_durations else " (assumed)")
+    if gpu_budget_mb is None:
+        plan_lines = [f"- Memory plan: about {requested['need_mb']:,.0f}MB needed of {budget_mb:,.0f}MB available for {num_workers} worker(s) ({model_mb:,.0f}MB per copy of the model, longest file {longest_text})."]
+    else:
+        plan_lines = [f"- Memory plan: about {requested['gpu_need_mb']:,.0f}MB of GPU memory needed of {gpu_budget_mb:,.0f}MB free for {num_workers} worker(s) ({model_mb:,.0f}MB per copy of the model), and about {requested['need_mb']:,.0f}MB of system memory of {budget_mb:,.0f}MB available for decoded audio (longest file {longest_text})."]
+    changes = []
+    if plan["workers"] < num_workers:
+        changes.append(("num_workers", num_workers, plan["workers"]))
+    if plan["workers"] == 1:
+        fitted_ahead = max(1, plan["ahead_files"]) if use_pipeline else plan["ahead_files"] # the pipeline always has room for one decoded file
+        if fitted_ahead < ahead_files:
+            changes.append((ahead_name, ahead_files, fitted_ahead))
+
+    if changes and mode == "warn":
+        plan_lines.append("- Warning, this may not fit in memory. It would fit with " + ", ".join(f"{name} {new}" for name, _, new in changes) + f" (about {plan['need_mb']:,.0f}MB).")
+    elif changes:
+        for name, old, new in changes:
+            plan_lines.append(f"- {name} lowered from {old} to {new} to fit in memory (about {plan['need_mb']:,.0f}MB).")
+        num_workers = plan["workers"]
+        if plan["workers"] == 1 and use_pipeline:
+            pipeline_queue_size = min(pipeline_queue_size, max(1, plan["ahead_files"]))
+        elif plan["workers"] == 1:
+            prefetch_depth = min(prefetch_depth, plan["ahead_files"])
+    if not plan["fits"] and gpu_budget_mb is not None and model_mb > gpu_budget_mb:
+        plan_lines.append(f"- Warning, the model needs about {model_mb:,.0f}MB of GPU memory, more than the {gpu_budget_mb:,.0f}MB free. Choose a smaller model (see the memory guide above model_options) or free some GPU memory.")
+    elif not plan["fits"]:
+        plan_lines.append(f"- Warning, even one worker needs about {plan['worker_mb']:,.0f}MB, more than the {budget_mb:,.0f}MB available. Choose a smaller model (see the memory guide above model_options) or free some memory.")
+    plan_summary = "\n".join(plan_lines) + "\n"
+    log_file_write(plan_summary, log_path)
+
+    if not plan["fits"] and mode == "strict":
+        msg_error = "Error, the batch would not fit in memory and memory_plan is \"strict\". Exiting program.\n"
+        log_file_write(msg_error, log_path)
+        sys.exit(1)
+    return plan_summary
+
+
 ######################### LOAD MODEL #########################
+
+def inference_threads():
+    """
+    Number of CPU threads each model instance is given: all of them when num_workers is 1, otherwise an equal share per worker process. Also used to label speed measurements, as speed depends on it.
+
+    Returns:
+        int: CPU threads per model instance.
+    """
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
             
 def load_model(model_key): 
     """Loads selected model into whisper transcribe function. If model is not found, the program will exit with an error message and log entry.
@@ -300,6 +678,7 @@ def load_model(model_key):
 
     Interactions:
         check_model() has already been called to ensure that the model_key is a valid choice from the model_options dictionary, so any errors here are likely to be system-related.
+        If use_model_server is True and a model server (model_server.py) is running, a client for the server is returned instead of a model loaded in this process (see connect_model_server() in utils_server.py). It is used in exactly the same way. Worker processes of the parallel pool (is_worker) always load their own model, as the server transcribes with each model one file at a time, which would leave the workers taking turns.
 
     Exits:
         sys.exit(): Program will exit if the returned model None.
@@ -315,8 +694,15 @@ def load_model(model_key):
         sys.exit(1)
     
     model_chosen = model_options[model_key]["name"]
+    if use_model_server and not is_worker:
+        socket_path = model_server_socket_path(model_server_socket)
+        model = connect_model_server(socket_path, model_chosen, lambda: import_whisper().load_model(model_chosen), log_path)
+        if model is not None:
+            msg_success = f"{model_chosen} Model provided by the model server at {socket_path} - model load skipped.\n"
+            log_file_write(msg_success, log_path)
+            return model
     try:
-        model = whisper.load_model(model_chosen)
+        model = import_whisper().load_model(model_chosen)
         if model is not None:
             msg_success = (f"{model_chosen} Model load successful.\n")
             log_file_write(msg_success, log_path)
@@ -400,16 +786,131 @@ def create_header(index, audio_file, delimiter):
 
 ######################### TRANSCRIPTION ######################### 
 
-def transcribe(model, audio_file):
+def transcript_cache_check(audio_file, model_key, key_options):
+    """
+    Looks the audio file up in the transcript cache, if use_transcript_cache is True.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        key_options (dict): Decoding options (plus any chunking settings) which affect the transcript, included in the cache key.
+
+    Contingency:
+        If the audio file cannot be read for hashing, the error is logged and the cache is skipped for this file.
+
+    Returns:
+        tuple: (cache_key (str or None), cached transcript (dict with "text" and "segments", or None)). cache_key is None if the cache is not in use for this file.
+    """
+    if not use_transcript_cache:
+        return None, None
+    try:
+        cache_key = transcript_cache_key(audio_content_hash(audio_file), model_options[model_key]["name"], key_options)
+    except OSError as e:
+        msg_error = f"Error reading {audio_file} for transcript cache lookup - {e}. Cache will be skipped.\n"
+        log_file_write(msg_error, log_path)
+        return None, None
+    cached = cache_lookup(transcript_cache_path, cache_key)
+    if cached is not None:
+        msg_success = f"Transcript of {audio_file} found in cache - Whisper transcription skipped.\n"
+        log_file_write(msg_success, log_path)
+    return cache_key, cached
+
+
+def audio_content_hash(audio_file):
+    """
+    Hashes the contents of an audio file for the transcript and decoded audio caches (see file_content_hash() in utils_cache.py). The hash is remembered for as long as the file's size and modification time are unchanged, so a file looked up in both caches is only read once.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    full_path = os.path.join(path_to_audio, audio_file)
+    stat = os.stat(full_path)
+    memo_key = (full_path, stat.st_size, stat.st_mtime_ns)
+    if memo_key not in content_hashes:
+        content_hashes[memo_key] = file_content_hash(full_path)
+    return content_hashes[memo_key]
+
+
+def load_decoded_audio(audio_file):
+    """
+    Decodes an audio file to 16 kHz mono PCM for Whisper (which runs ffmpeg). If use_audio_cache is True, the decoded audio cache is checked first (keyed by the file's contents) and a hit is memory-mapped from disk instead of decoding again; a miss is decoded and then added to the cache.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+
+    Contingency:
+        If the audio file cannot be read for hashing, the error is logged and the file is decoded without the cache.
+
+    Raises:
+        Exception: Any error from Whisper's decoding, i.e. if ffmpeg cannot read the file.
+
+    Returns:
+        numpy.ndarray: The decoded audio (a copy-on-write memory map if it came from the cache).
+    """
+    full_path = os.path.join(path_to_audio, audio_file)
+    if not use_audio_cache:
+        return import_whisper().load_audio(full_path)
+    try:
+        content_hash = audio_content_hash(audio_file)
+    except OSError as e:
+        msg_error = f"Error reading {audio_file} for decoded audio cache lookup - {e}. Cache will be skipped.\n"
+        log_file_write(msg_error, log_path)
+        return import_whisper().load_audio(full_path)
+
+    audio = audio_cache_load(audio_cache_path, content_hash)
+    if audio is not None:
+        msg_success = f"Decoded audio for {audio_file} found in cache - ffmpeg decode skipped.\n"
+        log_file_write(msg_success, log_path)
+        return audio
+    audio = import_whisper().load_audio(full_path)
+    audio_cache_store(audio_cache_path, content_hash, audio, audio_cache_mb, log_path)
+    return audio
+
+
+def record_throughput(model_key, audio_file, audio, process_secs):
+    """
+    Records how long Whisper took to transcribe a file, so that future estimates from process_time_estimator() reflect this machine's real speed rather than the nominal speed_x. In a worker process the measurement is held in pending_throughput instead, and the parent process records it.
+
+    Args:
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        audio_file (str): Filename of the transcribed audio file.
+        audio (numpy.ndarray or None): The decoded audio, if available (its length gives the exact duration); otherwise the duration from audio_file_durations() is used.
+        process_secs (float): Time taken by Whisper, in seconds.
+
+    Returns: None
+    """
+    audio_secs = len(audio) / SAMPLE_RATE if audio is not None else audio_durations.get(audio_file)
+    if not audio_secs:
+        return
+    key = throughput_key(model_options[model_key]["name"], inference_threads())
+    if multiprocessing.parent_process() is not None:
+        pending_throughput.append((key, audio_secs, process_secs))
+        return
+    throughput_record(throughput_stats_path, key, audio_secs, process_secs, log_path)
+
+
+def transcribe(model, audio_file, model_key, audio=None, pool=None):
     """
-    Transcribes the audio file using the specified whisper model.
+    Transcribes the audio file using the specified whisper model. If use_transcript_cache is True, the transcript cache is checked first (keyed by the audio contents, model and decode_options) and Whisper is only called on a miss.
 
     Args:
         model (str): The Whisper ASR model instance to be used for transcription, instanciated by load_model().
         audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        audio (numpy.ndarray, optional): The file already decoded to 16 kHz PCM by prefetch_audio(). If None, Whisper decodes the file from its path, or, if use_audio_cache is True, it is loaded by load_decoded_audio().
+        pool (multiprocessing.pool.Pool, optional): Worker pool for long-file mode. If supplied, the recording is split into chunks at quiet points, the chunks are transcribed in parallel by the pool's workers and the results are stitched back together (model is not used).
 
     Returns:
-        raw transcript (str): unformatted text string the audio file produced by Whisper.
+        tuple: 
+        - raw transcript (str): unformatted text string the audio file produced by Whisper.
+        - segments (list): Whisper's timestamped segments (dicts with "start", "end" and "text" among other keys).
+        On error, (False, []) is returned.
 
     Raises:
         FileNotFoundError: If the input audio file is not found.
@@ -418,17 +919,105 @@ def transcribe(model, audio_file):
     """
     try:
         path = os.path.join(path_to_audio, audio_file)
-        result = model.transcribe(path)
+
+        # chunked transcripts can differ slightly from whole-file ones, so they are cached separately
+        key_options = decode_options if pool is None else {**decode_options, "chunk_length_secs": chunk_length_secs, "chunk_overlap_secs": chunk_overlap_secs}
+        cache_key, cached = transcript_cache_check(audio_file, model_key, key_options)
+        if cached is not None:
+            return cached["text"], cached["segments"]
+
+        if pool is not None:
+            if audio is None:
+                audio = load_decoded_audio(audio_file)
+            chunks = split_audio_chunks(audio, chunk_length_secs, chunk_overlap_secs)
+            msg_chunks = f"Transcribing {audio_file} as {len(chunks)} chunks in parallel.\n"
+            log_file_write(msg_chunks, log_path)
+            chunk_results = pool.map(worker_transcribe_chunk, [chunk["audio"] for chunk in chunks], chunksize=1)
+            result = stitch_chunk_results(chunks, chunk_results)
+        else:
+            if audio is None and use_audio_cache:
+                audio = load_decoded_audio(audio_file)
+            start_time = time.perf_counter()
+            result = model.transcribe(path if audio is None else audio, **decode_options)
+            record_throughput(model_key, audio_file, audio, time.perf_counter() - start_time)
         raw_transcript = result["text"]
+        segments = result["segments"]
+
+        if cache_key is not None:
+            cache_store(transcript_cache_path, cache_key, {"text": raw_transcript, "segments": segments}, transcript_cache_mb, log_path)
 
         success_msg = (f"Whisper transcription of {audio_file} successful.\n")
         log_file_write(success_msg, log_path)
-        return raw_transcript
+        return raw_transcript, segments
 
     except (FileNotFoundError, RuntimeError, Exception) as e: 
         msg_error = (f"Whisper transcription error - {e}.\n")
         log_file_write(msg_error, log_path)
-        return False
+        return False, []
+
+
+######################### MODEL ROUTING #########################
+
+def routed_model(model_key):
+    """
+    Gives the model instance for a model chosen by route_audio_file(), loading it by load_model() the first time it is needed and keeping it for the rest of the batch.
+
+    Args:
+        model_key (str): Key representing the model from model_options dictionary.
+
+    Returns:
+        model (str): The Whisper ASR model instance, or None if it could not be loaded.
+    """
+    if model_key not in routed_models:
+        with stage_timer("load_model"):
+            routed_models[model_key] = load_model(model_key)
+    return routed_models[model_key]
+
+
+def route_audio_file(audio_file, audio, model_key):
+    """
+    Chooses the model for an audio file when auto_route is True. route_probe_model transcribes the first route_sample_secs of the recording, which gives its language and Whisper's average log-probability (how confident the model is). English goes to route_models["english"] and other languages to route_models["other"], or to the matching route_escalate_models entry if the average log-probability is below route_escalate_logprob. The decision and the time the pre-pass took are logged.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+        audio (numpy.ndarray): The decoded audio.
+        model_key (str): Key representing the batch model from model_options dictionary, used if the file cannot be routed.
+
+    Contingency:
+        If the audio could not be decoded, or the pre-pass fails, the error is logged and model_key is returned.
+
+    Note:
+        The average log-probability is the mean of the sample's segments, weighted by their duration, so a short unclear phrase does not outweigh a long clear one.
+
+    Returns:
+        str: Key of the model to transcribe the file with.
+    """
+    try:
+        if audio is None:
+            raise RuntimeError("the audio could not be decoded")
+        probe_model = routed_model(route_probe_model)
+        if probe_model is None:
+            raise RuntimeError(f"{model_options[route_probe_model]['name']} could not be loaded")
+        sample = audio[:int(route_sample_secs * SAMPLE_RATE)]
+        start_time = time.perf_counter()
+        result = probe_model.transcribe(sample, temperature=0, condition_on_previous_text=False)
+        probe_secs = time.perf_counter() - start_time
+        language = result.get("language")
+        group = "english" if language == "en" else "other"
+        scored = [(segment["avg_logprob"], max(segment["end"] - segment["start"], 0.01)) for segment in result["segments"] if segment.get("avg_logprob") is not None]
+        avg_logprob = sum(logprob * secs for logprob, secs in scored) / sum(secs for _, secs in scored) if scored else None
+        escalate = route_escalate_logprob is not None and avg_logprob is not None and avg_logprob < route_escalate_logprob
+        routed_key = route_escalate_models[group] if escalate else route_models[group]
+    except (KeyError, TypeError, RuntimeError, Exception) as e:
+        msg_error = f"Error routing {audio_file} - {e}. It will be transcribed with {model_options[model_key]['name']}.\n"
+        log_file_write(msg_error, log_path)
+        return model_key
+
+    logprob_text = f"{avg_logprob:.2f}" if avg_logprob is not None else "unknown (no speech found)"
+    escalation = f", below {route_escalate_logprob} so escalated" if escalate else ""
+    msg_route = f"Routed {audio_file} to {model_options[routed_key]['name']} - language {language or 'unknown'}, average log-probability {logprob_text}{escalation}. Pre-pass took {probe_secs:.1f}s for {len(sample) / SAMPLE_RATE:.0f}s of audio.\n"
+    log_file_write(msg_route, log_path)
+    return routed_key
 
 
 ######################### FORMATTING & OUTPUT #########################
@@ -443,7 +1032,7 @@ def format_transcript(raw_transcript, word_interval, header, delimiter):
         delimiter (str): User-defined delimiter to be inserted at start and end of transcript. If an empty string was supplied, no delimiter will be inserted.
 
     Interactions:
-        Calls insert_newlines() to insert newlines into the raw transcript at the specified word_interval.    
+        Uses TranscriptWriter to insert newlines at the specified word_interval, count the words and number the lines in a single pass. write_formatted_transcript() does the same directly into the transcript file.
 
     Contingency:
         If the function encounters an error, it will return the raw transcript as it was passed in, without formatting.        
@@ -454,19 +1043,13 @@ def format_transcript(raw_transcript, word_interval, header, delimiter):
         
     """
     try:       
-        # Insert newlines every word_interval
-        linebreak_transcript = insert_newlines(raw_transcript, word_interval)
-
-        # Combine header and transcript
-        formatted_transcript = header+linebreak_transcript
-        
-        end_delimiter = f"\n{delimiter}\n"
-        word_count = f"\nWord count: {len(formatted_transcript.split())}"
-        formatted_transcript += word_count+end_delimiter
-
-        # Insert line numbers
-        lines = formatted_transcript.splitlines()
-        formatted_transcript = "\n".join(f"{i+1}: {line}" for i, line in enumerate(lines))
+        # Header, transcript with newlines every word_interval, word count and end delimiter, all with line numbers
+        output = io.StringIO()
+        writer = TranscriptWriter(output, word_interval)
+        writer.write_header(header)
+        writer.write_complete_transcript(raw_transcript)
+        writer.finish(delimiter)
+        formatted_transcript = output.getvalue()
 
         msg_success = (f"Raw transcript formatted successfully.\n")
         log_file_write(msg_success, log_path)
@@ -479,6 +1062,24 @@ def format_transcript(raw_transcript, word_interval, header, delimiter):
         return raw_transcript
 
 
+def transcript_output_path(audio_file, model_key, output_format="txt"):
+    """
+    Builds the path of the transcript file for an audio file: the audio filename without its extension, suffixed with the model's alt_name.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        output_format (str, optional): The output format, used as the file extension, i.e. "srt". Defaults to "txt".
+
+    Returns:
+        str: Full path of the transcript file in path_for_output. For an audio file in a subfolder (search_subfolders True), the transcript goes in the matching subfolder of path_for_output.
+    """
+    alt_name = model_options[model_key]["alt_name"]
+    output_filename = f"{os.path.splitext(audio_file)[0]}_{alt_name}.{output_format}"
+    # NB: splitext required so that the file extension isn't put in filename
+    return os.path.join(path_for_output, output_filename)
+
+
 def save_transcript(formatted_transcript, audio_file, model_key):
     """Save the formatted transcript to .txt file.
         
@@ -498,11 +1099,8 @@ def save_transcript(formatted_transcript, audio_file, model_key):
         bool: True if the transcript was saved successfully, False if the transcript was not saved successfully.
     """
     try:
-        alt_name = model_options[model_key]["alt_name"]
-        output_filename = f"{os.path.splitext(audio_file)[0]}_{alt_name}.txt"
-        # NB: splitext required so that the file extension isn't put in filename
-   
-        full_path = os.path.join(path_for_output, output_filename)
+        full_path = transcript_output_path(audio_file, model_key)
+        os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
 
         with open(full_path, "w", encoding="utf-8") as output_file:
             output_file.write(formatted_transcript)
@@ -517,21 +1115,383 @@ def save_transcript(formatted_transcript, audio_file, model_key):
         log_file_write(msg_error, log_path)
         return False
 
-######################### TIDY UP #########################
-
-def move_processed_file(move_processed, audio_file, path_to_audio, path_for_processed, log_path):
+def write_formatted_transcript(raw_transcript, word_interval, header, delimiter, audio_file, model_key, segments=None):
     """
-    Moves the audio file to the 'processed' directory after transcription. Note, it is perfectly valid for the 'processed' directory to be the same as the 'output' directory. 
-    
+    Single-pass alternative to format_transcript() + save_transcript(), with byte-identical output: the transcript is formatted by TranscriptWriter straight into the .txt file, so the formatted transcript is never built in memory. This lowers peak memory rather than saving time: benchmark.py shows it takes about as long as formatting and saving separately. It is written to a '.partial' file in the output directory first and renamed into place once complete, so a failure never leaves a half-written transcript under the final name.
+
     Args:
-        move_processed (bool): Flag. If True, the file will be moved to the processed directory. If false, the operation will be skipped.
+        raw_transcript (str): unformatted text string the audio file produced by Whisper (False if transcription failed).
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        header (str): The header fields constructed by create_header().
+        delimiter (str): User-defined delimiter to be inserted at start and end of transcript.
         audio_file (str): Filename of the currently processing audio file.
-        path_to_audio (str): Path to directory containing the audio files. 
-        path_for_processed (str): Path to directory where processed files are to be moved.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        segments (list, optional): Whisper's timestamped segments. If wrap_on_segments is True, each segment is written as one line instead of wrapping every word_interval words.
+
+    Contingency:
+        If formatting fails, the raw transcript is saved without formatting by save_transcript() (as when format_transcript() fails). If the file cannot be written, the transcript is printed to the terminal in case it can be saved manually.
+
+    Returns:
+        bool: True if the transcript was saved successfully, False if not.
+    """
+    full_path = transcript_output_path(audio_file, model_key)
+    temp_path = full_path + ".partial"
+    try:
+        os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as output_file:
+            write_txt_transcript(output_file, raw_transcript, word_interval, header, delimiter, segments)
+        os.replace(temp_path, full_path)
+
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        msg_error = (f"Error attempting to save transcript to txt file - {e}.\nWill attempt to print transcript string to terminal incase it can be manually saved...\n")
+        print(raw_transcript)
+        log_file_write(msg_error, log_path)
+        remove_partial_file(temp_path)
+        return False
+
+    except Exception as e:
+        msg_error = (f"Error in formatting transcript - {e}.\nThe raw transcript will be saved without formatting.\n")
+        log_file_write(msg_error, log_path)
+        remove_partial_file(temp_path)
+        return save_transcript(raw_transcript, audio_file, model_key)
+
+    msg_success = f"Raw transcript formatted successfully.\n{audio_file} processed successfully and transcript saved to .txt file.\n"
+    log_file_write(msg_success, log_path)
+    return True
+
+
+def write_txt_transcript(output_file, raw_transcript, word_interval, header, delimiter, segments=None):
+    """
+    Formats the .txt transcript into an open file with TranscriptWriter: header, line-numbered transcript, word count and delimiter. Used by write_formatted_transcript() and render_transcript_outputs().
+
+    Args:
+        output_file (file): Open text file (or io.StringIO).
+        raw_transcript (str): unformatted text string the audio file produced by Whisper.
+        word_interval (int): The word interval at which to insert newlines into the transcript.
+        header (str): The header fields constructed by create_header().
+        delimiter (str): User-defined delimiter to be inserted at start and end of transcript.
+        segments (list, optional): Whisper's timestamped segments, used instead of word_interval if wrap_on_segments is True.
+
+    Raises:
+        TypeError: If raw_transcript is not a string (i.e. False, as transcription failed).
+
+    Returns: None
+    """
+    if wrap_on_segments and segments:
+        writer = TranscriptWriter(output_file, 0)
+        writer.write_header(header)
+        writer.write_complete_transcript("\n".join(text for _, text in segment_lines(segments)))
+    else:
+        writer = TranscriptWriter(output_file, word_interval)
+        writer.write_header(header)
+        writer.write_complete_transcript(raw_transcript)
+    writer.finish(delimiter)
+
+
+def write_segment_format(output_file, output_format, segments, raw_transcript, audio_file, model_key):
+    """Writes one of the segment-based output formats ("srt", "vtt" or "json") into an open file. Used by write_segment_output() and render_transcript_outputs()."""
+    if output_format == "srt":
+        write_srt(output_file, segments)
+    elif output_format == "vtt":
+        write_vtt(output_file, segments)
+    else:
+        write_segments_json(output_file, segments, raw_transcript, audio_file, model_options[model_key]["name"])
+
+
+def write_segment_output(output_format, segments, raw_transcript, audio_file, model_key):
+    """
+    Writes one of the segment-based output formats (SRT or WebVTT subtitles, or segment JSON; see utils_output.py) for an audio file. As with the .txt transcript, the file is written to a '.partial' file and renamed into place once complete.
+
+    Args:
+        output_format (str): "srt", "vtt" or "json".
+        segments (list): Whisper's timestamped segments, as returned by transcribe().
+        raw_transcript (str): The full transcript text (used by "json").
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Contingency:
+        If the file cannot be written, the error is logged and any '.partial' file is removed. The other output formats are unaffected.
+
+    Returns:
+        bool: True if the file was saved successfully, False if not.
+    """
+    full_path = transcript_output_path(audio_file, model_key, output_format)
+    temp_path = full_path + ".partial"
+    try:
+        os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as output_file:
+            write_segment_format(output_file, output_format, segments, raw_transcript, audio_file, model_key)
+        os.replace(temp_path, full_path)
+
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        msg_error = f"Error attempting to save {output_format} output for {audio_file} - {e}.\n"
+        log_file_write(msg_error, log_path)
+        remove_partial_file(temp_path)
+        return False
+
+    msg_success = f"{audio_file} {output_format} output saved.\n"
+    log_file_write(msg_success, log_path)
+    return True
+
+
+def save_transcript_outputs(raw_transcript, segments, word_interval, header, delimiter, audio_file, model_key, skip_formats=()):
+    """
+    Saves every format listed in output_formats for an audio file, all from the same transcription: the .txt transcript (write_formatted_transcript()) and any of the segment-based formats (write_segment_output()). When there is more than one format, the files are written in parallel threads.
+
+    Args:
+        raw_transcript (str): unformatted text string the audio file produced by Whisper (False if transcription failed).
+        segments (list): Whisper's timestamped segments, as returned by transcribe().
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        header (str): The header fields constructed by create_header().
+        delimiter (str): User-defined delimiter to be inserted at start and end of transcript.
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        skip_formats (tuple, optional): Formats already written, i.e. ("txt",) after stream_transcript_to_file().
+
+    Contingency:
+        If transcription failed, the segment-based formats are not written (there are no segments), and the .txt transcript goes through the contingencies of write_formatted_transcript().
+
+    Returns:
+        bool: True if every format was saved successfully, False if any was not.
+    """
+    formats = [output_format for output_format in normalise_output_formats(output_formats)[0] if output_format not in skip_formats]
+    skipped = []
+    if raw_transcript is False:
+        skipped = [output_format for output_format in formats if output_format != "txt"]
+        formats = [output_format for output_format in formats if output_format == "txt"]
+        if skipped:
+            msg_error = f"No {', '.join(skipped)} output for {audio_file}, as it was not transcribed.\n"
+            log_file_write(msg_error, log_path)
+
+    jobs = []
+    for output_format in formats:
+        if output_format == "txt":
+            jobs.append((write_formatted_transcript, (raw_transcript, word_interval, header, delimiter, audio_file, model_key, segments)))
+        else:
+            jobs.append((write_segment_output, (output_format, segments, raw_transcript, audio_file, model_key)))
+
+    if len(jobs) <= 1:
+        saved = all([function(*args) for function, args in jobs])
+    else:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(function, *args) for function, args in jobs]
+            saved = all([future.result() for future in futures])
+    return saved and not skipped
+
+
+def render_transcript_outputs(raw_transcript, segments, word_interval, header, delimiter, audio_file, model_key):
+    """
+    Formats every format listed in output_formats for an audio file in memory, without saving them, for the format stage of the staged pipeline (see master_call_pipeline()). The text is exactly what save_transcript_outputs() would write; save_rendered_output() then saves it.
+
+    Args:
+        raw_transcript (str): unformatted text string the audio file produced by Whisper (False if transcription failed).
+        segments (list): Whisper's timestamped segments, as returned by transcribe().
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        header (str): The header fields constructed by create_header().
+        delimiter (str): User-defined delimiter to be inserted at start and end of transcript.
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Contingency:
+        As save_transcript_outputs(): if transcription failed, only the .txt transcript is attempted; if the .txt transcript cannot be formatted, the raw transcript is saved without formatting.
+
+    Returns:
+        tuple: (rendered (list of (output_format, text) pairs), formatted (bool): False if any format could not be produced).
+    """
+    formats = list(normalise_output_formats(output_formats)[0])
+    formatted = True
+    if raw_transcript is False:
+        skipped = [output_format for output_format in formats if output_format != "txt"]
+        formats = [output_format for output_format in formats if output_format == "txt"]
+        if skipped:
+            msg_error = f"No {', '.join(skipped)} output for {audio_file}, as it was not transcribed.\n"
+            log_file_write(msg_error, log_path)
+            formatted = False
+
+    rendered = []
+    for output_format in formats:
+        output_text = io.StringIO()
+        if output_format == "txt":
+            try:
+                write_txt_transcript(output_text, raw_transcript, word_interval, header, delimiter, segments)
+            except Exception as e:
+                msg_error = (f"Error in formatting transcript - {e}.\nThe raw transcript will be saved without formatting.\n")
+                log_file_write(msg_error, log_path)
+                if not isinstance(raw_transcript, str):
+                    formatted = False
+                    continue
+                output_text = io.StringIO(raw_transcript)
+            else:
+                msg_success = "Raw transcript formatted successfully.\n"
+                log_file_write(msg_success, log_path)
+        else:
+            try:
+                write_segment_format(output_text, output_format, segments, raw_transcript, audio_file, model_key)
+            except (KeyError, TypeError, ValueError) as e:
+                msg_error = f"Error attempting to save {output_format} output for {audio_file} - {e}.\n"
+                log_file_write(msg_error, log_path)
+                formatted = False
+                continue
+        rendered.append((output_format, output_text.getvalue()))
+    return rendered, formatted
+
+
+def save_rendered_output(output_format, output_text, audio_file, model_key):
+    """
+    Saves one output formatted by render_transcript_outputs(), for the save stage of the staged pipeline. As with write_formatted_transcript(), the file is written to a '.partial' file and renamed into place once complete.
+
+    Args:
+        output_format (str): "txt", "srt", "vtt" or "json".
+        output_text (str): The formatted output.
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Contingency:
+        If the file cannot be written, the error is logged and any '.partial' file is removed. A .txt transcript is also printed to the terminal in case it can be saved manually.
+
+    Returns:
+        bool: True if the file was saved successfully, False if not.
+    """
+    full_path = transcript_output_path(audio_file, model_key, output_format)
+    temp_path = full_path + ".partial"
+    try:
+        os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as output_file:
+            output_file.write(output_text)
+        os.replace(temp_path, full_path)
+
+    except (FileNotFoundError, PermissionError, OSError) as e:
+        remove_partial_file(temp_path)
+        if output_format == "txt":
+            msg_error = (f"Error attempting to save transcript to txt file - {e}.\nWill attempt to print transcript string to terminal incase it can be manually saved...\n")
+            print(output_text)
+        else:
+            msg_error = f"Error attempting to save {output_format} output for {audio_file} - {e}.\n"
+        log_file_write(msg_error, log_path)
+        return False
+
+    if output_format == "txt":
+        msg_success = f"{audio_file} processed successfully and transcript saved to .txt file.\n"
+    else:
+        msg_success = f"{audio_file} {output_format} output saved.\n"
+    log_file_write(msg_success, log_path)
+    return True
+
+
+def remove_partial_file(temp_path):
+    """Deletes a '.partial' transcript left by a failed write_formatted_transcript(), if there is one."""
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def stream_transcript_to_file(header, audio_file, word_interval, model_key, model, audio=None):
+    """
+    Streaming alternative to transcribe() + save_transcript_outputs(), used when stream_transcript is True. The recording is transcribed in chunks of about stream_chunk_secs (split at quiet points) and each chunk's segments are formatted and written to a '.partial' file in the output directory as soon as they are ready, so progress on a long recording can be seen on disk. The header is written first and the word count and delimiter last, after which the file is renamed into place atomically. Any other output_formats are written from the segments once the transcript is complete.
+
+    Args:
+        header (str): The header fields constructed by create_header().
+        audio_file (str): Filename of the currently processing audio file.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        model (str): The Whisper ASR model instance to be used for transcription.
+        audio (numpy.ndarray, optional): The file already decoded by prefetch_audio(). If None, it is decoded here.
+
+    Note:
+        The end of each chunk's text is passed to Whisper as the prompt for the next chunk, so context carries across chunks much as it does within a whole-file transcription.
+
+    Contingency:
+        If transcription or writing fails, the error is logged and the '.partial' file is left in place so that the transcript so far is not lost.
+
+    Returns:
+        bool: True if the transcript was completed and saved (along with any other output_formats), False if not.
+    """
+    key_options = {**decode_options, "stream_chunk_secs": stream_chunk_secs, "chunk_overlap_secs": chunk_overlap_secs}
+    cache_key, cached = transcript_cache_check(audio_file, model_key, key_options)
+    full_path = transcript_output_path(audio_file, model_key)
+    temp_path = full_path + ".partial"
+
+    try:
+        os.makedirs(os.path.dirname(full_path) or ".", exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as output_file:
+            writer = TranscriptWriter(output_file, 0 if wrap_on_segments else word_interval)
+            writer.write_header(header)
+            output_file.flush()
+
+            if cached is not None:
+                segments = cached["segments"]
+                write_stream_segments(writer, segments)
+            else:
+                if audio is None:
+                    audio = load_decoded_audio(audio_file)
+                chunks = split_audio_chunks(audio, stream_chunk_secs, chunk_overlap_secs)
+                segments = []
+                prompt = decode_options.get("initial_prompt")
+                transcribe_seconds = 0
+                for position, chunk in enumerate(chunks):
+                    start_time = time.perf_counter()
+                    result = model.transcribe(chunk["audio"], **{**decode_options, "initial_prompt": prompt})
+                    transcribe_seconds += time.perf_counter() - start_time
+                    kept = chunk_core_segments(chunk, result, position == len(chunks) - 1, len(segments))
+                    write_stream_segments(writer, kept)
+                    output_file.flush()
+                    segments.extend(kept)
+                    prompt = "".join(segment["text"] for segment in kept) or prompt
+                record_throughput(model_key, audio_file, audio, transcribe_seconds)
+
+            writer.finish(delimiter)
+        os.replace(temp_path, full_path)
+
+    except (FileNotFoundError, PermissionError, RuntimeError, OSError, Exception) as e:
+        msg_error = f"Error whilst streaming transcript of {audio_file} - {e}.\nAny transcript written so far is in {temp_path}\n"
+        log_file_write(msg_error, log_path)
+        return False
+
+    raw_transcript = "".join(segment["text"] for segment in segments)
+    if cache_key is not None and cached is None:
+        cache_store(transcript_cache_path, cache_key, {"text": raw_transcript, "segments": segments}, transcript_cache_mb, log_path)
+    msg_success = f"{audio_file} processed successfully and transcript streamed to .txt file.\n"
+    log_file_write(msg_success, log_path)
+    return save_transcript_outputs(raw_transcript, segments, word_interval, header, delimiter, audio_file, model_key, skip_formats=("txt",))
+
+
+def write_stream_segments(writer, segments):
+    """
+    Writes segments to a transcript being streamed by stream_transcript_to_file(): one line per segment if wrap_on_segments is True, otherwise wrapped every word_interval words.
+
+    Args:
+        writer (TranscriptWriter): Writer for the '.partial' transcript file.
+        segments (list): Whisper's timestamped segments.
+
+    Returns: None
+    """
+    if wrap_on_segments:
+        for _, text in segment_lines(segments):
+            writer.write_segment_line(text)
+    else:
+        for segment in segments:
+            writer.write_transcript(segment["text"])
+
+
+######################### TIDY UP #########################
+
+def move_processed_file(move_processed, audio_file, path_to_audio, path_for_processed, log_path):
+    """
+    Moves the audio file to the 'processed' directory after transcription. Note, it is perfectly valid for the 'processed' directory to be the same as the 'output' directory. 
+    
+    Args:
+        move_processed (bool): Flag. If True, the file will be moved to the processed directory. If false, the operation will be skipped.
+        audio_file (str): Filename of the currently processing audio file.
+        path_to_audio (str): Path to directory containing the audio files. 
+        path_for_processed (str): Path to directory where processed files are to be moved.
         log_path (str): Full path of log file to which status messages are written.
 
     Dependencies:
-        Function relies upon check_processed_directory() to have already  checked for a legitimate filepath and created the directory if required."""
+        Function relies upon check_processed_directory() to have already  checked for a legitimate filepath and created the directory if required.
+
+    Note:
+        Called by move_after_processing(), which runs it in a background thread while the next file is transcribed if background_moves is True."""
     if move_processed == False:
         return False
 
@@ -539,9 +1499,10 @@ def move_processed_file(move_processed, audio_file, path_to_audio, path_for_proc
     try:
         current_file_path = os.path.join(path_to_audio, audio_file)
         new_file_path = os.path.join(path_for_processed, audio_file)
+        os.makedirs(os.path.dirname(new_file_path) or ".", exist_ok=True) # files from subfolders keep their subfolder
 
-        # Move the file
-        shutil.move(current_file_path, new_file_path)
+        # Move the file: a rename on the same drive, otherwise a verified copy then delete (see move_file() in utils_move.py)
+        move_file(current_file_path, new_file_path)
         msg_success = f"File moved from '{current_file_path}' to '{new_file_path}'\n"
         log_file_write(msg_success, log_path)
         return True
@@ -551,6 +1512,51 @@ def move_processed_file(move_processed, audio_file, path_to_audio, path_for_proc
         log_file_write(msg_error, log_path)
         return False
 
+def move_after_processing(audio_file):
+    """
+    Moves a processed audio file (if move_processed is True) and records the move in the progress journal. While a batch is running with background_moves True, the move is queued for the background mover (see mover_start()) and this returns at once. In a worker process of the parallel pool, the file is passed back to the parent process to move, so that the worker can start on its next file.
+
+    Args:
+        audio_file (str): Filename of the processed audio file.
+
+    Returns: None
+    """
+    if not move_processed:
+        return
+    if is_worker and background_moves:
+        pending_moves.append(audio_file)
+    elif file_mover is not None:
+        file_mover.submit(audio_file)
+    else:
+        move_and_record(audio_file)
+
+
+def move_and_record(audio_file):
+    """Moves one processed audio file by move_processed_file() and records the move in the progress journal if it succeeded. Run in the background mover's thread when background_moves is True."""
+    with stage_timer("move_processed_file"):
+        moved = move_processed_file(move_processed, audio_file, path_to_audio, path_for_processed, log_path)
+    if moved:
+        record_stage(audio_file, "moved")
+
+
+def mover_start():
+    """Starts the background mover for a batch, if move_processed and background_moves are True. Each call is paired with mover_finish()."""
+    global file_mover
+    if move_processed and background_moves and file_mover is None:
+        file_mover = BackgroundMover(move_and_record)
+
+
+def mover_finish():
+    """Waits for the background mover to finish any moves still queued, then stops it."""
+    global file_mover
+    if file_mover is not None:
+        if not file_mover.pending.empty():
+            msg_waiting = "Waiting for processed files to finish moving...\n"
+            log_file_write(msg_waiting, log_path)
+        file_mover.close()
+        file_mover = None
+
+
 ######################## CALL SEQUENCE ########################
 
 def master_call_single(word_interval, model_key): 
@@ -562,43 +1568,859 @@ def master_call_single(word_interval, model_key):
         model_key (str): Key representing the chosen model from model_options dictionary.
 
     Returns:
-        audio_filenames (list): List of audio file names in the batch, generated by obtain_audio_filenames()
-        model (str): The Whisper ASR model instance to be used for transcription.
+        audio_filenames (list): List of audio file names in the batch, generated by obtain_audio_filenames(). If lazy_discovery is True, a generator which finds the files as the batch is processed (see discover_audio_files() in utils_helper.py).
+        model (str): The Whisper ASR model instance to be used for transcription. None when num_workers > 1, as each worker process loads its own model.
     
     """
+    global num_workers, prefetch_depth, prefetch_memory_mb, processing_order, output_formats, auto_route, pipeline_concurrency
+    with stage_timer("log_file_setup"):
+        log_file_setup(use_log_file, path_to_logs)
+    with stage_timer("check_directories"):
+        check_input_directory(path_to_audio)
+        check_output_directory(path_for_output)
+    modified_after_timestamp = check_modified_after(modified_after)
+    if lazy_discovery:
+        # files are found as the batch is processed, so there is nothing to count or estimate yet
+        audio_filenames = discover_audio_files(path_to_audio, audio_format, log_path, search_subfolders, modified_after_timestamp)
+    else:
+        with stage_timer("obtain_audio_filenames"):
+            file_count, audio_filenames = obtain_audio_filenames(path_to_audio, audio_format, search_subfolders, modified_after_timestamp)
+    word_interval = check_word_interval(word_interval)
+    num_workers = check_num_workers(num_workers)
+    prefetch_depth = check_prefetch_depth(prefetch_depth)
+    prefetch_memory_mb = check_prefetch_memory_mb(prefetch_memory_mb)
+    processing_order = check_processing_order(processing_order)
+    output_formats = check_output_formats(output_formats)
+    check_model(model_key)
+    auto_route = check_route_models(auto_route)
+    if use_pipeline:
+        pipeline_concurrency = check_pipeline_concurrency(pipeline_concurrency)
+    if lazy_discovery:
+        msg_summary = f"Summary of transcription parameters \n- Input Path: {path_to_audio} \n- Output Path: {path_for_output} \n- Audio format: {audio_format} \n- Files will be transcribed as they are found, so there is no file count or time estimate \n- Transcription Model: {model_summary(model_key)} \n- Output formats: {', '.join(output_formats)} \n- Newline interval: {'one line per Whisper segment' if wrap_on_segments else f'{word_interval} words'}.\n"
+        log_file_write(msg_summary, log_path)
+        plan_memory_budget(model_key, {}, detect_gpu=not use_model_server)
+        time.sleep(summary_pause_secs)
+    else:
+        with stage_timer("pre_processing_summary"):
+            provide_pre_processing_summary(path_to_audio, path_for_output, audio_format, file_count, model_key, word_interval, audio_filenames, detect_gpu=not use_model_server)
+    model = None
+    if num_workers == 1:
+        with stage_timer("load_model"):
+            model = load_model(model_key)
+    return audio_filenames, model, word_interval
+
+
+def master_call_estimate(word_interval, model_key):
+    """
+    Estimate-only (dry run) alternative to master_call_single(): runs the same checks and the pre-processing summary with its time estimate, without creating the output directory, loading Whisper or torch, or pausing, so it returns in well under a second for a batch whose durations are already in the probe cache. Run with `python main.py --estimate`.
+
+    Args:
+        word_interval (int): The user-specified word interval, checked as for a real run.
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Exits:
+        sys.exit(): As master_call_single(), if the input directory does not exist, contains no files of the target type, or the model is not valid.
+
+    Returns:
+        dict: Machine-readable estimate, with keys "file_count", "audio_secs" (total duration of the files which could be probed), "unknown_durations" (files which could not be probed), "estimate_secs", "low_secs" and "high_secs" (the 95% range; the same as estimate_secs when the nominal speed_x is used) and "basis" ("measured" or "nominal").
+    """
+    global num_workers, prefetch_depth, prefetch_memory_mb, output_formats, auto_route
     log_file_setup(use_log_file, path_to_logs)
     check_input_directory(path_to_audio)
-    check_output_directory(path_for_output)
-    file_count, audio_filenames = obtain_audio_filenames(path_to_audio, audio_format)
+    file_count, audio_filenames = obtain_audio_filenames(path_to_audio, audio_format, search_subfolders, check_modified_after(modified_after))
     word_interval = check_word_interval(word_interval)
+    num_workers = check_num_workers(num_workers)
+    prefetch_depth = check_prefetch_depth(prefetch_depth)
+    prefetch_memory_mb = check_prefetch_memory_mb(prefetch_memory_mb)
+    output_formats = check_output_formats(output_formats)
     check_model(model_key)
-    provide_pre_processing_summary(path_to_audio, path_for_output, audio_format, file_count, model_key, word_interval, audio_filenames)
-    model = load_model(model_key) 
-    return audio_filenames, model, word_interval
+    auto_route = check_route_models(auto_route)
+    provide_pre_processing_summary(path_to_audio, path_for_output, audio_format, file_count, model_key, word_interval, audio_filenames, pause_secs=0, detect_gpu=False)
+
+    known_durations = [duration for duration in audio_durations.values() if duration is not None]
+    audio_secs = sum(known_durations)
+    model_chosen = model_options[model_key]["name"]
+    measured = throughput_estimate(throughput_stats_load(throughput_stats_path).get(throughput_key(model_chosen, inference_threads())))
+    if measured:
+        secs_per_audio_sec, half_width, _ = measured
+    else:
+        secs_per_audio_sec, half_width = 1 / abs(model_options[model_key]["speed_x"]), 0
+    return {
+        "file_count": file_count,
+        "audio_secs": round(audio_secs, 2),
+        "unknown_durations": len(audio_filenames) - len(known_durations),
+        "estimate_secs": round(audio_secs * secs_per_audio_sec, 2),
+        "low_secs": round(audio_secs * max(0, secs_per_audio_sec - half_width), 2),
+        "high_secs": round(audio_secs * (secs_per_audio_sec + half_width), 2),
+        "basis": "measured" if measured else "nominal",
+    }
+
+
+def process_audio_file(index, audio_file, word_interval, model_key, model, audio=None, pool=None):
+    """
+    Runs the full per-file sequence for a single audio file: create_header, transcribe, save_transcript_outputs (each of output_formats, from the one transcription) and move_processed_file. If stream_transcript is True, stream_transcript_to_file() takes the place of transcribe and save_transcript_outputs (except for long files being split across the worker pool).
+
+    Args:
+        index (int): The batch process order of the file (starts at 1).
+        audio_file (str): Filename of the currently processing audio file.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        model (str): The Whisper ASR model instance to be used for transcription.
+        audio (numpy.ndarray, optional): The file already decoded by prefetch_audio(), passed on to transcribe().
+        pool (multiprocessing.pool.Pool, optional): Worker pool used to transcribe a long file in chunks, passed on to transcribe().
+
+    Interactions:
+        The steps up to and including transcription are run by transcribe_audio_file(), which the staged pipeline (master_call_pipeline()) shares.
+
+    Returns: None
+    """
+    job = transcribe_audio_file(index, audio_file, word_interval, model_key, model, audio, pool)
+    if job["saved"] is None:
+        with stage_timer("format_and_save_transcript"):
+            saved = save_transcript_outputs(job["raw_transcript"], job["segments"], word_interval, job["header"], delimiter, job["audio_file"], job["model_key"])
+        if saved:
+            record_stage(job["audio_file"], "saved", job["model_key"])
+    move_after_processing(job["audio_file"])
+
+
+def transcribe_audio_file(index, audio_file, word_interval, model_key, model, audio=None, pool=None):
+    """
+    Runs the first part of the per-file sequence: routing (if auto_route is True), create_header and transcribe, or, if stream_transcript is True, stream_transcript_to_file() (which saves the .txt transcript as it goes).
+
+    Args:
+        As process_audio_file().
+
+    Note:
+        If auto_route is True, the file is first routed to a model by route_audio_file() (decoding it, if it has not been already, so the decoded audio is shared with transcription). The header and output filenames then name the routed model. Long files split across the worker pool are not routed.
+
+    Returns:
+        dict: "index", "audio_file", "model_key" (the model used), "header", "raw_transcript" (False if transcription failed), "segments" and "saved" (True or False if the outputs were already saved by streaming, otherwise None).
+    """
+    if auto_route and pool is None:
+        with stage_timer("route"):
+            if audio is None:
+                try:
+                    audio = load_decoded_audio(audio_file)
+                except Exception: # logged by route_audio_file(), and again by transcribe() when Whisper tries the file itself
+                    audio = None
+            routed_key = route_audio_file(audio_file, audio, model_key)
+        if routed_key != model_key:
+            routed_models.setdefault(model_key, model)
+            routed = routed_model(routed_key)
+            if routed is not None:
+                model_key, model = routed_key, routed
+            else:
+                msg_error = f"Error, {model_options[routed_key]['name']} could not be loaded, so {audio_file} will be transcribed with {model_options[model_key]['name']}.\n"
+                log_file_write(msg_error, log_path)
+    with stage_timer("create_header"):
+        header, audio_file = create_header(index, audio_file, delimiter) 
+    if auto_route:
+        header = header_for_model(header, model_key)
+    job = {"index": index, "audio_file": audio_file, "model_key": model_key, "header": header, "raw_transcript": False, "segments": [], "saved": None}
+    if stream_transcript and pool is None:
+        with stage_timer("stream_transcript"):
+            job["saved"] = stream_transcript_to_file(header, audio_file, word_interval, model_key, model, audio)
+        if job["saved"]:
+            record_stage(audio_file, "transcribed")
+            record_stage(audio_file, "saved", model_key)
+    else:
+        with stage_timer("transcribe"):
+            job["raw_transcript"], job["segments"] = transcribe(model, audio_file, model_key, audio, pool)
+        if job["raw_transcript"] is not False:
+            record_stage(audio_file, "transcribed")
+    return job
+
+
+######################## PROGRESS JOURNAL ########################
+
+def journal_setup(model_key, word_interval):
+    """
+    Loads (resume_batch True) or starts afresh (resume_batch False) the progress journal for this model's transcripts. The journal is kept in path_for_cache, so nothing but transcripts is written to the output directory, with one journal per model and output directory, as transcripts from different models are different outputs (see journal_file_path() in utils_journal.py).
+
+    Args:
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+
+    Note:
+        Each journal entry records a key of the settings which shape the outputs (word_interval, delimiter, the header fields, output_formats, wrap_on_segments, decode_options, routing and path_for_output), so files are only skipped on resume if they were processed with the same settings.
+
+    Returns: None
+    """
+    global journal, journal_path, journal_settings
+    if not use_journal:
+        return
+    journal_settings = journal_settings_key({
+        "word_interval": word_interval,
+        "delimiter": delimiter,
+        "audio_info_batch": audio_info_batch,
+        "audio_file_info": audio_file_info,
+        "output_formats": normalise_output_formats(output_formats)[0],
+        "wrap_on_segments": wrap_on_segments,
+        "decode_options": decode_options,
+        "auto_route": auto_route,
+        "path_for_output": path_for_output,
+    })
+    journal_path = journal_file_path(path_for_cache, path_for_output, model_options[model_key]["alt_name"])
+    journal = journal_load(journal_path, log_path) if resume_batch else {"files": {}}
+
+
+def record_stage(audio_file, stage, model_key=None):
+    """
+    Records a completed per-file stage ("transcribed", "saved" or "moved") in the progress journal. In a worker process the stage is held in pending_stages instead, and the parent process records it, so that only one process ever writes the journal.
+
+    Args:
+        audio_file (str): Filename of the currently processing audio file.
+        stage (str): The stage which has completed.
+        model_key (str, optional): Key of the model the outputs were saved with, given for "saved" so the journal can record the output files (see transcript_output_path()).
+
+    Returns: None
+    """
+    if not use_journal:
+        return
+    if journal is None:
+        pending_stages.append((audio_file, stage, model_key))
+        return
+    outputs = None
+    if model_key is not None:
+        outputs = [transcript_output_path(audio_file, model_key, output_format) for output_format in normalise_output_formats(output_formats)[0]]
+    journal_mark(journal, journal_path, audio_file, stage, os.path.join(path_to_audio, audio_file), log_path, journal_settings, outputs)
+
+
+def resume_pending(batch):
+    """
+    Removes files whose work was completed in a previous run (according to the progress journal) from the batch: those saved with the same settings whose output files are all still in place (see journal_completed_stages() in utils_journal.py). A file whose transcript was saved but which was not yet moved is moved now rather than transcribed again. Works through the batch as it is consumed, so files found lazily (lazy_discovery) are checked as they are found.
+
+    Args:
+        batch (iterable): (index, audio_file) pairs for the batch. The index is kept, so header numbering is the same as for an uninterrupted run.
+
+    Yields:
+        tuple: (index, audio_file) pairs which still need processing.
+    """
+    if journal is None or not resume_batch:
+        yield from batch
+        return
+
+    remaining = 0
+    skipped = 0
+    for index, audio_file in batch:
+        stages = journal_completed_stages(journal, audio_file, os.path.join(path_to_audio, audio_file), journal_settings)
+        if "saved" not in stages:
+            remaining += 1
+            yield index, audio_file
+            continue
+        skipped += 1
+        if move_processed and "moved" not in stages:
+            move_after_processing(audio_file)
+
+    if skipped:
+        msg_resume = f"Resuming batch - {skipped} file(s) already transcribed and saved in a previous run were skipped. {remaining} file(s) were processed.\n"
+        log_file_write(msg_resume, log_path)
+
+
+def worker_init(model_key, parent_log_path, torch_threads, parent_audio_durations, parent_auto_route=False):
+    """
+    Initialises a worker process of the parallel pool: loads the model once, via load_model(), for all the files the worker will go on to process.
+
+    Args:
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        parent_log_path (str): Full path of the log file set up by the parent process.
+        torch_threads (int): Number of CPU threads the worker's model may use, so that the workers share the cores rather than each trying to use all of them.
+        parent_audio_durations (dict): File durations from the parent's pre-processing summary, used when recording speed measurements.
+        parent_auto_route (bool, optional): auto_route as checked by check_route_models() in the parent process.
+
+    Contingency:
+        If the model cannot be loaded, worker_model is left as None and each file sent to this worker is logged as an error rather than the worker exiting (which would cause the pool to keep restarting it).
+
+    Returns: None
+    """
+    global log_path, worker_model, audio_durations, is_worker, auto_route
+    log_path = parent_log_path
+    is_worker = True
+    audio_durations = parent_audio_durations
+    auto_route = parent_auto_route
+
+    try:
+        import torch # installed with whisper
+        torch.set_num_threads(torch_threads)
+    except (ImportError, RuntimeError) as e:
+        msg_error = f"Worker {os.getpid()} - unable to set number of torch threads - {e}.\n"
+        log_file_write(msg_error, log_path)
+
+    try:
+        with stage_timer("load_model"):
+            worker_model = load_model(model_key)
+    except SystemExit:
+        worker_model = None
+    # Pool workers are terminated rather than exiting normally, so nothing may be left queued
+    log_flush()
+
+
+def worker_process_file(task):
+    """
+    Processes one audio file inside a worker process. Screen output and log entries are captured rather than written, and handed back to the parent process so each file's messages appear as one readable block.
+
+    Args:
+        task (tuple): (index, audio_file, word_interval, model_key) for the file to process.
+
+    Returns:
+        dict: Report on the processed file for the parent process, with keys "index", "screen_output" (str), "log_entries" (list), "cache_stats" (transcript cache hit/miss counts), "stages" (completed journal stages), "throughput" (speed measurements), "moves" (files for the parent to move) and "metrics" (stage timings, if collect_metrics is True).
+    """
+    index, audio_file, word_interval, model_key = task
+    pending_stages.clear()
+    pending_throughput.clear()
+    pending_moves.clear()
+    screen_output = io.StringIO()
+    log_buffer_start()
+    with redirect_stdout(screen_output):
+        if worker_model is None:
+            msg_error = f"Error, worker {os.getpid()} has no model loaded. {audio_file} was not transcribed.\n"
+            log_file_write(msg_error, log_path)
+        else:
+            try:
+                process_audio_file(index, audio_file, word_interval, model_key, worker_model)
+            except Exception as e:
+                msg_error = f"Unexpected error whilst processing {audio_file} in worker {os.getpid()} - {e}.\n"
+                log_file_write(msg_error, log_path)
+    return {
+        "index": index,
+        "screen_output": screen_output.getvalue(),
+        "log_entries": log_buffer_collect(),
+        "cache_stats": cache_stats_collect(),
+        "stages": list(pending_stages),
+        "throughput": list(pending_throughput),
+        "moves": list(pending_moves),
+        "metrics": stage_metrics_collect(),
+    }
+
+
+def worker_transcribe_chunk(chunk_audio):
+    """
+    Transcribes one chunk of a long recording inside a worker process (long-file mode).
+
+    Args:
+        chunk_audio (numpy.ndarray): The chunk of decoded 16 kHz audio.
+
+    Raises:
+        RuntimeError: If the worker has no model loaded. Errors are passed back to transcribe() in the parent process, which logs them.
+
+    Returns:
+        dict: The chunk's transcript, with keys "text" and "segments" (timestamps relative to the start of the chunk).
+    """
+    if worker_model is None:
+        raise RuntimeError(f"worker {os.getpid()} has no model loaded")
+    result = worker_model.transcribe(chunk_audio, **decode_options)
+    return {"text": result["text"], "segments": result["segments"]}
+
+
+def master_call_loop_parallel(batch, word_interval, model_key):
+    """
+    Processes the batch with num_workers worker processes. Each worker loads the model once (worker_init()) and then takes files one at a time from the shared task queue, so a long file on one worker does not hold up the others.
+
+    Args:
+        batch (list or iterator): (index, audio_file) pairs to be processed. An iterator (lazy_discovery) is handed to the workers as it yields, without long_file_mode.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Note:
+        Results are collected in batch order, so screen output and log entries are written one file at a time, in the same order as the sequential loop, even though files finish out of order.
+        If long_file_mode is True, files at least long_file_threshold_mins long are held back until the other files are done and then split into chunks which are shared out across all of the workers (see transcribe()), so one long recording does not leave the other workers idle at the end of the batch.
+
+    Returns: None
+    """
+    torch_threads = inference_threads()
+    long_batch = []
+    if not isinstance(batch, list):
+        # lazy_discovery: files are handed to the workers as they are found
+        tasks = ((index, audio_file, word_interval, model_key) for index, audio_file in batch)
+        worker_count = num_workers
+        msg_start = f"Starting {worker_count} worker processes ({torch_threads} CPU threads each) to transcribe files as they are found.\n"
+    else:
+        if long_file_mode:
+            long_batch = [(index, audio_file) for index, audio_file in batch if (audio_durations.get(audio_file) or 0) >= long_file_threshold_mins * 60]
+        tasks = [(index, audio_file, word_interval, model_key) for index, audio_file in batch if (index, audio_file) not in long_batch]
+        worker_count = num_workers if long_batch else min(num_workers, len(tasks))
+        if worker_count == 0:
+            return
+        msg_start = f"Starting {worker_count} worker processes ({torch_threads} CPU threads each) to transcribe {len(tasks)} file(s).\n"
+    log_file_write(msg_start, log_path)
+    if use_model_server:
+        msg_server = "Model server not used by the worker processes: each loads its own copy of the model, so they can transcribe in parallel.\n"
+        log_file_write(msg_server, log_path)
+
+    # spawn (rather than fork) so that each worker starts torch cleanly
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(worker_count, initializer=worker_init, initargs=(model_key, log_path, torch_threads, audio_durations, auto_route)) as pool:
+        # chunksize=1 so workers take the next file as soon as they are free
+        for report in pool.imap(worker_process_file, tasks, chunksize=1):
+            print(report["screen_output"], end="")
+            log_entries_write(report["log_entries"], log_path)
+            cache_stats_merge(report["cache_stats"])
+            for audio_file, stage, saved_model_key in report["stages"]:
+                record_stage(audio_file, stage, saved_model_key)
+            for key, audio_secs, process_secs in report["throughput"]:
+                throughput_record(throughput_stats_path, key, audio_secs, process_secs, log_path)
+            stage_metrics_merge(report["metrics"])
+            for audio_file in report["moves"]:
+                move_after_processing(audio_file)
+
+        for index, audio_file in long_batch:
+            process_audio_file(index, audio_file, word_interval, model_key, None, pool=pool)
+
+
+
+def master_call_pipeline(batch, word_interval, model_key, model):
+    """
+    Processes the batch as a staged pipeline (use_pipeline True): discover, probe, decode, transcribe, format, save and move each run in their own threads, connected by queues of at most pipeline_queue_size files, so that one file can be decoding while the previous one is transcribed and the one before that is saved and moved (see run_pipeline() in utils_pipeline.py). Each stage works on up to pipeline_concurrency files at once; transcription works on one.
+
+    Args:
+        batch (list or iterator): (index, audio_file) pairs to be processed, from master_call_loop(). An iterator (lazy_discovery) is read as the pipeline runs, so discovery overlaps with the other stages.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        model_key (str): Key representing the chosen model from model_options dictionary.
+        model (str): The Whisper ASR model instance to be used for transcription.
+
+    Interactions:
+        The stages call the same functions as process_audio_file(): transcribe_audio_file() for routing, the header and transcription (or streaming), render_transcript_outputs() and save_rendered_output() in place of save_transcript_outputs(), and move_after_processing(). So the outputs, journal entries and moves are the same as for the sequential loop. Each stage passes files on in batch order.
+
+    Contingency:
+        A file which cannot be decoded is passed to transcribe() undecoded, as with prefetch_audio(), so Whisper reports the error as before. An unexpected error in any stage is logged and that file goes no further; the rest of the batch carries on.
+
+    Returns: None
+    """
+
+    def probe_stage(item):
+        index, audio_file = item
+        if audio_durations.get(audio_file) is None:
+            try:
+                with stage_timer("probe_duration"):
+                    audio_durations[audio_file] = probe_duration(os.path.join(path_to_audio, audio_file))
+            except Exception: # the duration is only needed for speed measurements
+                pass
+        return item
+
+    def decode_stage(item):
+        index, audio_file = item
+        try:
+            with stage_timer("decode"):
+                audio = load_decoded_audio(audio_file)
+        except Exception:
+            audio = None
+        return index, audio_file, audio
+
+    def transcribe_stage(item):
+        index, audio_file, audio = item
+        return transcribe_audio_file(index, audio_file, word_interval, model_key, model, audio)
+
+    def format_stage(job):
+        if job["saved"] is None:
+            with stage_timer("format_transcript"):
+                job["rendered"], job["formatted"] = render_transcript_outputs(job["raw_transcript"], job["segments"], word_interval, job["header"], delimiter, job["audio_file"], job["model_key"])
+        return job
+
+    def save_stage(job):
+        if job["saved"] is None:
+            with stage_timer("save_transcript"):
+                saved = [save_rendered_output(output_format, output_text, job["audio_file"], job["model_key"]) for output_format, output_text in job["rendered"]]
+            if job["rendered"] and all(saved) and job["formatted"]:
+                record_stage(job["audio_file"], "saved", job["model_key"])
+        return job
+
+    def move_stage(job):
+        move_after_processing(job["audio_file"])
+
+    def stage_error(stage, item, e):
+        audio_file = item["audio_file"] if isinstance(item, dict) else item[1]
+        msg_error = f"Unexpected error in the {stage} stage for {audio_file} - {e}.\n"
+        log_file_write(msg_error, log_path)
+
+    stages = [
+        ("probe", probe_stage, pipeline_concurrency["probe"]),
+        ("decode", decode_stage, pipeline_concurrency["decode"]),
+        ("transcribe", transcribe_stage, 1),
+        ("format", format_stage, pipeline_concurrency["format"]),
+        ("save", save_stage, pipeline_concurrency["save"]),
+        ("move", move_stage, pipeline_concurrency["move"]),
+    ]
+    asyncio.run(run_pipeline(batch, stages, pipeline_queue_size, stage_error))
+
      
 def master_call_loop(audio_filenames, word_interval, model_key, model):
     """
-    Sequentially calls the functions which need to run for each audio file in the batch. 
+    Sequentially calls the functions which need to run for each audio file in the batch. If use_journal and resume_batch are True, files completed in a previous run are skipped (see resume_pending()). If background_moves is True, processed files are moved in the background while the next file is transcribed, and the batch finishes once the last move is complete. Files are processed in processing_order (see schedule_batch() in utils_helper.py), keeping their alphabetical numbering. If prefetch_depth > 0, upcoming files are decoded in the background by prefetch_audio() while the current file is transcribed. If num_workers > 1, the batch is instead handed to master_call_loop_parallel(), or if use_pipeline is True, to master_call_pipeline().
     
     Args:
-        audio_filenames (list): List of audio file names in the batch, generated by obtain_audio_filenames()
+        audio_filenames (list or iterator): List of audio file names in the batch, generated by obtain_audio_filenames(), or (lazy_discovery) a generator from discover_audio_files() which is consumed as the batch is processed.
         word_interval (int): The user-specified word interval at which to insert newlines into the transcript. Note, that check_word_interval may alter this value (substituting 0 if an invalid interval was entered), so a potentially altered value may be what is passed to master_call_loop().
         model_key (str): Key representing the chosen model from model_options dictionary.
         model (str): The Whisper ASR model instance to be used for transcription.
 
     Contingency:
-        format_transcript() and save_transcript() have contingencies for failure which attempt to preserve and output the original transcript produced by the Whisper model.
+        write_formatted_transcript() and save_transcript() have contingencies for failure which attempt to preserve and output the original transcript produced by the Whisper model.
 
     Returns:
-        None. Upon completion of the batch processing, a message is printed to the terminal and written to the log file to indicate that the batch processing has finished.
+        None. Upon completion of the batch processing, a message is printed to the terminal and written to the log file to indicate that the batch processing has finished, followed by a summary of transcript cache use if use_transcript_cache is True. If collect_metrics is True, the time and memory taken by each stage are saved (see metrics_report_write() in utils_metrics.py).
     """
 
-    for index, audio_file in enumerate(audio_filenames, start=1):
-        header, audio_file = create_header(index, audio_file, delimiter) 
-        raw_transcript = transcribe(model, audio_file)
-        formatted_transcript = format_transcript(raw_transcript, word_interval, header, delimiter)
-        save_transcript(formatted_transcript, audio_file, model_key)
-        move_processed_file(move_processed, audio_file, path_to_audio, path_for_processed, log_path)
-    msg_finished = f"Transcription of {audio_filenames} finished. This is not confirmation that all files were transcribed without issue: check log file and print statements to see if any individual files encountered errors.\n\n"
+    file_counter = {"found": 0}
+
+    def numbered_files():
+        for index, audio_file in enumerate(audio_filenames, start=1):
+            file_counter["found"] = index
+            yield index, audio_file
+
+    mover_start()
+    try:
+        with stage_timer("journal_setup"):
+            journal_setup(model_key, word_interval)
+            batch = resume_pending(numbered_files())
+            if isinstance(audio_filenames, list):
+                batch = schedule_batch(list(batch), processing_order, audio_durations)
+
+        if num_workers > 1:
+            with stage_timer("parallel_batch"):
+                master_call_loop_parallel(batch, word_interval, model_key)
+        elif use_pipeline:
+            with stage_timer("pipeline_batch"):
+                master_call_pipeline(batch, word_interval, model_key, model)
+        elif prefetch_depth > 0:
+            # decode_wait is the time spent waiting for the background decoder, i.e. when decoding is slower than transcription
+            for index, audio_file, audio in timed_iter(prefetch_audio(path_to_audio, batch, prefetch_depth, prefetch_memory_mb, log_path, audio_durations, load_decoded_audio), "decode_wait"):
+                process_audio_file(index, audio_file, word_interval, model_key, model, audio)
+        else:
+            for index, audio_file in batch:
+                process_audio_file(index, audio_file, word_interval, model_key, model)
+    finally:
+        with stage_timer("move_wait"):
+            mover_finish()
+    if file_counter["found"] == 0:
+        msg_error = f"Error, no files of type {audio_format} found in {path_to_audio}.\n Check file extension supplied matches at least one audio file.\n"
+        log_file_write(msg_error, log_path)
+    msg_finished = f"Transcription of {file_counter['found']} file(s) finished. This is not confirmation that all files were transcribed without issue: check log file and print statements to see if any individual files encountered errors.\n\n"
     log_file_write(msg_finished, log_path)
+    if use_transcript_cache:
+        log_file_write(cache_summary(transcript_cache_path), log_path)
+    if use_audio_cache:
+        log_file_write(audio_cache_summary(audio_cache_path), log_path)
+    metrics_report_write(path_for_metrics, prometheus_textfile_dir, model_options[model_key]["name"], file_counter["found"], log_path)
+
+
+def master_call_watch(word_interval, model_key):
+    """
+    Watch-folder mode (watch_folder True in user_variables.py): loads the model once, then keeps watching path_to_audio and transcribes each new file as soon as it has finished arriving (see watch_scan() in utils_watch.py), until stopped with Ctrl+C or SIGTERM. Files already in the directory at start-up are processed first.
+
+    Args:
+        word_interval (int): The user-specified word interval at which to insert newlines into the transcript, checked here by check_word_interval().
+        model_key (str): Key representing the chosen model from model_options dictionary.
+
+    Note:
+        A shutdown request lets the file being transcribed finish (including saving and moving) before the program exits. Further shutdown requests are handled as normal, so a second Ctrl+C stops at once.
+        Each file is processed by the same sequence as a batch (process_audio_file()), so journal, cache, streaming and metrics settings apply as usual. With use_journal and resume_batch True, files already transcribed in an earlier run are not transcribed again.
+
+    Exits:
+        sys.exit(): Program will exit if the input directory does not exist, or if the model cannot be loaded.
+
+    Returns: None
+    """
+    global num_workers, output_formats, auto_route
+    log_file_setup(use_log_file, path_to_logs)
+    check_input_directory(path_to_audio)
+    check_output_directory(path_for_output)
+    word_interval = check_word_interval(word_interval)
+    output_formats = check_output_formats(output_formats)
+    check_model(model_key)
+    auto_route = check_route_models(auto_route)
+    num_workers = 1
+    with stage_timer("load_model"):
+        model = load_model(model_key)
+    if model is None:
+        msg_error = "Error, the model could not be loaded, so the watch folder cannot be started. Exiting program.\n"
+        log_file_write(msg_error, log_path)
+        sys.exit(1)
+    journal_setup(model_key, word_interval)
+
+    stop_event = threading.Event()
+    previous_handlers = {}
+
+    def request_stop(signum, frame):
+        msg_stop = f"Received {signal.Signals(signum).name} - stopping watch-folder mode once the current file is finished.\n"
+        log_file_write(msg_stop, log_path)
+        stop_event.set()
+        for handled_signal, handler in previous_handlers.items():
+            signal.signal(handled_signal, handler)
+
+    for handled_signal in (signal.SIGTERM, signal.SIGINT):
+        previous_handlers[handled_signal] = signal.signal(handled_signal, request_stop)
+
+    inotify_fd = inotify_open(path_to_audio)
+    watch_method = "inotify" if inotify_fd is not None else f"a check every {watch_poll_secs} seconds"
+    msg_start = f"Watching {path_to_audio} for new {audio_format} files ({watch_method}). Press Ctrl+C to stop.\n"
+    log_file_write(msg_start, log_path)
+
+    watched = {}
+    processed_count = 0
+    mover_start()
+    try:
+        while not stop_event.is_set():
+            for audio_file in watch_scan(path_to_audio, audio_format, watched, watch_settle_secs):
+                if stop_event.is_set():
+                    break
+                if not list(resume_pending([(processed_count + 1, audio_file)])):
+                    continue
+                try:
+                    audio_durations[audio_file] = probe_duration(os.path.join(path_to_audio, audio_file))
+                except Exception: # the duration is only needed for speed measurements
+                    pass
+                processed_count += 1
+                process_audio_file(processed_count, audio_file, word_interval, model_key, model)
+                audio_durations.pop(audio_file, None)
+            # rescan soon if a file is still arriving, otherwise wait for the next change
+            watch_wait(inotify_fd, watch_settle_secs if watch_settling(watched) else watch_poll_secs, stop_event)
+    finally:
+        mover_finish()
+        if inotify_fd is not None:
+            os.close(inotify_fd)
+        for handled_signal, handler in previous_handlers.items():
+            signal.signal(handled_signal, handler)
+        msg_finished = f"Watch-folder mode stopped. {processed_count} file(s) processed this session.\n"
+        log_file_write(msg_finished, log_path)
+        if use_transcript_cache:
+            log_file_write(cache_summary(transcript_cache_path), log_path)
+        if use_audio_cache:
+            log_file_write(audio_cache_summary(audio_cache_path), log_path)
+        metrics_report_write(path_for_metrics, prometheus_textfile_dir, model_options[model_key]["name"], processed_count, log_path)
+
+
+######################## MODEL COMPARISON ########################
+
+def check_compare_models(compare_models):
+    """
+    Checks the models chosen for comparison: each must be a key of the model_options dictionary, and each is compared once.
+
+    Args:
+        compare_models (list): Keys of the models to compare. Imported from user_variables.py
+
+    Exits:
+        sys.exit(): Program will exit if fewer than two valid models remain, as there would be nothing to compare.
+
+    Returns:
+        compare_models (list): The valid keys, in the order given, without repeats.
+    """
+    if isinstance(compare_models, str):
+        compare_models = [compare_models]
+    valid_keys = []
+    for model_key in compare_models:
+        if model_key not in model_options:
+            msg_error = f"Error, '{model_key}' in compare_models is not a key of model_options, so it will not be compared.\n"
+            log_file_write(msg_error, log_path)
+        elif model_key not in valid_keys:
+            valid_keys.append(model_key)
+    if len(valid_keys) < 2:
+        msg_error = "Error, compare_models must include at least two keys from model_options. Exiting program.\n"
+        log_file_write(msg_error, log_path)
+        sys.exit(1)
+    return valid_keys
+
+
+def header_for_model(header, model_key):
+    """
+    Adapts a header built by create_header() for another model, so that each transcript's "Transcription Model" field names the model which actually produced it.
 
+    Args:
+        header (str): The header fields constructed by create_header().
+        model_key (str): Key representing the model from model_options dictionary.
+
+    Returns:
+        str: The header, with the model name replaced.
+    """
+    header_model = f"Transcription Model: {audio_info_batch[2]['transcript_type'][1]['model']}\n"
+    return header.replace(header_model, f"Transcription Model: {model_options[model_key]['name']}\n", 1)
+
+
+def compare_transcribe(model, audio_file, model_key, audio, word_interval, header):
+    """
+    Transcribes one audio file with one of the compared models and saves the outputs, with the model's alt_name suffix, via save_transcript_outputs(). Run in a thread of its own, alongside the other models in its group.
+
+    Args:
+        model (str): The Whisper ASR model instance, instanciated by load_model().
+        audio_file (str): Filename of the currently processing audio file.
+        model_key (str): Key representing the model from model_options dictionary.
+        audio (numpy.ndarray): The decoded audio, shared by all the compared models. Whisper does not modify it.
+        word_interval (int): The word interval at which to insert newlines into the transcript, as checked by check_word_interval().
+        header (str): The header fields constructed by create_header().
+
+    Note:
+        The transcript cache is not used, as the point of the comparison is to time each model.
+
+    Returns:
+        dict or None: {"audio_secs", "process_secs", "words" (list from transcript_words()), "saved" (bool)}, or None if transcription failed.
+    """
+    try:
+        start_time = time.perf_counter()
+        result = model.transcribe(audio, **decode_options)
+        process_secs = time.perf_counter() - start_time
+    except (RuntimeError, Exception) as e:
+        msg_error = f"Whisper transcription error ({model_options[model_key]['name']}) for {audio_file} - {e}.\n"
+        log_file_write(msg_error, log_path)
+        return None
+
+    msg_success = f"Whisper transcription of {audio_file} with {model_options[model_key]['name']} successful ({process_secs:.1f}s).\n"
+    log_file_write(msg_success, log_path)
+    saved = save_transcript_outputs(result["text"], result["segments"], word_interval, header_for_model(header, model_key), delimiter, audio_file, model_key)
+    return {"audio_secs": len(audio) / SAMPLE_RATE, "process_secs": process_secs, "words": transcript_words(result["text"]), "saved": saved}
+
+
+def release_models(models):
+    """
+    Releases the models of one comparison group before the next is loaded: drops the references held in models, collects them, and hands the GPU memory which torch keeps cached for reuse back to the device, so the next group has the memory it was planned with.
+
+    Args:
+        models (dict): model_key (key) and loaded model (value). Emptied in place.
+
+    Returns: None
+    """
+    models.clear()
+    gc.collect()
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.empty_cache()
+    except (AttributeError, RuntimeError):
+        pass
+
+
+def master_call_compare(word_interval, compare_models):
+    """
+    Model comparison mode (`python main.py --compare`): transcribes every file in path_to_audio with each of compare_models, decoding each file only once. Models which fit in memory together (see plan_model_groups() in utils_compare.py) transcribe the shared decoded audio at the same time, in threads; the groups take turns, each working through the whole batch. Only one group's models are loaded at a time: each group is loaded when its turn comes and released (see release_models()) before the next is loaded. Each model's transcripts are saved with its alt_name suffix, and a report of realtime factor, word count and pairwise word error rate is logged and saved as JSON in path_for_output.
+
+    Args:
+        word_interval (int): The user-specified word interval, checked here by check_word_interval().
+        compare_models (list): Keys of the models to compare, from model_options. Imported from user_variables.py
+
+    Note:
+        Memory needs are taken from memory_mb in model_options (defaulting to the largest model's figure where it is missing), and measured against compare_memory_mb, or if 0, the memory available when the run starts (see available_memory_mb() in utils_metrics.py).
+        Upcoming files are decoded in the background while the current one is transcribed if prefetch_depth > 0, as for a batch. The transcript cache, progress journal and moving of processed files are not used, so the same files can be compared again.
+        With more than one group, each file's decoded audio is kept for the later groups: in the decoded audio cache if use_audio_cache is True, otherwise as a .npy file in a temporary folder in path_for_cache (deleted at the end), which later groups memory-map rather than decoding again.
+        Speeds are only recorded for process_time_estimator() when a model runs on its own, as models running at the same time slow each other down.
+
+    Contingency:
+        A model which cannot be loaded is logged and left out of the comparison; the other models carry on.
+
+    Exits:
+        sys.exit(): Program will exit if the input directory does not exist or contains no files of the target type, or if fewer than two valid models are chosen.
+
+    Returns:
+        dict: The comparison report, from comparison_report() in utils_compare.py.
+    """
+    global output_formats, num_workers, prefetch_depth, prefetch_memory_mb
+    with stage_timer("log_file_setup"):
+        log_file_setup(use_log_file, path_to_logs)
+    check_input_directory(path_to_audio)
+    check_output_directory(path_for_output)
+    file_count, audio_filenames = obtain_audio_filenames(path_to_audio, audio_format, search_subfolders, check_modified_after(modified_after))
+    word_interval = check_word_interval(word_interval)
+    prefetch_depth = check_prefetch_depth(prefetch_depth)
+    prefetch_memory_mb = check_prefetch_memory_mb(prefetch_memory_mb)
+    output_formats = check_output_formats(output_formats)
+    compare_models = check_compare_models(compare_models)
+    num_workers = 1
+
+    largest_mb = max(model.get("memory_mb", 0) for model in model_options.values())
+    model_memory_mb = {model_key: model_options[model_key].get("memory_mb", largest_mb) for model_key in compare_models}
+    import_whisper() # so that free GPU memory is measured if there is a GPU
+    budget_mb = compare_memory_mb or available_memory_mb()
+    groups = plan_model_groups(compare_models, model_memory_mb, budget_mb)
+    budget_text = f"{budget_mb:.0f}MB" if budget_mb is not None else "unknown"
+    group_text = "; then ".join(" + ".join(model_options[model_key]["name"] for model_key in group) for group in groups)
+    summary = f"Summary of model comparison \n- Input Path: {path_to_audio} \n- Output Path: {path_for_output} \n- Number of {audio_format} files: {file_count} \n- Models: {', '.join(model_options[model_key]['name'] for model_key in compare_models)} \n- Memory available: {budget_text} \n- Run together: {group_text} \n- Output formats: {', '.join(output_formats)} \n- Newline interval: {'one line per Whisper segment' if wrap_on_segments else f'{word_interval} words'}.\n"
+    log_file_write(summary, log_path)
+    time.sleep(summary_pause_secs)
+
+    batch = list(enumerate(audio_filenames, start=1))
+    headers = {}
+    file_results = {}
+    undecodable = set()
+    spill_dir = None
+    if len(groups) > 1 and not use_audio_cache:
+        # each file is decoded once: later groups memory-map the first group's decode from disk
+        os.makedirs(path_for_cache or ".", exist_ok=True)
+        spill_dir = tempfile.mkdtemp(prefix="compare_audio_", dir=path_for_cache or ".")
+    spill_names = {audio_file: f"file_{index}" for index, audio_file in batch}
+
+    def decode_for_comparison(audio_file):
+        if spill_dir is None:
+            return load_decoded_audio(audio_file)
+        audio = audio_cache_load(spill_dir, spill_names[audio_file])
+        if audio is None:
+            audio = load_decoded_audio(audio_file)
+            audio_cache_store(spill_dir, spill_names[audio_file], audio, float("inf"), log_path)
+        return audio
+
+    try:
+        for group_number, group in enumerate(groups, start=1):
+            # only this group's models are held in memory
+            models = {}
+            for model_key in group:
+                with stage_timer("load_model"):
+                    model = load_model(model_key)
+                if model is None:
+                    msg_error = f"Error, {model_options[model_key]['name']} could not be loaded, so it will not be compared.\n"
+                    log_file_write(msg_error, log_path)
+                    continue
+                models[model_key] = model
+            del model # so release_models() drops the last reference
+            if models:
+                msg_group = f"Comparing with {' + '.join(model_options[model_key]['name'] for model_key in models)} (group {group_number} of {len(groups)}).\n"
+                log_file_write(msg_group, log_path)
+                group_batch = [(index, audio_file) for index, audio_file in batch if audio_file not in undecodable]
+                if prefetch_depth > 0:
+                    decoded_files = timed_iter(prefetch_audio(path_to_audio, group_batch, prefetch_depth, prefetch_memory_mb, log_path, audio_durations, decode_for_comparison), "decode_wait")
+                else:
+                    decoded_files = ((index, audio_file, None) for index, audio_file in group_batch)
+                for index, audio_file, audio in decoded_files:
+                    if audio is None:
+                        try:
+                            with stage_timer("decode"):
+                                audio = decode_for_comparison(audio_file)
+                        except Exception as e:
+                            msg_error = f"Error decoding {audio_file} - {e}. It will not be compared.\n"
+                            log_file_write(msg_error, log_path)
+                            undecodable.add(audio_file)
+                            continue
+                    if audio_file not in headers:
+                        with stage_timer("create_header"):
+                            headers[audio_file] = create_header(index, audio_file, delimiter)
+                    header, header_file = headers[audio_file]
+
+                    with stage_timer("compare_transcribe"):
+                        if len(models) == 1:
+                            model_key, = models
+                            run = compare_transcribe(models[model_key], header_file, model_key, audio, word_interval, header)
+                            if run is not None:
+                                record_throughput(model_key, header_file, audio, run["process_secs"])
+                            group_runs = {model_key: run}
+                        else:
+                            with ThreadPoolExecutor(max_workers=len(models)) as executor:
+                                futures = {model_key: executor.submit(compare_transcribe, models[model_key], header_file, model_key, audio, word_interval, header) for model_key in models}
+                                group_runs = {model_key: future.result() for model_key, future in futures.items()}
+                    file_results.setdefault(header_file, {}).update({model_key: run for model_key, run in group_runs.items() if run is not None})
+                    del audio
+            release_models(models)
+    finally:
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    with stage_timer("comparison_report"):
+        report = comparison_report(file_results, compare_models, model_options)
+        report["memory_mb"] = round(budget_mb) if budget_mb is not None else None
+        report["groups"] = groups
+        report_path = os.path.join(path_for_output, f"model_comparison_{dt.now().strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            atomic_write_json(report, report_path)
+            msg_report = f"Comparison report saved to {report_path}\n"
+        except (OSError, TypeError, ValueError) as e:
+            msg_report = f"Error saving comparison report to {report_path} - {e}.\n"
+    log_file_write(comparison_summary(report), log_path)
+    log_file_write(msg_report, log_path)
+    if use_audio_cache:
+        log_file_write(audio_cache_summary(audio_cache_path), log_path)
+    metrics_report_write(path_for_metrics, prometheus_textfile_dir, ", ".join(model_options[model_key]["name"] for model_key in compare_models), len(file_results), log_path)
+    return report